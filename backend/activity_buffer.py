@@ -0,0 +1,101 @@
+"""
+Kalu Activity Ring Buffer
+=========================
+
+Buffer circular em memória com as actividades mais recentes, usado por
+GET /activities/recent. É aquecido a partir da BD no arranque e alimentado
+por todas as escritas de actividades (fila, sync, bulk) através dos
+listeners de activity_queue. Cada actividade guarda já os bytes JSON,
+por isso servir o widget é só concatenar bytes.
+
+O buffer é por processo: com vários workers cada um vê as suas escritas
+mais as que existiam no arranque. Nesse caso desactivar com
+ACTIVITY_BUFFER_SIZE=0 (ou usar um único worker).
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+import database
+
+ACTIVITY_BUFFER_SIZE = int(os.getenv("ACTIVITY_BUFFER_SIZE", "200"))
+
+COLUMNS = [column.name for column in database.Activity.__table__.columns]
+
+
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def serialize(row: Dict[str, Any]) -> bytes:
+    """Serializa uma actividade no mesmo formato do JSONResponse do FastAPI"""
+    return json.dumps(
+        {column: _json_value(row.get(column)) for column in COLUMNS},
+        ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class ActivityRingBuffer:
+    """As `capacity` actividades mais recentes, ordenadas por created_at desc"""
+
+    def __init__(self, capacity: int = ACTIVITY_BUFFER_SIZE):
+        self.capacity = capacity
+        self._items: List[tuple] = []  # (created_at, id, bytes)
+        self._bodies: Dict[int, bytes] = {}
+        self._lock = threading.Lock()
+        self.ready = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def warm(self, db: Session):
+        """(Re)carrega o buffer a partir da BD"""
+        if not self.enabled:
+            return
+        rows = (
+            db.query(*database.Activity.__table__.columns)
+            .order_by(database.Activity.created_at.desc())
+            .limit(self.capacity)
+            .all()
+        )
+        items = [self._item(dict(row._mapping)) for row in rows]
+        with self._lock:
+            self._items = items
+            self._bodies.clear()
+            self.ready = True
+
+    def append(self, rows: List[Dict[str, Any]]):
+        """Listener de activity_queue - acrescenta actividades acabadas de gravar"""
+        if not self.ready:
+            return
+        new_items = [self._item(row) for row in rows if row.get("id") is not None]
+        with self._lock:
+            # Lotes da fila podem chegar fora de ordem - manter ordenado e limitado
+            self._items = sorted(self._items + new_items, key=lambda item: item[:2], reverse=True)
+            del self._items[self.capacity:]
+            self._bodies.clear()
+
+    def can_serve(self, limit: int) -> bool:
+        return self.enabled and self.ready and 0 <= limit <= self.capacity
+
+    def render(self, limit: int) -> bytes:
+        """Corpo JSON da resposta (lista) com as `limit` actividades mais recentes"""
+        with self._lock:
+            body = self._bodies.get(limit)
+            if body is None:
+                body = b"[" + b",".join(item[2] for item in self._items[:limit]) + b"]"
+                self._bodies[limit] = body
+            return body
+
+    @staticmethod
+    def _item(row: Dict[str, Any]) -> tuple:
+        return (row.get("created_at") or datetime.min, row["id"], serialize(row))
+
+
+recent_buffer = ActivityRingBuffer()
@@ -0,0 +1,256 @@
+"""
+Kalu Activity Queue
+===================
+
+Fila write-behind para o Activity Feed. Agrupa os inserts de actividades
+vindos de todos os endpoints em transacções únicas (group commit),
+despejadas por tamanho do lote ou por tempo.
+
+Modos de escrita (ACTIVITY_WRITE_MODE):
+    sync   - sem fila, a actividade entra na transacção do próprio pedido
+    group  - fila; POST /activities/ espera pelo commit do lote (durável)
+    async  - fila; ninguém espera (mais rápido, pode perder o último lote num crash)
+"""
+
+import os
+import threading
+from datetime import datetime
+from typing import Callable, Dict, Any, List, Optional
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+import database
+
+# Configuração
+ACTIVITY_WRITE_MODE = os.getenv("ACTIVITY_WRITE_MODE", "group")  # sync, group, async
+ACTIVITY_BATCH_SIZE = int(os.getenv("ACTIVITY_BATCH_SIZE", "200"))
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "0.05"))  # segundos
+ACTIVITY_ACK_TIMEOUT = float(os.getenv("ACTIVITY_ACK_TIMEOUT", "5"))  # segundos
+
+ACTIVITY_DEFAULTS = {
+    "descricao": None,
+    "actor": "Kalu",
+    "target_id": None,
+    "target_type": None,
+    "extra_data": None,
+    "icon": "📌",
+}
+
+
+def build_activity_row(fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Normaliza os campos de uma actividade (defaults + timestamp de criação)"""
+    row = dict(ACTIVITY_DEFAULTS)
+    for key, value in fields.items():
+        row[key] = value if value is not None else row.get(key)
+    if row.get("created_at") is None:
+        row["created_at"] = datetime.utcnow()
+    return row
+
+
+def activity_to_row(activity: "database.Activity") -> Dict[str, Any]:
+    return {column.name: getattr(activity, column.name) for column in database.Activity.__table__.columns}
+
+
+def insert_activities(db: Session, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Insere várias actividades com um único executemany (sem commit)
+
+    Returns:
+        List[int]: IDs gerados, pela mesma ordem das linhas
+    """
+    if not rows:
+        return []
+    stmt = insert(database.Activity).returning(
+        database.Activity.id, sort_by_parameter_order=True
+    )
+    return list(db.execute(stmt, rows).scalars().all())
+
+
+# Chamados com as linhas (já com "id") depois de cada commit de actividades
+_listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+
+
+def add_listener(listener: Callable[[List[Dict[str, Any]]], None]):
+    _listeners.append(listener)
+
+
+def notify_written(rows: List[Dict[str, Any]]):
+    """Avisa os listeners (versões, cache, ...) de que há actividades novas"""
+    if not rows:
+        return
+    for listener in _listeners:
+        try:
+            listener(rows)
+        except Exception as e:
+            print(f"⚠️ Erro num listener de actividades: {e}")
+
+
+class PendingActivity:
+    """Actividade em fila - permite esperar pelo commit do lote"""
+
+    def __init__(self, row: Dict[str, Any]):
+        self.row = row
+        self.id: Optional[int] = None
+        self.error: Optional[Exception] = None
+        self._done = threading.Event()
+
+    def resolve(self, activity_id: Optional[int] = None, error: Optional[Exception] = None):
+        self.id = activity_id
+        self.error = error
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, **self.row}
+
+
+class ActivityQueue:
+    """Fila em memória com uma thread que faz group commit das actividades"""
+
+    def __init__(
+        self,
+        session_factory=database.SessionLocal,
+        batch_size: int = ACTIVITY_BATCH_SIZE,
+        flush_interval: float = ACTIVITY_FLUSH_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer: List[PendingActivity] = []
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._stopped = False  # depois do stop() não há arranque automático
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "errors": 0}
+
+    # ---------- ciclo de vida ----------
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name="activity-queue", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Pára a thread e despeja tudo o que estiver em fila"""
+        with self._cond:
+            self._running = False
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    # ---------- API ----------
+
+    def enqueue(self, **fields) -> PendingActivity:
+        return self.enqueue_many([fields])[0]
+
+    def enqueue_many(self, items: List[Dict[str, Any]]) -> List[PendingActivity]:
+        pending = [PendingActivity(build_activity_row(fields)) for fields in items]
+        with self._cond:
+            if not self._running and not self._stopped:
+                self.start()
+            self._buffer.extend(pending)
+            self.stats["enqueued"] += len(pending)
+            stopped = self._stopped
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify_all()
+        if stopped:
+            # Fila parada (shutdown): sem thread para despejar, escreve já neste pedido
+            self.flush()
+        return pending
+
+    def flush(self) -> int:
+        """Escreve imediatamente tudo o que está em fila. Returns: nº de actividades escritas"""
+        written = 0
+        while True:
+            with self._cond:
+                batch = self._buffer[:self.batch_size]
+                del self._buffer[:self.batch_size]
+            if not batch:
+                return written
+            written += self._write_batch(batch)
+
+    def size(self) -> int:
+        with self._cond:
+            return len(self._buffer)
+
+    # ---------- internos ----------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._running and len(self._buffer) < self.batch_size:
+                    self._cond.wait(self.flush_interval)
+                running = self._running
+            self.flush()
+            if not running:
+                return
+
+    def _write_batch(self, batch: List[PendingActivity]) -> int:
+        with self._flush_lock:
+            db = self.session_factory()
+            try:
+                ids = insert_activities(db, [p.row for p in batch])
+                db.commit()
+                for p, activity_id in zip(batch, ids):
+                    p.resolve(activity_id)
+                notify_written([p.as_dict() for p in batch])
+                self.stats["batches"] += 1
+                self.stats["written"] += len(batch)
+                return len(batch)
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Erro ao gravar lote de actividades ({len(batch)}): {e}")
+                self.stats["errors"] += 1
+                # Uma linha inválida não deve deitar fora o lote inteiro
+                written = []
+                for p in batch:
+                    try:
+                        [activity_id] = insert_activities(db, [p.row])
+                        db.commit()
+                        p.resolve(activity_id)
+                        written.append(p.as_dict())
+                    except Exception as row_error:
+                        db.rollback()
+                        p.resolve(error=row_error)
+                notify_written(written)
+                self.stats["written"] += len(written)
+                return len(written)
+            finally:
+                db.close()
+
+
+queue = ActivityQueue()
+
+
+def record_activities(db: Session, items: List[Dict[str, Any]]) -> None:
+    """
+    Regista actividades implícitas (ex: document_created) ligadas à transacção de `db`.
+
+    Em modo sync entram no mesmo commit do pedido; nos modos em fila só são
+    enviadas para a fila depois do commit do pedido ter sucesso.
+    """
+    if not items:
+        return
+    if ACTIVITY_WRITE_MODE == "sync":
+        rows = [build_activity_row(fields) for fields in items]
+        ids = insert_activities(db, rows)
+        written = [dict(row, id=activity_id) for row, activity_id in zip(rows, ids)]
+        event.listen(db, "after_commit", lambda session: notify_written(written), once=True)
+        return
+    event.listen(db, "after_commit", lambda session: queue.enqueue_many(items), once=True)
+
+
+def record_activity(db: Session, **fields) -> None:
+    """Atalho de record_activities para uma única actividade"""
+    record_activities(db, [fields])
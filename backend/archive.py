@@ -0,0 +1,360 @@
+"""
+Kalu Archive (tiering quente/frio)
+==================================
+
+Uma thread em segundo plano move para tabelas de arquivo comprimidas:
+    - tarefas "Concluído" há mais de ARCHIVE_TASK_AGE_DAYS dias  -> tasks_archive
+    - actividades com mais de ARCHIVE_ACTIVITY_AGE_DAYS dias       -> activities_archive
+
+Cada linha arquivada guarda a linha original inteira como JSON comprimido
+(zlib) mais as poucas colunas usadas para filtrar e para a retenção. As
+tabelas quentes ficam só com o trabalho activo, por isso listagens,
+contagens e estatísticas deixam de crescer com o histórico.
+
+Desligado por omissão (ARCHIVE_INTERVAL=0): com o arquivo ligado, as
+listagens só incluem linhas arquivadas com ?include_archived=true.
+
+Leitura transparente: load_task / load_activity devolvem o objecto da
+tabela quente ou, se já foi arquivado, um objecto reconstruído a partir
+do arquivo (não ligado à sessão). O histórico de /tasks/{id}/full e os
+exports (/export/tasks, /export/activities) incluem sempre o arquivo.
+
+Retenção (0 = guardar para sempre):
+    ARCHIVE_TASK_RETENTION_DAYS      - apaga tarefas arquivadas concluídas há mais de N dias
+    ARCHIVE_ACTIVITY_RETENTION_DAYS  - apaga actividades arquivadas com mais de N dias
+"""
+
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import DateTime, delete, func, insert
+from sqlalchemy.orm import Session
+
+import database
+
+# Configuração
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "0"))  # segundos; 0 (omissão) desliga a thread
+ARCHIVE_TASK_AGE_DAYS = float(os.getenv("ARCHIVE_TASK_AGE_DAYS", "90"))
+ARCHIVE_ACTIVITY_AGE_DAYS = float(os.getenv("ARCHIVE_ACTIVITY_AGE_DAYS", "30"))
+ARCHIVE_TASK_RETENTION_DAYS = float(os.getenv("ARCHIVE_TASK_RETENTION_DAYS", "0"))
+ARCHIVE_ACTIVITY_RETENTION_DAYS = float(os.getenv("ARCHIVE_ACTIVITY_RETENTION_DAYS", "0"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_COMPRESSION_LEVEL = int(os.getenv("ARCHIVE_COMPRESSION_LEVEL", "6"))
+
+# Chamados com o nome da entidade ("tasks", "activities") depois de cada commit do arquivo
+_listeners: List[Callable[[str], None]] = []
+
+
+def add_listener(listener: Callable[[str], None]):
+    _listeners.append(listener)
+
+
+def _notify(entity: str):
+    for listener in _listeners:
+        try:
+            listener(entity)
+        except Exception as e:
+            print(f"⚠️ Erro num listener do arquivo: {e}")
+
+
+# ---------- serialização ----------
+
+def pack_row(obj) -> bytes:
+    """Linha ORM -> JSON comprimido com todas as colunas"""
+    row = {}
+    for column in obj.__table__.columns:
+        value = getattr(obj, column.name)
+        row[column.name] = value.isoformat() if isinstance(value, datetime) else value
+    return zlib.compress(
+        json.dumps(row, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+        ARCHIVE_COMPRESSION_LEVEL,
+    )
+
+
+def unpack_dict(payload: bytes) -> Dict[str, Any]:
+    """JSON comprimido -> dict com as colunas (datas em ISO 8601, como no export)"""
+    return json.loads(zlib.decompress(payload))
+
+
+def unpack_row(model, payload: bytes):
+    """JSON comprimido -> objecto `model` transitório (não ligado à sessão)"""
+    return _row_to_model(model, unpack_dict(payload))
+
+
+def _row_to_model(model, row: Dict[str, Any]):
+    columns = model.__table__.columns
+    for name, value in row.items():
+        if value is not None and name in columns and isinstance(columns[name].type, DateTime):
+            row[name] = datetime.fromisoformat(value)
+    return model(**{name: value for name, value in row.items() if name in columns})
+
+
+# ---------- arquivo ----------
+
+def _move(db: Session, hot_model, archive_model, candidates, archive_columns: List[str]) -> int:
+    """Copia um lote para o arquivo e apaga-o da tabela quente na mesma transacção"""
+    rows = candidates.limit(ARCHIVE_BATCH_SIZE).all()
+    if not rows:
+        return 0
+    db.execute(insert(archive_model), [
+        {**{name: getattr(obj, name) for name in archive_columns}, "payload": pack_row(obj)}
+        for obj in rows
+    ])
+    db.execute(
+        delete(hot_model).where(hot_model.id.in_([obj.id for obj in rows])),
+        execution_options={"synchronize_session": False},
+    )
+    db.commit()
+    return len(rows)
+
+
+def archive_tasks(db: Session, older_than_days: float = ARCHIVE_TASK_AGE_DAYS) -> int:
+    """Arquiva tarefas concluídas há mais de `older_than_days` dias. Returns: nº arquivadas"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    completed_at = func.coalesce(database.Task.completado_em, database.Task.updated_at)
+    candidates = (
+        db.query(database.Task)
+        .filter(database.Task.status == "Concluído", completed_at < cutoff)
+        .order_by(database.Task.id)
+    )
+    total = 0
+    while True:
+        moved = _move(db, database.Task, database.ArchivedTask, candidates,
+                      ["id", "empresa", "status", "created_at", "completado_em"])
+        total += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            return total
+
+
+def archive_activities(db: Session, older_than_days: float = ARCHIVE_ACTIVITY_AGE_DAYS) -> int:
+    """Arquiva actividades com mais de `older_than_days` dias. Returns: nº arquivadas"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    candidates = (
+        db.query(database.Activity)
+        .filter(database.Activity.created_at < cutoff)
+        .order_by(database.Activity.id)
+    )
+    total = 0
+    while True:
+        moved = _move(db, database.Activity, database.ArchivedActivity, candidates,
+                      ["id", "tipo", "target_id", "target_type", "created_at"])
+        total += moved
+        if moved < ARCHIVE_BATCH_SIZE:
+            return total
+
+
+def purge_expired(db: Session) -> Dict[str, int]:
+    """Aplica as políticas de retenção ao arquivo. Returns: nº de linhas apagadas por entidade"""
+    purged = {"tasks": 0, "activities": 0}
+    now = datetime.utcnow()
+    if ARCHIVE_TASK_RETENTION_DAYS > 0:
+        cutoff = now - timedelta(days=ARCHIVE_TASK_RETENTION_DAYS)
+        purged["tasks"] = db.query(database.ArchivedTask).filter(
+            func.coalesce(database.ArchivedTask.completado_em, database.ArchivedTask.archived_at) < cutoff
+        ).delete(synchronize_session=False)
+    if ARCHIVE_ACTIVITY_RETENTION_DAYS > 0:
+        cutoff = now - timedelta(days=ARCHIVE_ACTIVITY_RETENTION_DAYS)
+        purged["activities"] = db.query(database.ArchivedActivity).filter(
+            database.ArchivedActivity.created_at < cutoff
+        ).delete(synchronize_session=False)
+    db.commit()
+    return purged
+
+
+# ---------- leitura transparente ----------
+
+def load_task(db: Session, task_id: int) -> Optional["database.Task"]:
+    """Tarefa da tabela quente ou, se arquivada, reconstruída do arquivo"""
+    task = db.query(database.Task).filter(database.Task.id == task_id).first()
+    if task is not None:
+        return task
+    archived = db.get(database.ArchivedTask, task_id)
+    return unpack_row(database.Task, archived.payload) if archived else None
+
+
+def load_activity(db: Session, activity_id: int) -> Optional["database.Activity"]:
+    """Actividade da tabela quente ou, se arquivada, reconstruída do arquivo"""
+    activity = db.get(database.Activity, activity_id)
+    if activity is not None:
+        return activity
+    archived = db.get(database.ArchivedActivity, activity_id)
+    return unpack_row(database.Activity, archived.payload) if archived else None
+
+
+def archived_target_activities(db: Session, target_type: str, target_id: int) -> List["database.Activity"]:
+    """Actividades arquivadas de uma entidade (ex: histórico de uma tarefa)"""
+    rows = db.query(database.ArchivedActivity.payload).filter(
+        database.ArchivedActivity.target_type == target_type,
+        database.ArchivedActivity.target_id == target_id,
+    ).all()
+    return [unpack_row(database.Activity, payload) for (payload,) in rows]
+
+
+def _matches(row: Dict[str, Any], match: Dict[str, Any]) -> bool:
+    return all(row.get(key) == value for key, value in match.items() if value is not None)
+
+
+def iter_archived(db: Session, archive_model, match: Dict[str, Any], newest_first: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Linhas arquivadas como dicts que coincidem com `match` (mais recentes primeiro, ou por id)
+
+    Os campos de `match` que existem como colunas do arquivo filtram na BD;
+    os restantes (ex: prioridade) são verificados depois de descomprimir.
+    """
+    query = db.query(archive_model.payload)
+    for key, value in match.items():
+        if value is not None and key in archive_model.__table__.columns:
+            query = query.filter(archive_model.__table__.columns[key] == value)
+    order = (archive_model.created_at.desc(), archive_model.id.desc()) if newest_first else (archive_model.id.asc(),)
+    for (payload,) in query.order_by(*order).yield_per(ARCHIVE_BATCH_SIZE):
+        row = unpack_dict(payload)
+        if _matches(row, match):
+            yield row
+
+
+def merged_page(db: Session, hot_query, model, archive_model, match: Dict[str, Any], skip: int, limit: int) -> list:
+    """
+    Página de uma listagem quente + arquivo, por created_at descendente
+
+    Args:
+        hot_query: Query da tabela quente já filtrada e ordenada por created_at desc (sem offset/limit)
+        match: Os mesmos filtros, como {coluna: valor}, para as linhas arquivadas
+
+    Returns:
+        Objetos `model` (os arquivados não estão ligados à sessão)
+    """
+    wanted = skip + limit
+    hot = hot_query.limit(wanted).all()
+    archived = []
+    for row in iter_archived(db, archive_model, match):
+        archived.append(row)
+        if len(archived) >= wanted:
+            break
+    archived = [_row_to_model(model, row) for row in archived]
+    merged = sorted(hot + archived, key=lambda obj: obj.created_at or datetime.min, reverse=True)
+    return merged[skip:wanted]
+
+
+def delete_archived_task(db: Session, task_id: int) -> Optional[str]:
+    """Apaga uma tarefa do arquivo. Returns: empresa da tarefa, ou None se não existia"""
+    archived = db.get(database.ArchivedTask, task_id)
+    if archived is None:
+        return None
+    empresa = archived.empresa
+    db.delete(archived)
+    db.commit()
+    return empresa
+
+
+def archived_task_counts(db: Session, by_empresa: bool = False):
+    """Nº de tarefas arquivadas (todas concluídas), total ou por empresa"""
+    if by_empresa:
+        return dict(
+            db.query(database.ArchivedTask.empresa, func.count(database.ArchivedTask.id))
+            .group_by(database.ArchivedTask.empresa)
+            .all()
+        )
+    return db.query(func.count(database.ArchivedTask.id)).scalar() or 0
+
+
+# ---------- métricas ----------
+
+def table_stats(db: Session) -> Dict[str, Any]:
+    """Tamanho das tabelas quentes e do arquivo (linhas e bytes comprimidos)"""
+    def archive_size(model):
+        rows, size = db.query(func.count(model.id), func.coalesce(func.sum(func.length(model.payload)), 0)).one()
+        return {"rows": rows, "compressed_bytes": int(size)}
+
+    return {
+        "tasks": {
+            "hot_rows": db.query(func.count(database.Task.id)).scalar(),
+            "hot_completed": db.query(func.count(database.Task.id))
+                .filter(database.Task.status == "Concluído").scalar(),
+            "archive": archive_size(database.ArchivedTask),
+        },
+        "activities": {
+            "hot_rows": db.query(func.count(database.Activity.id)).scalar(),
+            "archive": archive_size(database.ArchivedActivity),
+        },
+    }
+
+
+# ---------- worker ----------
+
+class ArchiveWorker:
+    """Thread que corre o arquivo e a retenção a cada `interval` segundos"""
+
+    def __init__(self, session_factory=database.SessionLocal, interval: float = ARCHIVE_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.last_run: Dict[str, Any] = {}
+        self.stats = {"runs": 0, "tasks_archived": 0, "activities_archived": 0, "purged": 0, "errors": 0}
+
+    def start(self):
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="archive-worker", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> Dict[str, Any]:
+        """Um ciclo completo: arquivar tarefas e actividades e aplicar a retenção"""
+        with self._lock:
+            started = time.perf_counter()
+            db = self.session_factory()
+            try:
+                tasks = archive_tasks(db)
+                activities = archive_activities(db)
+                purged = purge_expired(db)
+            except Exception as e:
+                db.rollback()
+                self.stats["errors"] += 1
+                print(f"⚠️ Erro no arquivo: {e}")
+                raise
+            finally:
+                db.close()
+
+            self.stats["runs"] += 1
+            self.stats["tasks_archived"] += tasks
+            self.stats["activities_archived"] += activities
+            self.stats["purged"] += sum(purged.values())
+            self.last_run = {
+                "at": datetime.utcnow().isoformat(),
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "tasks_archived": tasks,
+                "activities_archived": activities,
+                "purged": purged,
+            }
+
+        # Também quando só houve retenção: as estatísticas contam as linhas arquivadas
+        if tasks or purged["tasks"]:
+            _notify("tasks")
+        if activities or purged["activities"]:
+            _notify("activities")
+        if tasks or activities:
+            print(f"🗄️ Arquivo: {tasks} tarefa(s), {activities} actividade(s)")
+        return self.last_run
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                pass  # já registado em run_once; tenta de novo no próximo ciclo
+
+
+worker = ArchiveWorker()
@@ -0,0 +1,421 @@
+"""
+Kalu Batch Reports
+==================
+
+Relatório consolidado de uma empresa para um período: todas as tarefas
+concluídas num único DOCX/XLSX/PDF com resumo (estatísticas das tarefas),
+índice e uma secção por tarefa.
+
+Os relatórios correm em segundo plano (REPORT_MAX_RUNNING em simultâneo).
+As secções de cada formato são renderizadas em paralelo (REPORT_WORKERS) e
+montadas pela ordem das tarefas à medida que ficam prontas; o progresso
+(secções feitas / total, por formato) fica disponível enquanto o trabalho
+corre. Os ficheiros ficam em memória/ficheiro temporário durante
+REPORT_JOB_TTL segundos depois de concluídos.
+"""
+
+import html
+import io
+import os
+import re
+import statistics
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func
+
+import bundle
+import database
+import downloads
+import filters
+import pdf_service
+import result_render
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "4"))  # secções em paralelo
+REPORT_MAX_RUNNING = int(os.getenv("REPORT_MAX_RUNNING", "2"))  # relatórios em simultâneo
+REPORT_JOB_TTL = int(os.getenv("REPORT_JOB_TTL", "3600"))  # segundos que os ficheiros ficam disponíveis
+
+REPORT_FORMATS = ("docx", "xlsx", "pdf")
+COMPLETED_STATUS = "Concluído"
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+REPORT_HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="pt">
+<head>
+    <meta charset="UTF-8">
+    <title>{title}</title>
+    <style>
+        body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif; line-height: 1.6; color: #333; }}
+        h1 {{ color: #1f77b4; border-bottom: 3px solid #1f77b4; padding-bottom: 0.5rem; }}
+        h2 {{ color: #2c3e50; margin-top: 2rem; border-bottom: 1px solid #e0e0e0; }}
+        h3 {{ color: #34495e; }}
+        table.resumo {{ border-collapse: collapse; width: 100%; }}
+        table.resumo td {{ border: 1px solid #e0e0e0; padding: 0.3rem 0.6rem; }}
+        table.resumo td:first-child {{ font-weight: bold; width: 45%; }}
+        ol.indice a {{ color: #2c3e50; text-decoration: none; }}
+        ol.indice a::after {{ content: leader('.') target-counter(attr(href), page); }}
+        section.tarefa {{ page-break-before: always; }}
+        .footer {{ margin-top: 3rem; text-align: center; color: #95a5a6; font-size: 0.9rem; }}
+    </style>
+</head>
+<body>
+    <h1>{title}</h1>
+    <p><strong>Data:</strong> {date}</p>
+    <h2>Resumo</h2>
+    <table class="resumo">{summary}</table>
+    <h2>Índice</h2>
+    <ol class="indice">{toc}</ol>
+    {sections}
+    <div class="footer"><p><em>Relatório gerado automaticamente por Kalu AI Assistant ⚡</em></p></div>
+</body>
+</html>"""
+
+
+def parse_formats(formats: str) -> List[str]:
+    selected = [f.strip().lower() for f in formats.split(",") if f.strip()]
+    if not selected or any(f not in REPORT_FORMATS for f in selected):
+        raise HTTPException(status_code=400, detail=f"Formatos suportados: {', '.join(REPORT_FORMATS)}")
+    return list(dict.fromkeys(selected))
+
+
+def _completed_at(model, fallback):
+    return func.coalesce(model.completado_em, fallback)
+
+
+def select_completed_task_ids(db, empresa: str, date_from: datetime = None, date_to: datetime = None) -> List[int]:
+    """Tarefas concluídas da empresa no período (tabela quente + arquivo), por data de conclusão"""
+    selected = []
+    for model, fallback in (
+        (database.Task, database.Task.updated_at),
+        (database.ArchivedTask, database.ArchivedTask.archived_at),
+    ):
+        completed_at = _completed_at(model, fallback)
+        query = db.query(model.id, completed_at.label("completed_at")).filter(
+            model.empresa == empresa, model.status == COMPLETED_STATUS
+        )
+        if date_from:
+            query = query.filter(completed_at >= date_from)
+        if date_to:
+            query = query.filter(completed_at <= date_to)
+        selected += query.all()
+    selected.sort(key=lambda row: (row.completed_at or datetime.min, row.id))
+    return [row.id for row in selected]
+
+
+def _status_counts(db, empresa: str, date_from: datetime = None, date_to: datetime = None) -> Counter:
+    """Todas as tarefas da empresa criadas no período, por status"""
+    counts = Counter()
+    for model in (database.Task, database.ArchivedTask):
+        query = db.query(model.status, func.count(model.id)).filter(model.empresa == empresa)
+        query = filters.filter_created(query, model, date_from, date_to)
+        counts.update(dict(query.group_by(model.status).all()))
+    return counts
+
+
+def period_label(date_from: datetime = None, date_to: datetime = None) -> str:
+    if not date_from and not date_to:
+        return "Todo o período"
+    start = date_from.strftime("%d/%m/%Y") if date_from else "início"
+    end = date_to.strftime("%d/%m/%Y") if date_to else "hoje"
+    return f"{start} - {end}"
+
+
+def summary_rows(
+    tasks: List["database.Task"], empresa: str, period: str, status_counts: Counter
+) -> List[Tuple[str, Any]]:
+    """Resumo do relatório a partir das estatísticas das tarefas"""
+    durations = [
+        ((task.completado_em or task.updated_at) - task.created_at).total_seconds() / 86400
+        for task in tasks
+        if task.created_at and (task.completado_em or task.updated_at)
+    ]
+    completed = [task.completado_em or task.updated_at for task in tasks if task.completado_em or task.updated_at]
+
+    rows: List[Tuple[str, Any]] = [
+        ("Empresa", empresa),
+        ("Período", period),
+        ("Tarefas concluídas", len(tasks)),
+        ("Com resultado", sum(1 for task in tasks if task.resultado)),
+    ]
+    for prioridade, count in sorted(Counter(task.prioridade or "Média" for task in tasks).items()):
+        rows.append((f"Prioridade {prioridade}", count))
+    if durations:
+        rows.append(("Tempo médio de conclusão (dias)", round(statistics.mean(durations), 1)))
+        rows.append(("Tempo mediano de conclusão (dias)", round(statistics.median(durations), 1)))
+    if completed:
+        rows.append(("Primeira conclusão", min(completed)))
+        rows.append(("Última conclusão", max(completed)))
+    for status, count in sorted(status_counts.items()):
+        rows.append((f"Tarefas criadas no período - {status}", count))
+    return rows
+
+
+def section_title(task: "database.Task") -> str:
+    return f"{task.titulo} (#{task.id})"
+
+
+# ---------- secções (correm em paralelo) ----------
+
+def _word_section(task: "database.Task"):
+    from kalu_document_generator_advanced import render_word_section
+    return render_word_section(result_render.report_data(task), section_title(task))
+
+
+def _excel_section(task: "database.Task"):
+    return result_render.report_data(task)
+
+
+def _html_section(task: "database.Task") -> str:
+    if task.resultado_tipo == "html" and task.resultado.strip().startswith('<'):
+        match = re.search(r"<body[^>]*>(.*)</body>", task.resultado, flags=re.S | re.I)
+        content = match.group(1) if match else task.resultado
+        content = f"<h1>{html.escape(section_title(task))}</h1>\n{content}"
+    else:
+        from kalu_document_generator import generate_html_content_only, generate_markdown_report
+        content = generate_html_content_only(
+            generate_markdown_report(result_render.report_data(task), section_title(task))
+        )
+    return f'<section class="tarefa" id="tarefa-{task.id}">\n{content}\n</section>'
+
+
+def build_pdf_html(title: str, summary: List[Tuple[str, Any]], tasks: List["database.Task"], sections: Iterable[str]) -> str:
+    def text(value):
+        if isinstance(value, datetime):
+            value = value.strftime("%d/%m/%Y %H:%M")
+        return html.escape(str(value))
+
+    return REPORT_HTML_TEMPLATE.format(
+        title=html.escape(title),
+        date=datetime.now().strftime("%d/%m/%Y %H:%M"),
+        summary="".join(f"<tr><td>{text(label)}</td><td>{text(value)}</td></tr>" for label, value in summary),
+        toc="".join(f'<li><a href="#tarefa-{task.id}">{html.escape(section_title(task))}</a></li>' for task in tasks),
+        sections="\n".join(sections),
+    )
+
+
+# ---------- trabalhos ----------
+
+class ReportJob:
+    """Estado e ficheiros de um relatório consolidado"""
+
+    def __init__(self, empresa: str, date_from: Optional[datetime], date_to: Optional[datetime],
+                 formats: List[str], task_ids: List[int]):
+        self.id = uuid.uuid4().hex
+        self.empresa = empresa
+        self.date_from = date_from
+        self.date_to = date_to
+        self.formats = formats
+        self.task_ids = task_ids
+        self.status = JOB_QUEUED
+        self.stage = "na fila"
+        self.sections_total = 0
+        self.sections_done = {fmt: 0 for fmt in formats}
+        self.format_status = {fmt: JOB_QUEUED for fmt in formats}
+        self.files: Dict[str, BinaryIO] = {}
+        self.errors: Dict[str, str] = {}
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._finished_monotonic: Optional[float] = None
+        self._file_lock = threading.Lock()
+
+    @property
+    def title(self) -> str:
+        return f"Relatório {self.empresa} - {period_label(self.date_from, self.date_to)}"
+
+    @property
+    def filename_title(self) -> str:
+        return self.title.replace("/", "-")
+
+    def progress(self) -> Dict[str, Any]:
+        total = self.sections_total * len(self.formats)
+        done = sum(self.sections_done.values())
+        percent = 100.0 if self.status == JOB_DONE else (round(100.0 * done / total, 1) if total else 0.0)
+        return {
+            "job_id": self.id,
+            "empresa": self.empresa,
+            "period": period_label(self.date_from, self.date_to),
+            "status": self.status,
+            "stage": self.stage,
+            "percent": percent,
+            "tasks": len(self.task_ids),
+            "formats": {
+                fmt: {
+                    "status": self.format_status[fmt],
+                    "sections_done": self.sections_done[fmt],
+                    "sections_total": self.sections_total,
+                    "size": self.size(fmt),
+                    "error": self.errors.get(fmt),
+                }
+                for fmt in self.formats
+            },
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def size(self, fmt: str) -> Optional[int]:
+        with self._file_lock:
+            buffer = self.files.get(fmt)
+            return downloads.buffer_size(buffer) if buffer is not None and not buffer.closed else None
+
+    def iter_file(self, fmt: str) -> Iterator[bytes]:
+        """Lê o ficheiro em blocos sem o fechar (pode ser descarregado várias vezes)"""
+        buffer = self.files[fmt]
+        offset = 0
+        while True:
+            with self._file_lock:
+                if buffer.closed:
+                    return  # expirou entretanto
+                buffer.seek(offset)
+                chunk = buffer.read(downloads.DOCUMENT_CHUNK_SIZE)
+            if not chunk:
+                return
+            offset += len(chunk)
+            yield chunk
+
+    def close(self):
+        with self._file_lock:
+            for buffer in self.files.values():
+                buffer.close()
+
+
+class BatchReports:
+    """Fila de relatórios consolidados (em memória, por processo)"""
+
+    def __init__(self):
+        self._jobs: Dict[str, ReportJob] = {}
+        self._lock = threading.Lock()
+        self._runner: Optional[ThreadPoolExecutor] = None
+        self._sections: Optional[ThreadPoolExecutor] = None
+
+    def _executors(self) -> Tuple[ThreadPoolExecutor, ThreadPoolExecutor]:
+        with self._lock:
+            if self._runner is None:
+                self._runner = ThreadPoolExecutor(max_workers=max(1, REPORT_MAX_RUNNING), thread_name_prefix="report-job")
+                self._sections = ThreadPoolExecutor(max_workers=max(1, REPORT_WORKERS), thread_name_prefix="report-section")
+            return self._runner, self._sections
+
+    def submit(self, empresa: str, date_from: Optional[datetime], date_to: Optional[datetime],
+               formats: List[str], task_ids: List[int]) -> ReportJob:
+        self._expire()
+        job = ReportJob(empresa, date_from, date_to, formats, task_ids)
+        with self._lock:
+            self._jobs[job.id] = job
+        runner, _ = self._executors()
+        runner.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ReportJob]:
+        self._expire()
+        return self._jobs.get(job_id)
+
+    def _expire(self):
+        now = time.monotonic()
+        with self._lock:
+            expired = [job for job in self._jobs.values()
+                       if job._finished_monotonic and now - job._finished_monotonic > REPORT_JOB_TTL]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            job.close()
+
+    def shutdown(self):
+        with self._lock:
+            runner, sections = self._runner, self._sections
+            self._runner = self._sections = None
+        for executor in (runner, sections):
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    # ---------- execução ----------
+
+    def _sections_in_order(self, job: ReportJob, fmt: str, render: Callable, tasks: List["database.Task"]) -> Iterator[Any]:
+        """Renderiza as secções em paralelo e entrega-as pela ordem das tarefas"""
+        _, executor = self._executors()
+        window = max(1, 2 * REPORT_WORKERS)
+        pending = deque()
+        remaining = iter(tasks)
+        for task in remaining:
+            pending.append(executor.submit(render, task))
+            if len(pending) >= window:
+                break
+        while pending:
+            result = pending.popleft().result()
+            job.sections_done[fmt] += 1
+            task = next(remaining, None)
+            if task is not None:
+                pending.append(executor.submit(render, task))
+            yield result
+
+    def _render_format(self, job: ReportJob, fmt: str, tasks: List["database.Task"], summary) -> BinaryIO:
+        from kalu_document_generator_advanced import generate_excel_batch_report, generate_word_batch_report
+
+        titles = [section_title(task) for task in tasks]
+        if fmt == "docx":
+            sections = self._sections_in_order(job, fmt, _word_section, tasks)
+            return downloads.spool(generate_word_batch_report, job.title, summary, titles, sections)
+        if fmt == "xlsx":
+            sections = self._sections_in_order(job, fmt, _excel_section, tasks)
+            return downloads.spool(generate_excel_batch_report, job.title, summary, titles, sections)
+        if pdf_service.renderer.start() not in ("wkhtmltopdf", "weasyprint"):
+            raise pdf_service.PDFUnavailable("wkhtmltopdf ou weasyprint não instalados. Instale um deles.")
+        sections = self._sections_in_order(job, fmt, _html_section, tasks)
+        page = build_pdf_html(job.title, summary, tasks, sections)
+        job.stage = "pdf: a converter"
+        return io.BytesIO(pdf_service.renderer.render(page, kind="batch"))
+
+    def _run(self, job: ReportJob):
+        job.status = JOB_RUNNING
+        job.started_at = datetime.utcnow()
+        started = time.perf_counter()
+        try:
+            job.stage = "a carregar tarefas"
+            completed = [task for _, task in bundle.load_tasks(job.task_ids) if task is not None]
+            tasks = [task for task in completed if task.resultado]  # só estas têm secção
+            job.sections_total = len(tasks)
+            db = database.SessionLocal()
+            try:
+                counts = _status_counts(db, job.empresa, job.date_from, job.date_to)
+            finally:
+                db.close()
+            summary = summary_rows(completed, job.empresa, period_label(job.date_from, job.date_to), counts)
+
+            for fmt in job.formats:
+                job.stage = f"{fmt}: a renderizar secções"
+                job.format_status[fmt] = JOB_RUNNING
+                try:
+                    job.files[fmt] = self._render_format(job, fmt, tasks, summary)
+                    job.format_status[fmt] = JOB_DONE
+                except Exception as e:
+                    job.errors[fmt] = f"{type(e).__name__}: {e}"
+                    job.format_status[fmt] = JOB_FAILED
+                    print(f"⚠️ Relatório {job.empresa}: erro no {fmt}: {e}")
+
+            job.status = JOB_DONE if job.files else JOB_FAILED
+            job.stage = "concluído" if job.files else "falhou"
+            print(f"📊 Relatório {job.empresa}: {len(tasks)} tarefa(s), "
+                  f"{', '.join(job.files) or 'nenhum formato'} em {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.stage = "falhou"
+            job.error = f"{type(e).__name__}: {e}"
+            print(f"❌ Relatório {job.empresa} falhou: {e}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            job._finished_monotonic = time.monotonic()
+
+
+reports = BatchReports()
@@ -0,0 +1,93 @@
+"""
+Benchmark: endpoints em lote vs endpoints de uma linha
+======================================================
+
+Mede linhas/segundo a criar tarefas, documentos, memórias e eventos
+um a um (um pedido + commit por linha) e com os endpoints /bulk.
+
+Uso:
+    python benchmarks/bench_bulk.py --rows 2000
+"""
+
+import argparse
+import json
+
+from common import load_app, authenticated_client, timed
+
+
+def task_item(i):
+    return {"title": f"Tarefa {i}", "company": "Triple O", "priority": "Alta"}
+
+
+def document_item(i):
+    return {"title": f"Documento {i}", "doc_type": "json", "content": "x" * 500}
+
+
+def memory_item(i):
+    return {"type": "fact", "title": f"Memória {i}", "content": "y" * 200}
+
+
+def event_item(i):
+    return {"title": f"Evento {i}", "start_date": "2026-03-01T10:00:00"}
+
+
+# (nome, endpoint single, envia como, endpoint bulk, gerador)
+ENTITIES = [
+    ("tasks", "/tasks/", "json", "/tasks/bulk", task_item),
+    ("documents", "/documents/", "params", "/documents/bulk", document_item),
+    ("memories", "/memories/", "params", "/memories/bulk", memory_item),
+    ("calendar", "/calendar/", "params", "/calendar/bulk", event_item),
+]
+
+# Os endpoints single recebem nomes em PT
+PT_NAMES = {
+    "title": "titulo", "company": "empresa", "priority": "prioridade",
+    "doc_type": "tipo", "type": "tipo", "content": "conteudo",
+}
+
+
+def to_pt(item):
+    return {PT_NAMES.get(k, k): v for k, v in item.items()}
+
+
+def run(rows: int, chunk: int):
+    main = load_app(ACTIVITY_WRITE_MODE="sync")
+    client = authenticated_client(main)
+    results = {}
+
+    for name, single_url, send_as, bulk_url, make_item in ENTITIES:
+        items = [make_item(i) for i in range(rows)]
+
+        def single():
+            for item in items:
+                kwargs = {send_as: to_pt(item)}
+                client.post(single_url, **kwargs).raise_for_status()
+
+        def batched():
+            for start in range(0, rows, chunk):
+                client.post(bulk_url, json=items[start:start + chunk]).raise_for_status()
+
+        _, single_s = timed(single)
+        _, bulk_s = timed(batched)
+        results[name] = {
+            "rows": rows,
+            "single_rows_per_s": round(rows / single_s, 1),
+            "bulk_rows_per_s": round(rows / bulk_s, 1),
+            "speedup": round(single_s / bulk_s, 1),
+        }
+        print(f"{name:<10} single: {rows / single_s:>9.1f} linhas/s   "
+              f"bulk: {rows / bulk_s:>9.1f} linhas/s   ({single_s / bulk_s:.1f}x)")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--chunk", type=int, default=1000, help="itens por pedido /bulk")
+    parser.add_argument("--json", action="store_true", help="imprimir resultados em JSON")
+    args = parser.parse_args()
+
+    results = run(args.rows, args.chunk)
+    if args.json:
+        print(json.dumps(results, indent=2))
@@ -0,0 +1,92 @@
+"""
+Benchmark: geração de Word por documento
+========================================
+
+Mede o tempo de generate_word_document (template base em cache, estilos
+pré-definidos, tabelas recursivas) para um relatório pequeno típico e para
+relatórios grandes (milhares de linhas em tabela + estruturas aninhadas).
+A primeira geração (que constrói o template) é reportada à parte.
+
+Uso:
+    python benchmarks/bench_docx.py --repeat 20 --large-rows 5000
+"""
+
+import argparse
+import io
+import json
+import statistics
+import sys
+
+from common import BACKEND_DIR, timed
+
+sys.path.insert(0, BACKEND_DIR)
+
+from kalu_document_generator_advanced import generate_word_document  # noqa: E402
+
+
+def small_report() -> dict:
+    return {
+        "analise_concorrentes": {
+            "data": "2026-02-12",
+            "mercado": "Angola - Luanda",
+            "segmento": "Moda",
+            "concorrentes_locais": [
+                {"nome": f"Loja {i}", "tipo": "Retalho", "faixa_preco": "Médio", "diferencial": "Localização"}
+                for i in range(5)
+            ],
+            "analise_precos": {"mercado_local": {"baixo": "5.000 Kz", "alto": "50.000 Kz"}, "observacoes": "Estável"},
+            "recomendacoes": [{"acao": "Lançar linha", "prioridade": "Alta"}],
+            "conclusao": "Mercado com espaço para crescimento.",
+        }
+    }
+
+
+def large_report(rows: int) -> dict:
+    return {
+        "relatorio": {
+            "empresa": "Triple O",
+            "linhas": [
+                {"id": i, "produto": f"Produto {i % 500}", "quantidade": i % 17, "valor": round(i * 1.37, 2)}
+                for i in range(rows)
+            ],
+            "regioes": {
+                f"regiao_{r}": {"lojas": [{"nome": f"Loja {r}-{i}", "vendas": i * 10} for i in range(20)],
+                                "notas": ["ok", "rever stock"]}
+                for r in range(10)
+            },
+        }
+    }
+
+
+def measure(data: dict, repeat: int) -> float:
+    samples = [timed(generate_word_document, data, "Benchmark", io.BytesIO())[1] for _ in range(repeat)]
+    return statistics.median(samples)
+
+
+def run(repeat: int, large_rows: list):
+    results = {}
+    _, first = timed(generate_word_document, small_report(), "Benchmark", io.BytesIO())
+    results["first_document_ms"] = round(first * 1000, 1)
+    print(f"primeiro documento (constrói o template): {first * 1000:>8.1f} ms")
+
+    seconds = measure(small_report(), repeat)
+    results["small_ms"] = round(seconds * 1000, 2)
+    print(f"relatório pequeno:                        {seconds * 1000:>8.1f} ms")
+
+    for rows in large_rows:
+        seconds = measure(large_report(rows), max(1, repeat // 10))
+        results[f"large_{rows}_ms"] = round(seconds * 1000, 1)
+        print(f"relatório grande ({rows:>6} linhas):        {seconds * 1000:>8.1f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=20, help="gerações por medição (mediana)")
+    parser.add_argument("--large-rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--json", action="store_true", help="imprimir resultados em JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.large_rows)
+    if args.json:
+        print(json.dumps(results, indent=2))
@@ -0,0 +1,371 @@
+"""
+Benchmark: todos os endpoints da API sobre um volume grande de dados
+====================================================================
+
+Gera (ou reutiliza da cache) uma base de dados com seed_data.py, copia-a
+para a base de dados da API e mede cada endpoint do main.py em processo
+(TestClient / ASGI, sem rede): mediana, p95, min/max, tamanho da resposta,
+status e nº de queries SQL (header X-DB-Queries).
+
+Os resultados saem em JSON (--output) para comparar corridas na mesma
+máquina; --compare mostra a diferença face a um ficheiro anterior e sai
+com erro se alguma mediana piorar mais do que --threshold.
+
+A cache de respostas e a thread do arquivo estão desligadas por omissão,
+para medir o caminho completo com dados estáveis. Endpoints pesados
+(exportações, ZIP, relatórios, arquivo) correm uma só vez; os de escrita
+vêm depois das leituras e os destrutivos no fim.
+
+Uso:
+    python benchmarks/bench_endpoints.py --preset small --output bench.json
+    python benchmarks/bench_endpoints.py --preset large --repeat 5 --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Union
+
+from common import load_app, authenticated_client, timed, BACKEND_DIR
+import seed_data
+
+REPORT_TIMEOUT = 600  # segundos à espera de um relatório consolidado
+
+
+class Scenario(NamedTuple):
+    method: str
+    route: str  # template do FastAPI (para a cobertura)
+    url: Union[str, Callable[[int], str]]  # ou função da iteração (ids diferentes por pedido)
+    kwargs: Union[Dict[str, Any], Callable[[int], Dict[str, Any]]] = {}
+    heavy: bool = False  # corre uma só vez, sem aquecimento
+    label: str = ""
+    after: Optional[Callable[[Any], None]] = None  # recebe a última resposta
+
+    @property
+    def name(self) -> str:
+        return f"{self.method} {self.route}" + (f" [{self.label}]" if self.label else "")
+
+
+# ---------- contexto (ids reais da base de dados semeada) ----------
+
+def discover(engine) -> Dict[str, Any]:
+    def scalar(sql):
+        with engine.connect() as conn:
+            return conn.exec_driver_sql(sql).scalar()
+
+    def column(sql):
+        with engine.connect() as conn:
+            return [row[0] for row in conn.exec_driver_sql(sql)]
+
+    ctx = {
+        "task_id": scalar("SELECT id FROM tasks WHERE resultado_tipo = 'json' ORDER BY id LIMIT 1"),
+        "text_task_id": scalar("SELECT id FROM tasks WHERE resultado_tipo = 'text' ORDER BY id LIMIT 1"),
+        "big_task_id": scalar("SELECT id FROM tasks WHERE resultado_tipo = 'json' ORDER BY length(resultado) DESC LIMIT 1"),
+        "bundle_ids": column("SELECT id FROM tasks WHERE resultado IS NOT NULL ORDER BY id LIMIT 5"),
+        "task_count": scalar("SELECT count(*) FROM tasks"),
+        "activity_id": scalar("SELECT max(id) FROM activities"),
+        "document_id": scalar("SELECT min(id) FROM documents"),
+        "empresa": seed_data.EMPRESAS[0],
+        # Ids reservados para os DELETE (os mais recentes, um por pedido)
+        "delete_task_ids": column("SELECT id FROM tasks ORDER BY id DESC LIMIT 100"),
+        "delete_document_ids": column("SELECT id FROM documents ORDER BY id DESC LIMIT 100"),
+        "delete_event_ids": column("SELECT id FROM calendar_events ORDER BY id DESC LIMIT 100"),
+        "now": datetime.utcnow(),
+    }
+    missing = [key for key, value in ctx.items() if value in (None, [])]
+    if missing:
+        raise SystemExit(f"❌ Dados insuficientes para os cenários: {', '.join(missing)} (aumente os volumes)")
+    return ctx
+
+
+def scenarios(ctx: Dict[str, Any]) -> List[Scenario]:
+    task, big = ctx["task_id"], ctx["big_task_id"]
+    week_ago = (ctx["now"] - timedelta(days=7)).isoformat()
+    in_week = (ctx["now"] + timedelta(days=7)).isoformat()
+    report_from = (ctx["now"] - timedelta(hours=2)).isoformat()
+
+    def task_item(i):
+        return {"titulo": f"Bench {i}", "empresa": ctx["empresa"], "prioridade": "Alta"}
+
+    def remember_job(response):
+        ctx["job_id"] = response.json()["job_id"]
+
+    def remember_profile(response):
+        ctx["profile_id"] = response.headers["x-profile-id"]
+
+    def remember_trace(response):
+        ctx["trace_id"] = response.headers["x-trace-id"]
+
+    import_body = "\n".join(
+        json.dumps({"tipo": "fact", "titulo": f"Importada {i}", "conteudo": "x" * 200}) for i in range(1000)
+    )
+
+    return [
+        # ----- leituras -----
+        Scenario("GET", "/", "/"),
+        Scenario("GET", "/health", "/health"),
+        Scenario("GET", "/health/pdf", "/health/pdf"),
+        Scenario("GET", "/users/me", "/users/me"),
+        Scenario("GET", "/tasks/", "/tasks/"),
+        Scenario("GET", "/tasks/", "/tasks/?empresa={}&status=Concluído".format(ctx["empresa"]), label="filtro"),
+        Scenario("GET", "/tasks/", f"/tasks/?skip={ctx['task_count'] // 2}&limit=100", label="offset a meio"),
+        Scenario("GET", "/tasks/pending", "/tasks/pending"),
+        Scenario("GET", "/tasks/{task_id}", f"/tasks/{task}"),
+        Scenario("GET", "/tasks/{task_id}/full", f"/tasks/{task}/full"),
+        Scenario("GET", "/tasks/{task_id}/view", f"/tasks/{task}/view"),
+        Scenario("GET", "/tasks/{task_id}/view", f"/tasks/{big}/view", label="maior resultado"),
+        Scenario("GET", "/tasks/{task_id}/download/{format}", f"/tasks/{task}/download/docx", label="docx"),
+        Scenario("GET", "/tasks/{task_id}/download/{format}", f"/tasks/{task}/download/xlsx", label="xlsx"),
+        Scenario("GET", "/tasks/{task_id}/download/{format}", f"/tasks/{task}/download/pdf", label="pdf"),
+        Scenario("GET", "/tasks/{task_id}/download/{format}", f"/tasks/{big}/download/docx", label="docx maior resultado"),
+        Scenario("GET", "/tasks/{task_id}/download/{format}", f"/tasks/{ctx['text_task_id']}/download/docx", label="docx texto"),
+        Scenario("GET", "/tasks/download/bundle", "/tasks/download/bundle",
+                 {"params": {"ids": ctx["bundle_ids"]}}, heavy=True),
+        Scenario("GET", "/stats/overview", "/stats/overview"),
+        Scenario("GET", "/stats/by-empresa", "/stats/by-empresa"),
+        Scenario("GET", "/dashboard/bootstrap", "/dashboard/bootstrap"),
+        Scenario("GET", "/activities/", "/activities/"),
+        Scenario("GET", "/activities/recent", "/activities/recent"),
+        Scenario("GET", "/activities/{activity_id}", f"/activities/{ctx['activity_id']}"),
+        Scenario("GET", "/documents/", "/documents/"),
+        Scenario("GET", "/documents/{doc_id}", f"/documents/{ctx['document_id']}"),
+        Scenario("GET", "/memories/", "/memories/"),
+        Scenario("GET", "/memories/search", "/memories/search?q=orçamento"),
+        Scenario("GET", "/calendar/", f"/calendar/?start={week_ago}&end={in_week}"),
+        Scenario("GET", "/archive/stats", "/archive/stats"),
+        Scenario("GET", "/metrics", "/metrics"),
+        Scenario("GET", "/debug/slow-queries", "/debug/slow-queries"),
+        Scenario("GET", "/tasks/", "/tasks/", {"headers": {"X-Kalu-Profile": "1"}}, label="com profiler",
+                 after=remember_profile),
+        Scenario("GET", "/debug/profiles", "/debug/profiles"),
+        Scenario("GET", "/debug/profiles/{profile_id}", lambda i: f"/debug/profiles/{ctx['profile_id']}"),
+        Scenario("GET", "/tasks/{task_id}/download/{format}", f"/tasks/{task}/download/docx",
+                 {"headers": {"traceparent": f"00-{'b' * 32}-{'c' * 16}-01"}}, label="docx com tracing",
+                 after=remember_trace),
+        Scenario("GET", "/debug/traces", "/debug/traces"),
+        Scenario("GET", "/debug/traces/{trace_id}", lambda i: f"/debug/traces/{ctx['trace_id']}"),
+        Scenario("GET", "/cache/stats", "/cache/stats"),
+        Scenario("GET", "/export/tasks", "/export/tasks", heavy=True),
+        Scenario("GET", "/export/tasks", "/export/tasks?format=csv", heavy=True, label="csv"),
+        Scenario("GET", "/export/activities", "/export/activities", heavy=True),
+        Scenario("GET", "/export/documents", "/export/documents", heavy=True),
+        Scenario("GET", "/export/memories", "/export/memories", heavy=True),
+        Scenario("GET", "/export/calendar", "/export/calendar", heavy=True),
+        # ----- relatório consolidado (POST espera pelo fim do job, fora do tempo medido) -----
+        Scenario("POST", "/reports/empresa/{empresa}", f"/reports/empresa/{ctx['empresa']}",
+                 {"params": {"date_from": report_from, "formats": "docx,xlsx,pdf"}}, heavy=True, after=remember_job),
+        Scenario("GET", "/reports/jobs/{job_id}", lambda i: f"/reports/jobs/{ctx['job_id']}"),
+        Scenario("GET", "/reports/jobs/{job_id}/download/{format}",
+                 lambda i: f"/reports/jobs/{ctx['job_id']}/download/docx", label="docx"),
+        Scenario("GET", "/reports/jobs/{job_id}/download/{format}",
+                 lambda i: f"/reports/jobs/{ctx['job_id']}/download/xlsx", label="xlsx"),
+        # ----- escritas -----
+        Scenario("POST", "/token", "/token", {"data": {"username": "Oscar", "password": "Kalu2026"}}),
+        Scenario("POST", "/tasks/", "/tasks/", lambda i: {"json": task_item(i)}),
+        Scenario("POST", "/tasks/bulk", "/tasks/bulk", lambda i: {"json": [task_item(i * 1000 + j) for j in range(500)]}),
+        Scenario("PATCH", "/tasks/bulk", "/tasks/bulk",
+                 {"json": [{"id": task_id, "prioridade": "Baixa"} for task_id in ctx["bundle_ids"]]}),
+        Scenario("PUT", "/tasks/{task_id}", f"/tasks/{task}", {"json": {"prioridade": "Alta"}}),
+        Scenario("PATCH", "/tasks/{task_id}", f"/tasks/{task}", {"json": {"prioridade": "Média"}}),
+        Scenario("POST", "/tasks/{task_id}/result", lambda i: f"/tasks/{ctx['delete_task_ids'][-1 - i]}/result",
+                 {"json": {"resultado": json.dumps({"resumo": "x" * 2000}), "resultado_tipo": "json"}}),
+        Scenario("POST", "/activities/", "/activities/", {"params": {"tipo": "heartbeat", "titulo": "Bench"}}),
+        Scenario("POST", "/activities/bulk", "/activities/bulk",
+                 {"json": [{"type": "heartbeat", "title": f"Bench {j}"} for j in range(500)]}),
+        Scenario("POST", "/documents/", "/documents/", {"params": {"titulo": "Bench", "tipo": "json", "conteudo": "{}"}}),
+        Scenario("POST", "/documents/bulk", "/documents/bulk",
+                 {"json": [{"title": f"Bench {j}", "doc_type": "json", "content": "{}"} for j in range(500)]}),
+        Scenario("POST", "/memories/", "/memories/", {"params": {"tipo": "fact", "titulo": "Bench", "conteudo": "x"}}),
+        Scenario("POST", "/memories/bulk", "/memories/bulk",
+                 {"json": [{"type": "fact", "title": f"Bench {j}", "content": "x"} for j in range(500)]}),
+        Scenario("POST", "/calendar/", "/calendar/", {"params": {"titulo": "Bench", "start_date": in_week}}),
+        Scenario("POST", "/calendar/bulk", "/calendar/bulk",
+                 {"json": [{"title": f"Bench {j}", "start_date": in_week} for j in range(500)]}),
+        Scenario("POST", "/import/{entity}", "/import/memories?keep_ids=false",
+                 {"content": import_body.encode(), "headers": {"Content-Type": "application/x-ndjson"}}, heavy=True),
+        # ----- destrutivos -----
+        Scenario("DELETE", "/tasks/{task_id}", lambda i: f"/tasks/{ctx['delete_task_ids'][i]}"),
+        Scenario("DELETE", "/documents/{doc_id}", lambda i: f"/documents/{ctx['delete_document_ids'][i]}"),
+        Scenario("DELETE", "/calendar/{event_id}", lambda i: f"/calendar/{ctx['delete_event_ids'][i]}"),
+        Scenario("POST", "/archive/run", "/archive/run", heavy=True),
+    ]
+
+
+def uncovered_routes(app, covered: List[Scenario]) -> List[str]:
+    """Rotas do main.py sem cenário (para o benchmark não ficar desactualizado em silêncio)"""
+    from fastapi.routing import APIRoute
+
+    done = {(s.method, s.route) for s in covered}
+    missing = []
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            for method in sorted(route.methods - {"HEAD"}):
+                if (method, route.path) not in done:
+                    missing.append(f"{method} {route.path}")
+    return missing
+
+
+# ---------- medição ----------
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def wait_for_report(client, job_id: str) -> float:
+    started = time.perf_counter()
+    while time.perf_counter() - started < REPORT_TIMEOUT:
+        status = client.get(f"/reports/jobs/{job_id}").json()["status"]
+        if status in ("done", "failed"):
+            break
+        time.sleep(0.2)
+    return time.perf_counter() - started
+
+
+def measure(client, scenario: Scenario, repeat: int, warmup: int) -> Dict[str, Any]:
+    runs = 1 if scenario.heavy else repeat
+    warm = 0 if scenario.heavy else warmup
+    times, statuses, size, queries, response = [], set(), 0, None, None
+    for i in range(warm + runs):
+        url = scenario.url(i) if callable(scenario.url) else scenario.url
+        kwargs = scenario.kwargs(i) if callable(scenario.kwargs) else scenario.kwargs
+        started = time.perf_counter()
+        response = client.request(scenario.method, url, **kwargs)
+        elapsed = time.perf_counter() - started
+        if i >= warm:
+            times.append(elapsed * 1000)
+            statuses.add(response.status_code)
+            size = len(response.content)
+            queries = response.headers.get("x-db-queries")
+
+    result = {
+        "runs": runs,
+        "status": sorted(statuses),
+        "median_ms": round(statistics.median(times), 2),
+        "p95_ms": round(_percentile(times, 0.95), 2),
+        "min_ms": round(min(times), 2),
+        "max_ms": round(max(times), 2),
+        "bytes": size,
+        "db_queries": int(queries) if queries is not None else None,
+    }
+    if scenario.after and response is not None and response.status_code < 400:
+        scenario.after(response)
+        if response.headers.get("content-type", "").startswith("application/json") and "job_id" in response.json():
+            result["job_seconds"] = round(wait_for_report(client, response.json()["job_id"]), 2)
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> Dict[str, Any]:
+    volumes = seed_data.volumes_from_args(args)
+    template = seed_data.template_path(volumes, args.seed, args.days, args.result_kb)
+    seed_data.build_template(template, volumes, args.seed, args.days, args.result_kb)
+
+    main = load_app(
+        CACHE_ENABLED="true" if args.cache else "false",
+        ARCHIVE_INTERVAL="0",  # a thread do arquivo não mexe nos dados a meio
+        SQL_SLOW_QUERY_EXPLAIN="false",
+        # Tracing ligado mas sem amostragem: só o cenário com traceparent é traçado
+        TRACING_ENABLED="true",
+        TRACE_SAMPLE_RATE="0",
+        TRACE_FILE=os.path.join(tempfile.gettempdir(), "kalu_bench_traces.jsonl"),
+    )
+    copied, copy_s = timed(seed_data.load_template, main.database.engine, template)
+    print(f"📦 Dados copiados em {copy_s:.1f}s: " + ", ".join(f"{t}={n:,}" for t, n in copied.items()))
+
+    client = authenticated_client(main)
+    ctx = discover(main.database.engine)
+    selected = [s for s in scenarios(ctx) if not args.only or re.search(args.only, s.name)]
+
+    endpoints = {}
+    for scenario in selected:
+        result = measure(client, scenario, args.repeat, args.warmup)
+        endpoints[scenario.name] = result
+        ok = all(code < 400 for code in result["status"])
+        print(f"{'✅' if ok else '⚠️'} {scenario.name:<58} {result['median_ms']:>10.1f} ms  "
+              f"p95 {result['p95_ms']:>10.1f}  {result['bytes']:>11,} B  "
+              f"{result['db_queries'] if result['db_queries'] is not None else '-':>4} q  {result['status']}")
+    client.__exit__(None, None, None)
+
+    uncovered = uncovered_routes(main.app, scenarios(ctx))
+    for route in uncovered:
+        print(f"⚠️ Sem cenário: {route}")
+
+    return {
+        "meta": {
+            "at": datetime.utcnow().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs)",
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "cache": args.cache,
+        },
+        "dataset": {
+            "volumes": volumes, "seed": args.seed, "days": args.days, "result_kb": args.result_kb,
+            "rows": copied, "copy_seconds": round(copy_s, 2),
+        },
+        "endpoints": endpoints,
+        "uncovered": uncovered,
+    }
+
+
+def compare(results: Dict[str, Any], baseline_path: str, threshold: float) -> bool:
+    """Mostra a variação da mediana face a uma corrida anterior; False se alguma piorou além do limiar"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("dataset", {}).get("volumes") != results["dataset"]["volumes"]:
+        print("⚠️ Volumes diferentes da corrida de referência - comparação pouco fiável")
+    ok = True
+    print(f"\n📊 Comparação com {baseline_path} (limiar {threshold:.2f}x)")
+    for name, result in results["endpoints"].items():
+        before = baseline.get("endpoints", {}).get(name)
+        if not before or not before["median_ms"]:
+            continue
+        ratio = result["median_ms"] / before["median_ms"]
+        # Ignorar ruído em pedidos muito rápidos (< 1 ms de diferença)
+        regressed = ratio > threshold and result["median_ms"] - before["median_ms"] > 1
+        ok &= not regressed
+        print(f"{'❌' if regressed else '  '} {name:<58} {before['median_ms']:>10.1f} -> {result['median_ms']:>10.1f} ms  ({ratio:.2f}x)")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    seed_data.add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5, help="pedidos medidos por endpoint")
+    parser.add_argument("--warmup", type=int, default=1, help="pedidos de aquecimento (não medidos)")
+    parser.add_argument("--only", help="regex: só os endpoints cujo nome coincide (ex: 'GET /tasks')")
+    parser.add_argument("--cache", action="store_true", help="manter a cache de respostas ligada")
+    parser.add_argument("--output", help="gravar os resultados neste ficheiro JSON")
+    parser.add_argument("--compare", help="ficheiro JSON de uma corrida anterior")
+    parser.add_argument("--threshold", type=float, default=1.25, help="regressão = mediana acima de N x a anterior")
+    parser.add_argument("--json", action="store_true", help="imprimir resultados em JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"✅ Resultados em {args.output}")
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    ok = compare(results, args.compare, args.threshold) if args.compare else True
+    sys.exit(0 if ok else 1)
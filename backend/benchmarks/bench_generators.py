@@ -0,0 +1,316 @@
+"""
+Benchmark: geradores de documentos por formato, com baseline e gate de regressão
+================================================================================
+
+Mede separadamente markdown, HTML, DOCX, XLSX e PDF para um corpus de
+resultados de tamanho e forma diferentes (de um dict pequeno a dezenas de
+milhares de linhas, aninhamento profundo e texto livre grande):
+
+    tempo       mediana e mínimo de --repeat gerações (menos nos payloads
+                grandes); o gate compara o mínimo, mais estável com ruído
+    memória     pico do tracemalloc numa geração à parte (o tracemalloc
+                atrasa o código, por isso não entra na medição de tempo)
+
+O HTML parte do markdown já gerado e o PDF do HTML já gerado, para cada
+medição ser só desse passo. O PDF é renderizado pelos workers do
+pdf_service (noutro processo): a memória reportada é só a do processo da API.
+
+Os resultados são comparados com um ficheiro de baseline (--baseline);
+sai com erro se algum caso piorar mais do que --time-threshold em tempo ou
+--memory-threshold em memória. A baseline de referência está no repositório
+(generators_baseline.json, com a máquina em que foi gerada); se o ficheiro
+não existir o gate falha - só --update-baseline grava uma nova. Casos sem
+entrada na baseline (ex: pdf numa máquina sem backend de PDF) são avisados
+e não contam. Tempos só são comparáveis na mesma máquina (em VMs
+partilhadas, com ruído de 20-30%, subir --time-threshold); a memória é
+quase determinística.
+
+Uso:
+    python benchmarks/bench_generators.py --update-baseline
+    python benchmarks/bench_generators.py                 # gate: exit 1 se regrediu
+    python benchmarks/bench_generators.py --corpus tiny nested --formats docx xlsx
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from common import BACKEND_DIR, REPO_DIR
+
+for _path in (REPO_DIR, BACKEND_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
+
+from kalu_document_generator import generate_markdown_report, generate_html_report  # noqa: E402
+from kalu_document_generator_advanced import (  # noqa: E402
+    generate_word_document, generate_excel_document, generate_pdf_from_html,
+)
+import pdf_service  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "generators_baseline.json")
+FORMATS = ["markdown", "html", "docx", "xlsx", "pdf"]
+TITLE = "Benchmark de geradores"
+
+# Diferenças abaixo disto são ruído, mesmo que a percentagem seja grande
+MIN_TIME_DELTA_MS = 2.0
+MIN_MEMORY_DELTA_KB = 64.0
+BIG_CASE_SECONDS = 1.0  # casos mais lentos do que isto correm só 3 vezes
+HUGE_CASE_SECONDS = 10.0  # e mais lentos do que isto só uma
+
+LOREM = (
+    "A análise do mercado de Luanda mostra crescimento sustentado na procura, com margens "
+    "pressionadas pelo custo de importação e pela concorrência informal. Recomenda-se rever "
+    "o plano de distribuição e reforçar a presença digital antes do próximo trimestre. "
+)
+
+
+# ---------- corpus ----------
+
+def tiny() -> dict:
+    return {"status": "ok", "empresa": "Triple O", "total": 3, "conclusao": "Sem alterações."}
+
+
+def typical() -> dict:
+    """O formato mais comum dos resultados do Kalu (análise com listas de registos)"""
+    return {
+        "analise_concorrentes": {
+            "data": "2026-02-12",
+            "mercado": "Angola - Luanda",
+            "segmento": "Moda",
+            "concorrentes_locais": [
+                {"nome": f"Loja {i}", "tipo": "Retalho", "faixa_preco": "Médio", "diferencial": "Localização"}
+                for i in range(8)
+            ],
+            "analise_precos": {"mercado_local": {"baixo": "5.000 Kz", "alto": "50.000 Kz"}, "observacoes": "Estável"},
+            "recomendacoes": [{"acao": f"Acção {i}", "prioridade": "Alta"} for i in range(5)],
+            "conclusao": LOREM,
+        }
+    }
+
+
+def nested(depth: int = 5, fanout: int = 3) -> dict:
+    """Dicts aninhados em profundidade (secções dentro de secções)"""
+    def level(d: int) -> Any:
+        if d == 0:
+            return {"valor": d, "nota": "folha", "lista": ["a", "b", "c"]}
+        return {f"secao_{d}_{i}": level(d - 1) for i in range(fanout)}
+    return {"estrutura": level(depth)}
+
+
+def long_list(rows: int = 5000) -> dict:
+    return {
+        "relatorio_vendas": {
+            "empresa": "Triple O",
+            "linhas": [
+                {"id": i, "produto": f"Produto {i % 500}", "quantidade": i % 17, "valor": round(i * 1.37, 2),
+                 "regiao": ["Luanda", "Benguela", "Huambo"][i % 3]}
+                for i in range(rows)
+            ],
+        }
+    }
+
+
+def wide_table(rows: int = 500, columns: int = 40) -> dict:
+    return {"matriz": [{f"coluna_{c}": round(r * c * 0.01, 2) for c in range(columns)} for r in range(rows)]}
+
+
+def big_text(kilobytes: int = 1024) -> dict:
+    """Texto livre grande em poucos campos (relatórios narrativos)"""
+    paragraph_count = kilobytes * 1024 // len(LOREM)
+    return {
+        "titulo": "Relatório narrativo",
+        "resumo": LOREM * 20,
+        "corpo": "\n\n".join(LOREM * 3 for _ in range(paragraph_count // 3)),
+        "anexos": [LOREM * 50 for _ in range(5)],
+    }
+
+
+def huge() -> dict:
+    """Tudo junto e em grande: 20k linhas, tabela larga, aninhamento e 2 MB de texto"""
+    data = long_list(20_000)
+    data.update(nested())
+    data.update(big_text(2048))
+    data["matriz"] = wide_table(1000, 30)["matriz"]
+    return data
+
+
+CORPUS: Dict[str, Callable[[], dict]] = {
+    "tiny": tiny,
+    "typical": typical,
+    "nested": nested,
+    "long_list": long_list,
+    "wide_table": wide_table,
+    "big_text": big_text,
+    "huge": huge,
+}
+
+
+# ---------- medição ----------
+
+def _steps(data: dict) -> Dict[str, Callable[[], Any]]:
+    """Uma função por formato; HTML e PDF recebem a entrada do passo anterior já pronta"""
+    markdown = generate_markdown_report(data, TITLE)
+    html = generate_html_report(markdown)
+    return {
+        "markdown": lambda: generate_markdown_report(data, TITLE),
+        "html": lambda: generate_html_report(markdown),
+        "docx": lambda: generate_word_document(data, TITLE, io.BytesIO()),
+        "xlsx": lambda: generate_excel_document(data, TITLE, io.BytesIO()),
+        "pdf": lambda: generate_pdf_from_html(html, io.BytesIO()),
+    }
+
+
+def _output_size(result: Any) -> int:
+    if isinstance(result, str):
+        return len(result.encode("utf-8"))
+    if isinstance(result, io.BytesIO):
+        return len(result.getvalue())
+    return 0
+
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    # Aquecimento: caches (template do Word, estilos) e import tardio de bibliotecas
+    started = time.perf_counter()
+    result = fn()
+    first = time.perf_counter() - started
+    if first >= HUGE_CASE_SECONDS:
+        runs = 1
+    else:
+        runs = repeat if first < BIG_CASE_SECONDS else min(repeat, 3)
+
+    # Como o timeit: sem pausas do GC a meio das medições
+    samples = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(runs):
+            started = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - started)
+    finally:
+        gc.enable()
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(samples) * 1000, 2),
+        "min_ms": round(min(samples) * 1000, 2),
+        "peak_kb": round(peak / 1024, 1),
+        "output_bytes": _output_size(result),
+    }
+
+
+def run(corpus: List[str], formats: List[str], repeat: int) -> Dict[str, Any]:
+    cases = {}
+    pdf_available = "pdf" in formats and pdf_service.renderer.health()["healthy"]
+    if "pdf" in formats and not pdf_available:
+        print("⚠️ PDF indisponível (wkhtmltopdf/weasyprint) - formato pdf ignorado")
+    for name in corpus:
+        data = CORPUS[name]()
+        input_kb = len(json.dumps(data, ensure_ascii=False).encode("utf-8")) / 1024
+        steps = _steps(data)
+        for fmt in formats:
+            if fmt == "pdf" and not pdf_available:
+                continue
+            result = measure(steps[fmt], repeat)
+            result["input_kb"] = round(input_kb, 1)
+            cases[f"{name}/{fmt}"] = result
+            print(f"{name:<11} {fmt:<9} {result['median_ms']:>10.1f} ms  pico {result['peak_kb']:>10.0f} KB  "
+                  f"entrada {input_kb:>8.0f} KB  saída {result['output_bytes']:>11,} B")
+    return {
+        "machine": f"{platform.system()} {platform.machine()} ({os.cpu_count()} CPUs), Python {platform.python_version()}",
+        "cases": cases,
+    }
+
+
+# ---------- baseline ----------
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], time_threshold: float,
+            memory_threshold: float) -> List[str]:
+    """Lista de regressões (vazia se tudo dentro dos limiares)"""
+    if baseline.get("machine") != results["machine"]:
+        print(f"⚠️ Baseline de outra máquina ({baseline.get('machine')}) - tempos pouco fiáveis")
+    regressions = []
+    missing = [case for case in results["cases"] if case not in baseline.get("cases", {})]
+    if missing:
+        print(f"⚠️ Sem baseline para {', '.join(missing)} - não comparados (usar --update-baseline)")
+    for case, now in results["cases"].items():
+        before = baseline.get("cases", {}).get(case)
+        if not before:
+            continue
+        # O mínimo é o tempo menos afectado por carga externa na máquina
+        if (now["min_ms"] > before["min_ms"] * (1 + time_threshold)
+                and now["min_ms"] - before["min_ms"] > MIN_TIME_DELTA_MS):
+            regressions.append(f"{case}: tempo mínimo {before['min_ms']:.1f} -> {now['min_ms']:.1f} ms "
+                               f"({now['min_ms'] / before['min_ms']:.2f}x)")
+        if (now["peak_kb"] > before["peak_kb"] * (1 + memory_threshold)
+                and now["peak_kb"] - before["peak_kb"] > MIN_MEMORY_DELTA_KB):
+            regressions.append(f"{case}: memória {before['peak_kb']:.0f} -> {now['peak_kb']:.0f} KB "
+                               f"({now['peak_kb'] / before['peak_kb']:.2f}x)")
+    return regressions
+
+
+def load_baseline(path: str) -> Optional[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, results: Dict[str, Any], merge_into: Optional[Dict[str, Any]] = None):
+    """Grava a baseline; numa corrida parcial (--corpus/--formats) só substitui os casos medidos"""
+    if merge_into and merge_into.get("machine") == results["machine"]:
+        results = {**merge_into, "machine": results["machine"], "cases": {**merge_into["cases"], **results["cases"]}}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False, sort_keys=True)
+    print(f"✅ Baseline gravada em {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--corpus", nargs="+", choices=list(CORPUS), default=list(CORPUS))
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--repeat", type=int, default=10, help="gerações medidas por caso (mediana)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="ficheiro de baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="gravar esta corrida como baseline")
+    parser.add_argument("--time-threshold", type=float, default=0.25, help="regressão de tempo (0.25 = +25%%)")
+    parser.add_argument("--memory-threshold", type=float, default=0.10, help="regressão de memória (0.10 = +10%%)")
+    parser.add_argument("--json", action="store_true", help="imprimir resultados em JSON")
+    args = parser.parse_args()
+
+    pdf_service.renderer.start()
+    try:
+        results = run(args.corpus, args.formats, args.repeat)
+    finally:
+        pdf_service.renderer.stop()
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+
+    baseline = load_baseline(args.baseline)
+    if args.update_baseline:
+        save_baseline(args.baseline, results, baseline)
+        sys.exit(0)
+    if baseline is None:
+        print(f"❌ Baseline {args.baseline} não encontrada - gerar com --update-baseline")
+        sys.exit(2)
+
+    regressions = compare(results, baseline, args.time_threshold, args.memory_threshold)
+    for regression in regressions:
+        print(f"❌ {regression}")
+    if not regressions:
+        print(f"✅ Sem regressões face a {args.baseline}")
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,89 @@
+"""
+Benchmark: serialização das listagens (caminho normal vs fast_json)
+==================================================================
+
+Compara GET /tasks/ com o caminho actual (objectos ORM + modelo pydantic
+por linha + json.dumps) e com o caminho rápido (tuplos de colunas +
+orjson directamente para bytes) a 100, 1k e 10k linhas. A cache de
+respostas fica desligada para medir sempre a query e a serialização.
+
+Uso:
+    python benchmarks/bench_serialization.py --repeat 5
+"""
+
+import argparse
+import json
+import statistics
+
+from common import load_app, authenticated_client, timed
+
+SIZES = [100, 1000, 10000]
+
+
+def seed_tasks(main, rows: int):
+    """Insere `rows` tarefas com resultado (o campo mais pesado) numa só transacção"""
+    import bulk
+    import database
+
+    resultado = json.dumps({"resumo": "Análise concluída", "linhas": list(range(50))}, ensure_ascii=False)
+    db = database.SessionLocal()
+    try:
+        bulk.bulk_insert(db, database.Task, [
+            {
+                "titulo": f"Tarefa {i}", "descricao": "Descrição " * 10, "empresa": "Triple O",
+                "prioridade": "Alta", "status": "Concluída", "tags": "bench,serialização",
+                "resultado": resultado, "resultado_tipo": "json",
+            }
+            for i in range(rows)
+        ])
+        db.commit()
+    finally:
+        db.close()
+
+
+def measure(client, fast_json, fast: bool, limit: int, repeat: int):
+    fast_json.FAST_LIST_SERIALIZATION = fast
+    samples, body = [], b""
+    for _ in range(repeat):
+        response, seconds = timed(client.get, "/tasks/", params={"limit": limit})
+        response.raise_for_status()
+        samples.append(seconds)
+        body = response.content
+    return statistics.median(samples), body
+
+
+def run(repeat: int):
+    main = load_app(CACHE_ENABLED="false", ACTIVITY_WRITE_MODE="sync")
+    import fast_json
+
+    client = authenticated_client(main)
+    seed_tasks(main, max(SIZES))
+    results = {}
+
+    for limit in SIZES:
+        default_s, default_body = measure(client, fast_json, False, limit, repeat)
+        fast_s, fast_body = measure(client, fast_json, True, limit, repeat)
+        same = json.loads(default_body) == json.loads(fast_body)
+        results[limit] = {
+            "default_ms": round(default_s * 1000, 2),
+            "fast_ms": round(fast_s * 1000, 2),
+            "speedup": round(default_s / fast_s, 1),
+            "bytes": len(fast_body),
+            "identical": same,
+        }
+        print(f"{limit:>6} linhas   normal: {default_s * 1000:>8.2f} ms   "
+              f"fast: {fast_s * 1000:>8.2f} ms   ({default_s / fast_s:.1f}x)"
+              f"{'' if same else '   ⚠️ respostas diferentes'}")
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--repeat", type=int, default=5, help="pedidos por medição (mediana)")
+    parser.add_argument("--json", action="store_true", help="imprimir resultados em JSON")
+    args = parser.parse_args()
+
+    results = run(args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
@@ -0,0 +1,80 @@
+"""
+Benchmark: geração de Excel para resultados grandes
+===================================================
+
+Gera XLSX (generate_excel_document, modo write-only) para resultados com
+1k, 10k e 100k linhas e mede tempo, linhas/segundo, pico de memória
+(tracemalloc) e tamanho do ficheiro. Com escrita em streaming o pico de
+memória deve crescer muito menos do que o nº de linhas. O tempo é medido
+numa geração sem tracemalloc e o pico de memória numa segunda geração.
+
+Uso:
+    python benchmarks/bench_xlsx.py --rows 1000 10000 100000
+"""
+
+import argparse
+import io
+import json
+import sys
+import tracemalloc
+
+from common import BACKEND_DIR, timed
+
+sys.path.insert(0, BACKEND_DIR)
+
+from kalu_document_generator_advanced import generate_excel_document  # noqa: E402
+
+
+def make_result(rows: int) -> dict:
+    """Resultado típico: resumo + uma lista grande de registos tipados"""
+    return {
+        "relatorio_vendas": {
+            "empresa": "Triple O",
+            "data": "2026-02-12",
+            "resumo": {"total": rows, "moeda": "AOA"},
+            "linhas": [
+                {
+                    "id": i,
+                    "produto": f"Produto {i % 500}",
+                    "quantidade": i % 17,
+                    "valor": round(i * 1.37, 2),
+                    "data": f"2026-{1 + i % 12:02d}-{1 + i % 28:02d}",
+                    "pago": i % 3 == 0,
+                }
+                for i in range(rows)
+            ],
+        }
+    }
+
+
+def run(sizes):
+    results = {}
+    for rows in sizes:
+        data = make_result(rows)
+        buffer, seconds = timed(generate_excel_document, data, "Benchmark", io.BytesIO())
+        # Segunda geração só para o pico de memória (tracemalloc abranda muito o tempo)
+        tracemalloc.start()
+        generate_excel_document(data, "Benchmark", io.BytesIO())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size = buffer.getbuffer().nbytes
+        results[rows] = {
+            "seconds": round(seconds, 3),
+            "rows_per_s": round(rows / seconds),
+            "peak_mib": round(peak / 2**20, 1),
+            "file_kib": round(size / 1024),
+        }
+        print(f"{rows:>7} linhas   {seconds:>7.2f} s   {rows / seconds:>9.0f} linhas/s   "
+              f"pico {peak / 2**20:>7.1f} MiB   ficheiro {size / 1024:>8.0f} KiB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--json", action="store_true", help="imprimir resultados em JSON")
+    args = parser.parse_args()
+
+    results = run(args.rows)
+    if args.json:
+        print(json.dumps(results, indent=2))
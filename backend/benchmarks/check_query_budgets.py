@@ -0,0 +1,93 @@
+"""
+Verificação: orçamento de queries SQL por endpoint
+==================================================
+
+Cria uma base de dados com dados de exemplo e chama cada endpoint de leitura
+dentro de sql_profile.query_budget(). Falha (exit 1) se algum endpoint
+executar mais queries do que o orçamento - ex: um N+1 introduzido numa
+listagem. A cache de respostas é desligada para medir o caminho completo.
+
+Os orçamentos incluem a query de autenticação (auth.get_current_user).
+
+Uso:
+    python benchmarks/check_query_budgets.py --rows 50
+"""
+
+import argparse
+import json
+import sys
+
+from common import load_app, authenticated_client
+
+# endpoint -> nº máximo de queries
+QUERY_BUDGETS = {
+    "/users/me": 1,
+    "/tasks/": 2,
+    "/tasks/pending": 1,
+    "/tasks/{task_id}": 2,
+    "/tasks/{task_id}/full": 6,  # inclui as actividades arquivadas (activities_archive)
+    "/stats/overview": 3,
+    "/stats/by-empresa": 3,
+    "/dashboard/bootstrap": 7,
+    "/activities/": 2,
+    "/activities/recent": 1,
+    "/documents/": 2,
+    "/memories/": 2,
+    "/calendar/": 2,
+    "/export/tasks": 3,  # tarefas quentes + tasks_archive
+    "/archive/stats": 6,
+}
+
+
+def seed(client, rows: int) -> int:
+    """Tarefas, documentos, memórias e actividades ligadas; devolve o id de uma tarefa"""
+    tasks = [{"title": f"Tarefa {i}", "company": ["Triple O", "Kalu"][i % 2]} for i in range(rows)]
+    ids = [item["id"] for item in client.post("/tasks/bulk", json=tasks).json()["items"]]
+    client.post("/documents/bulk", json=[
+        {"title": f"Documento {i}", "doc_type": "json", "content": "{}", "task_id": ids[i % len(ids)]}
+        for i in range(rows)
+    ])
+    client.post("/memories/bulk", json=[{"type": "fact", "title": f"Memória {i}", "content": "x"} for i in range(rows)])
+    client.post("/activities/bulk", json=[
+        {"type": "task", "title": f"Actividade {i}", "target_id": ids[i % len(ids)], "target_type": "task"}
+        for i in range(rows)
+    ])
+    return ids[0]
+
+
+def run(rows: int):
+    main = load_app(CACHE_ENABLED="false", ACTIVITY_WRITE_MODE="sync")
+    import sql_profile
+
+    client = authenticated_client(main)
+    task_id = seed(client, rows)
+
+    results, failures = {}, []
+    for endpoint, budget in QUERY_BUDGETS.items():
+        path = endpoint.format(task_id=task_id)
+        try:
+            with sql_profile.query_budget(budget, f"GET {endpoint}") as log:
+                response = client.get(path)
+            ok = True
+        except sql_profile.QueryBudgetExceeded as e:
+            failures.append(str(e))
+            ok = False
+        response.raise_for_status()
+        results[endpoint] = {"queries": log.count, "budget": budget, "ok": ok}
+        print(f"{'✅' if ok else '❌'} {endpoint:<28} {log.count:>3} / {budget} queries")
+
+    for failure in failures:
+        print(f"\n{failure}")
+    return results, not failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, default=50, help="linhas de exemplo por entidade")
+    parser.add_argument("--json", action="store_true", help="imprimir resultados em JSON")
+    args = parser.parse_args()
+
+    results, ok = run(args.rows)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,54 @@
+"""
+Kalu Benchmarks - utilitários comuns
+====================================
+
+Arranca a API em processo (TestClient) contra uma base de dados SQLite
+descartável, para que os benchmarks nunca toquem na base de dados real.
+"""
+
+import os
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+
+def load_app(db_path: str = None, **env):
+    """
+    Importa main.py apontado para uma base de dados SQLite temporária
+
+    Args:
+        db_path: Caminho do ficheiro SQLite (criado em /tmp se None)
+        env: Variáveis de ambiente extra (ex: ACTIVITY_WRITE_MODE="sync")
+    """
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="kalu_bench_"), "bench.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ.update({k: str(v) for k, v in env.items()})
+    for path in (REPO_DIR, BACKEND_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    import main
+    return main
+
+
+def authenticated_client(main, username: str = "Oscar", password: str = "Kalu2026"):
+    """TestClient já autenticado (header Authorization em todos os pedidos)"""
+    from fastapi.testclient import TestClient
+
+    client = TestClient(main.app)
+    client.__enter__()  # corre os eventos de startup
+    response = client.post("/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+    return client
+
+
+def timed(fn: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    """Executa fn e devolve (resultado, segundos)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,391 @@
+"""
+Teste de carga: tráfego misto em ciclo fechado (dashboards, utilizadores, heartbeat)
+===================================================================================
+
+Simula os três tipos de cliente reais contra um backend local (HTTP):
+
+    tab        separador do dashboard: GET /dashboard/bootstrap ao abrir e,
+               a cada 30 s, GET /activities/recent + GET /tasks/ (com If-None-Match,
+               como o browser)
+    user       utilizador: cria tarefas, muda o estado, abre detalhes, descarrega DOCX
+    worker     heartbeat do Kalu: GET /tasks/pending, POST /tasks/{id}/result das
+               tarefas de prioridade Alta e POST /activities/bulk no fim do ciclo
+
+Cada actor é uma thread em ciclo fechado: faz o pedido, espera pela resposta
+e só depois conta o tempo de pensar. Em --steps o nº de tabs e users é
+multiplicado por cada factor (os workers ficam fixos); por patamar sai o
+débito (req/s), p50/p99 por endpoint e a taxa de erro. O ponto de saturação
+é o primeiro patamar em que o débito deixa de crescer (< --min-gain) ou o
+p99 passa o --slo-ms.
+
+Sem --url arranca o uvicorn numa base de dados SQLite temporária e semeia
+--seed-tasks tarefas pelos endpoints /bulk.
+
+Uso:
+    python benchmarks/load_test.py --tabs 50 --users 5 --workers 1 --steps 1,2,4,8 --time-scale 0.1
+    python benchmarks/load_test.py --url http://localhost:8000 --duration 120
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from common import BACKEND_DIR
+
+EMPRESAS = ["Triple O", "Delabento IA", "IMPULSO IA", "Kalu"]
+PRIORIDADES = ["Alta", "Média", "Baixa"]
+STATUSES = ["Em Progresso", "Concluído", "Bloqueado"]
+
+
+# ---------- registo de pedidos ----------
+
+class Recorder:
+    """Latências por endpoint (template da rota, não o caminho)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+
+    def call(self, client: httpx.Client, label: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        # Conta os pedidos iniciados na janela, mesmo que acabem depois (senão os lentos ficavam de fora)
+        recording = self.recording
+        started = time.perf_counter()
+        try:
+            response = client.request(method, url, **kwargs)
+            failed = response.status_code >= 400
+        except httpx.HTTPError:
+            response, failed = None, True
+        elapsed = time.perf_counter() - started
+        if recording:
+            with self._lock:
+                self.samples[label].append(elapsed)
+                if failed:
+                    self.errors[label] += 1
+        return None if failed else response
+
+
+# ---------- actores ----------
+
+class Actor(threading.Thread):
+    def __init__(self, name: str, base_url: str, token: str, recorder: Recorder, stop: threading.Event,
+                 time_scale: float, seed: int, timeout: float = 30):
+        super().__init__(name=name, daemon=True)
+        self.client = httpx.Client(base_url=base_url, timeout=timeout,
+                                   headers={"Authorization": f"Bearer {token}"} if token else {})
+        self.recorder = recorder
+        self.stop_event = stop
+        self.time_scale = time_scale
+        self.rng = random.Random(seed)
+
+    def think(self, seconds: float) -> bool:
+        """Espera (escalada por --time-scale); False se o teste acabou"""
+        return not self.stop_event.wait(seconds * self.time_scale)
+
+    def call(self, label: str, method: str, url: str, **kwargs):
+        return self.recorder.call(self.client, label, method, url, **kwargs)
+
+    def run(self):
+        try:
+            self.loop()
+        finally:
+            self.client.close()
+
+
+class DashboardTab(Actor):
+    """Separador aberto: bootstrap e depois polling de 30 s com ETags"""
+
+    POLL_SECONDS = 30
+
+    def loop(self):
+        etags: Dict[str, str] = {}
+
+        def poll(label, url):
+            headers = {"If-None-Match": etags[url]} if url in etags else {}
+            response = self.call(label, "GET", url, headers=headers)
+            if response is not None and response.headers.get("etag"):
+                etags[url] = response.headers["etag"]
+
+        # Separadores abertos em momentos diferentes, não todos no mesmo segundo
+        if not self.think(self.rng.uniform(0, self.POLL_SECONDS)):
+            return
+        self.call("GET /dashboard/bootstrap", "GET", "/dashboard/bootstrap")
+        while self.think(self.POLL_SECONDS * self.rng.uniform(0.95, 1.05)):
+            poll("GET /activities/recent", "/activities/recent")
+            poll("GET /tasks/", "/tasks/")
+
+
+class User(Actor):
+    """Utilizador activo: cria, actualiza, abre e descarrega tarefas"""
+
+    THINK_SECONDS = 20
+
+    def loop(self):
+        known: List[int] = []
+        with_result: List[int] = []
+
+        def refresh_list():
+            response = self.call("GET /tasks/", "GET", "/tasks/")
+            if response is not None:
+                with_result[:] = [task["id"] for task in response.json() if task.get("resultado")]
+
+        while self.think(self.rng.expovariate(1 / self.THINK_SECONDS)):
+            action = self.rng.choices(["create", "status", "open", "download"], [3, 3, 3, 1])[0]
+            if action == "create" or not known:
+                response = self.call("POST /tasks/", "POST", "/tasks/", json={
+                    "titulo": f"Tarefa de carga {self.rng.randint(1, 10 ** 9)}",
+                    "empresa": self.rng.choice(EMPRESAS),
+                    "prioridade": self.rng.choice(PRIORIDADES),
+                })
+                if response is not None:
+                    known.append(response.json()["id"])
+                refresh_list()
+            elif action == "status":
+                self.call("PATCH /tasks/{task_id}", "PATCH", f"/tasks/{self.rng.choice(known)}",
+                          json={"status": self.rng.choice(STATUSES)})
+            elif action == "open" or not with_result:
+                self.call("GET /tasks/{task_id}", "GET", f"/tasks/{self.rng.choice(known)}")
+            else:
+                # Só tarefas com resultado (concluídas pelo heartbeat) têm documento
+                self.call("GET /tasks/{task_id}/download/{format}", "GET",
+                          f"/tasks/{self.rng.choice(with_result)}/download/docx")
+
+
+class HeartbeatWorker(Actor):
+    """Heartbeat do Kalu (como kalu_integration.heartbeat_check), sem autenticação"""
+
+    INTERVAL_SECONDS = 30
+    MAX_TASKS_PER_BEAT = 10
+
+    def loop(self):
+        self.client.headers.pop("Authorization", None)
+        while self.think(self.INTERVAL_SECONDS * self.rng.uniform(0.9, 1.1)):
+            response = self.call("GET /tasks/pending", "GET", "/tasks/pending")
+            if response is None:
+                continue
+            high = [task for task in response.json() if task["prioridade"] == "Alta"][:self.MAX_TASKS_PER_BEAT]
+            activities = []
+            for task in high:
+                result = {"tipo": "relatório", "empresa": task["empresa"], "dados": {"total_items": 42}}
+                self.call("POST /tasks/{task_id}/result", "POST", f"/tasks/{task['id']}/result", json={
+                    "resultado": json.dumps(result, ensure_ascii=False), "resultado_tipo": "json",
+                })
+                activities.append({"type": "task_completed", "title": f"Tarefa #{task['id']} concluída",
+                                   "target_id": task["id"], "target_type": "task"})
+            activities.append({"type": "heartbeat", "title": "Heartbeat"})
+            self.call("POST /activities/bulk", "POST", "/activities/bulk", json=activities)
+
+
+# ---------- servidor local ----------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(server_workers: int) -> Tuple[subprocess.Popen, str]:
+    """uvicorn main:app numa base de dados temporária; devolve (processo, url)"""
+    port = _free_port()
+    db_path = os.path.join(tempfile.mkdtemp(prefix="kalu_load_"), "load.db")
+    log_path = os.path.join(os.path.dirname(db_path), "server.log")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", ARCHIVE_INTERVAL="0")
+    with open(log_path, "wb") as log:
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--workers", str(server_workers),
+             "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"❌ O backend terminou ao arrancar (ver {log_path})")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                print(f"✅ Backend local em {url} (log: {log_path})")
+                return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("❌ O backend não respondeu em 60s")
+
+
+def login(url: str, username: str, password: str) -> str:
+    response = httpx.post(f"{url}/token", data={"username": username, "password": password}, timeout=30)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+def seed(url: str, token: str, tasks: int):
+    """Tarefas iniciais (5% pendentes para o Kalu, o resto concluídas) pelos endpoints /bulk"""
+    rng = random.Random(0)
+    headers = {"Authorization": f"Bearer {token}"}
+    items = [{
+        "titulo": f"Tarefa {i}",
+        "empresa": rng.choice(EMPRESAS),
+        "prioridade": rng.choice(PRIORIDADES),
+        "status": "Pendente" if rng.random() < 0.05 else "Concluído",
+    } for i in range(tasks)]
+    for start in range(0, len(items), 1000):
+        httpx.post(f"{url}/tasks/bulk", json=items[start:start + 1000], headers=headers, timeout=120).raise_for_status()
+    print(f"🌱 {tasks} tarefa(s) criadas")
+
+
+# ---------- patamares ----------
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(recorder: Recorder, seconds: float) -> Dict[str, Any]:
+    endpoints, everything = {}, []
+    for label, samples in sorted(recorder.samples.items()):
+        ordered = sorted(samples)
+        everything.extend(ordered)
+        endpoints[label] = {
+            "requests": len(ordered),
+            "rps": round(len(ordered) / seconds, 2),
+            "errors": recorder.errors.get(label, 0),
+            "p50_ms": round(_percentile(ordered, 0.5) * 1000, 1),
+            "p99_ms": round(_percentile(ordered, 0.99) * 1000, 1),
+        }
+    everything.sort()
+    total = len(everything)
+    return {
+        "requests": total,
+        "rps": round(total / seconds, 2),
+        "errors": sum(recorder.errors.values()),
+        "p50_ms": round(_percentile(everything, 0.5) * 1000, 1) if total else None,
+        "p99_ms": round(_percentile(everything, 0.99) * 1000, 1) if total else None,
+        "endpoints": endpoints,
+    }
+
+
+def run_step(url: str, token: str, tabs: int, users: int, workers: int, args) -> Dict[str, Any]:
+    recorder, stop = Recorder(), threading.Event()
+    common = (url, token, recorder, stop, args.time_scale)
+    actors = (
+        [DashboardTab(f"tab-{i}", *common, args.seed + i, args.timeout) for i in range(tabs)]
+        + [User(f"user-{i}", *common, args.seed + 10_000 + i, args.timeout) for i in range(users)]
+        + [HeartbeatWorker(f"worker-{i}", *common, args.seed + 20_000 + i, args.timeout) for i in range(workers)]
+    )
+    for actor in actors:
+        actor.start()
+    time.sleep(args.warmup)
+    recorder.recording = True
+    time.sleep(args.duration)
+    recorder.recording = False
+    stop.set()
+    for actor in actors:
+        actor.join()
+    return {"tabs": tabs, "users": users, "workers": workers, **summarize(recorder, args.duration)}
+
+
+def find_saturation(steps: List[Dict[str, Any]], min_gain: float, slo_ms: float) -> Optional[Dict[str, Any]]:
+    """Primeiro patamar em que o débito deixa de crescer com a carga ou o p99 passa o SLO"""
+    for previous, step in zip(steps, steps[1:]):
+        load_ratio = (step["tabs"] + step["users"]) / max(1, previous["tabs"] + previous["users"])
+        gain = step["rps"] / previous["rps"] - 1 if previous["rps"] else 0
+        if gain < min_gain * (load_ratio - 1) or (step["p99_ms"] or 0) > slo_ms:
+            return {
+                "at_step": step["tabs"] + step["users"],
+                "capacity_rps": max(previous["rps"], step["rps"]),
+                "reason": "p99 acima do SLO" if (step["p99_ms"] or 0) > slo_ms else "débito estagnou",
+                "last_healthy": {"tabs": previous["tabs"], "users": previous["users"], "rps": previous["rps"],
+                                 "p99_ms": previous["p99_ms"]},
+            }
+    if steps and (steps[0]["p99_ms"] or 0) > slo_ms:
+        return {"at_step": steps[0]["tabs"] + steps[0]["users"], "capacity_rps": steps[0]["rps"],
+                "reason": "p99 acima do SLO", "last_healthy": None}
+    return None
+
+
+def print_step(step: Dict[str, Any]):
+    print(f"\n📊 {step['tabs']} tabs, {step['users']} users, {step['workers']} workers: "
+          f"{step['rps']:.1f} req/s  p50 {step['p50_ms']} ms  p99 {step['p99_ms']} ms  erros {step['errors']}")
+    for label, stats in step["endpoints"].items():
+        print(f"   {label:<42} {stats['rps']:>8.2f} req/s  p50 {stats['p50_ms']:>8.1f}  "
+              f"p99 {stats['p99_ms']:>8.1f} ms  erros {stats['errors']}")
+
+
+def run(args) -> Dict[str, Any]:
+    process = None
+    url = args.url
+    if not url:
+        process, url = start_server(args.server_workers)
+    try:
+        token = login(url, args.username, args.password)
+        if process is not None and args.seed_tasks:
+            seed(url, token, args.seed_tasks)
+
+        steps = []
+        for factor in [float(f) for f in args.steps.split(",")]:
+            tabs, users = max(1, round(args.tabs * factor)), max(0, round(args.users * factor))
+            step = run_step(url, token, tabs, users, args.workers, args)
+            print_step(step)
+            steps.append(step)
+            if step["p99_ms"] and step["p99_ms"] > args.slo_ms * 10:
+                print("⚠️ p99 10x acima do SLO - patamares seguintes cancelados")
+                break
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(30)
+
+    saturation = find_saturation(steps, args.min_gain, args.slo_ms)
+    if saturation:
+        print(f"\n🔴 Saturação com {saturation['at_step']} actores ({saturation['reason']}); "
+              f"capacidade ≈ {saturation['capacity_rps']:.1f} req/s")
+    else:
+        print(f"\n🟢 Sem saturação até {steps[-1]['tabs'] + steps[-1]['users']} actores" if steps else "")
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("password", "json", "output")},
+        "steps": steps,
+        "saturation": saturation,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--url", help="backend já a correr (por omissão arranca um local)")
+    parser.add_argument("--server-workers", type=int, default=1, help="workers do uvicorn local")
+    parser.add_argument("--username", default="Oscar")
+    parser.add_argument("--password", default="Kalu2026")
+    parser.add_argument("--seed-tasks", type=int, default=2000, help="tarefas iniciais no backend local")
+    parser.add_argument("--tabs", type=int, default=50, help="separadores do dashboard abertos")
+    parser.add_argument("--users", type=int, default=5, help="utilizadores activos")
+    parser.add_argument("--workers", type=int, default=1, help="workers de heartbeat do Kalu")
+    parser.add_argument("--steps", default="1", help="factores de carga por patamar (ex: 1,2,4,8)")
+    parser.add_argument("--duration", type=float, default=60, help="segundos medidos por patamar")
+    parser.add_argument("--warmup", type=float, default=10, help="segundos por patamar antes de medir")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="multiplica os tempos de pensar/polling (0.1 = 10x mais pedidos por actor)")
+    parser.add_argument("--timeout", type=float, default=30, help="timeout por pedido (conta como erro)")
+    parser.add_argument("--slo-ms", type=float, default=1000, help="p99 acima disto = saturado")
+    parser.add_argument("--min-gain", type=float, default=0.5,
+                        help="fracção mínima do aumento de carga que tem de virar débito")
+    parser.add_argument("--seed", type=int, default=1, help="seed dos actores (reprodutível)")
+    parser.add_argument("--output", help="gravar os resultados neste ficheiro JSON")
+    parser.add_argument("--json", action="store_true", help="imprimir resultados em JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"✅ Resultados em {args.output}")
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
@@ -0,0 +1,407 @@
+"""
+Kalu Benchmarks - gerador de dados de volume
+============================================
+
+Gera uma base de dados SQLite com volumes grandes e reprodutíveis (mesma
+seed -> mesmos dados): tarefas com resultados de tamanho realista
+(distribuição log-normal), actividades, memórias, documentos e eventos.
+
+A geração é feita uma vez para um ficheiro "modelo" em cache (chave =
+volumes + seed + esquema das tabelas); cada corrida de benchmark copia o
+modelo para a base de dados da API com ATTACH + INSERT ... SELECT, que é
+muito mais rápido do que gerar de novo (o main.py recria as tabelas ao
+importar, por isso não dá para reutilizar o ficheiro directamente).
+
+Uso (só gerar o modelo, ou também uma cópia com datas até agora):
+    python benchmarks/seed_data.py --preset large
+    python benchmarks/seed_data.py --preset small --output kalu.db
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+from sqlalchemy import create_engine, event, insert
+
+from common import BACKEND_DIR, REPO_DIR
+
+SEED_CACHE_DIR = os.getenv("SEED_CACHE_DIR", os.path.join(tempfile.gettempdir(), "kalu_seed_cache"))
+
+PRESETS = {
+    "small": dict(tasks=10_000, activities=50_000, memories=1_000, documents=1_000, events=500),
+    "medium": dict(tasks=100_000, activities=500_000, memories=10_000, documents=10_000, events=2_000),
+    "large": dict(tasks=1_000_000, activities=5_000_000, memories=100_000, documents=100_000, events=10_000),
+}
+
+EMPRESAS = ["Triple O", "TRIPLE O & DB", "Delabento IA", "IMPULSO IA", "Kalu"]
+PRIORIDADES = [("Alta", 0.2), ("Média", 0.6), ("Baixa", 0.2)]
+# Quase tudo concluído: o backlog real é pequeno
+TASK_STATUS = [("Concluído", 0.95), ("Bloqueado", 0.04), ("Em Progresso", 0.005), ("Pendente", 0.005)]
+ACTIVITY_TYPES = [
+    ("task_created", "📝"), ("task_completed", "✅"), ("task_updated", "✏️"),
+    ("document_created", "📄"), ("memory_created", "🧠"), ("heartbeat", "💓"),
+]
+MEMORY_TYPES = ["conversation", "decision", "lesson", "fact"]
+CATEGORIAS = ["business", "technical", "personal", "finance", "legal"]
+IMPORTANCIAS = [("low", 0.2), ("normal", 0.6), ("high", 0.15), ("critical", 0.05)]
+DOC_TYPES = ["json", "html", "markdown", "text"]
+PROJETOS = ["Delabento IA", "IMPULSO", "Kalu Dashboard", None]
+
+WORDS = (
+    "análise mercado cliente proposta receita custo margem estratégia equipa prazo risco "
+    "contrato fornecedor logística investimento campanha vendas relatório trimestre meta "
+    "crescimento Luanda Angola produto serviço qualidade processo plano orçamento dados "
+    "resultado recomendação próximo passo reunião decisão prioridade impacto oportunidade "
+    "concorrência preço canal digital parceria licença regulamento auditoria pagamento"
+).split()
+
+CHUNK = 10_000  # linhas por executemany
+
+
+# ---------- texto e payloads ----------
+
+def _weighted(rng: random.Random, options):
+    values, weights = zip(*options)
+    return rng.choices(values, weights)[0]
+
+
+def _lognormal_size(rng: random.Random, median: int, sigma: float, low: int, high: int) -> int:
+    return int(min(high, max(low, rng.lognormvariate(math.log(median), sigma))))
+
+
+class TextPool:
+    """Parágrafos pré-gerados, combinados para obter textos de um tamanho alvo"""
+
+    def __init__(self, rng: random.Random, size: int = 2000):
+        self.rng = rng
+        self.paragraphs = [self._paragraph() for _ in range(size)]
+
+    def _sentence(self) -> str:
+        words = [self.rng.choice(WORDS) for _ in range(self.rng.randint(6, 18))]
+        return " ".join(words).capitalize() + "."
+
+    def _paragraph(self) -> str:
+        return " ".join(self._sentence() for _ in range(self.rng.randint(2, 6)))
+
+    def sentence(self) -> str:
+        return self._sentence()
+
+    def text(self, size: int) -> str:
+        parts, length = [], 0
+        while length < size:
+            paragraph = self.rng.choice(self.paragraphs)
+            parts.append(paragraph)
+            length += len(paragraph) + 2
+        return "\n\n".join(parts)[:max(size, 1)]
+
+
+def result_payload(rng: random.Random, text: TextPool, size: int) -> Dict[str, Any]:
+    """Resultado JSON ao estilo do Kalu: resumo, secções, tabela de dados e fontes"""
+    sections = max(1, size // 2500)
+    rows = max(0, min(200, size // 800))
+    body = max(100, size - rows * 120) // (sections + 1)
+    return {
+        "titulo": text.sentence(),
+        "resumo": text.text(body),
+        "analise": {f"secao_{i + 1}": {"titulo": text.sentence(), "conteudo": text.text(body)} for i in range(sections)},
+        "recomendacoes": [text.sentence() for _ in range(rng.randint(2, 8))],
+        "dados": [
+            {"item": rng.choice(WORDS), "valor": round(rng.uniform(0, 1e6), 2), "variacao": round(rng.uniform(-0.5, 0.5), 3)}
+            for _ in range(rows)
+        ],
+        "fontes": [f"https://exemplo.ao/{rng.choice(WORDS)}/{rng.randint(1, 9999)}" for _ in range(rng.randint(0, 5))],
+    }
+
+
+def result_pool(rng: random.Random, text: TextPool, median_kb: float, size: int = 1000) -> List[tuple]:
+    """(resultado, resultado_tipo) - 80% JSON, 20% texto livre; tamanhos log-normais"""
+    pool = []
+    for _ in range(size):
+        target = _lognormal_size(rng, int(median_kb * 1024), 1.0, 200, 512 * 1024)
+        if rng.random() < 0.8:
+            pool.append((json.dumps(result_payload(rng, text, target), ensure_ascii=False), "json"))
+        else:
+            pool.append((text.text(target), "text"))
+    return pool
+
+
+# ---------- linhas ----------
+
+def _timestamp(rng: random.Random, now: datetime, days: float) -> datetime:
+    return now - timedelta(seconds=rng.uniform(0, days * 86400))
+
+
+def task_rows(rng, text, count, now, days, median_kb) -> Iterator[Dict[str, Any]]:
+    results = result_pool(rng, text, median_kb)
+    for i in range(1, count + 1):
+        created = _timestamp(rng, now, days)
+        status = _weighted(rng, TASK_STATUS)
+        done = status == "Concluído"
+        completed = min(now, created + timedelta(minutes=rng.uniform(1, 48 * 60))) if done else None
+        resultado, resultado_tipo = rng.choice(results) if done else (None, None)
+        yield {
+            "id": i,
+            "titulo": f"{text.sentence()[:60]} #{i}",
+            "descricao": text.text(rng.randint(50, 600)),
+            "empresa": rng.choice(EMPRESAS),
+            "prioridade": _weighted(rng, PRIORIDADES),
+            "status": status,
+            "created_at": created,
+            "updated_at": completed or created,
+            "created_by": "Oscar",
+            "assigned_to": "Kalu" if rng.random() < 0.7 else "Oscar",
+            "resultado": resultado,
+            "resultado_tipo": resultado_tipo,
+            "tags": ",".join(rng.sample(WORDS, rng.randint(0, 3))) or None,
+            "deadline": created + timedelta(days=rng.randint(1, 30)) if rng.random() < 0.3 else None,
+            "completado_em": completed,
+        }
+
+
+def activity_rows(rng, text, count, now, days, tasks) -> Iterator[Dict[str, Any]]:
+    for i in range(1, count + 1):
+        tipo, icon = rng.choice(ACTIVITY_TYPES)
+        yield {
+            "id": i,
+            "tipo": tipo,
+            "titulo": text.sentence()[:80],
+            "descricao": text.sentence() if rng.random() < 0.5 else None,
+            "actor": "Kalu" if rng.random() < 0.8 else "Oscar",
+            "target_id": rng.randint(1, tasks) if tasks else None,
+            "target_type": "task",
+            "extra_data": json.dumps({"duracao_s": rng.randint(1, 600)}) if rng.random() < 0.3 else None,
+            "created_at": _timestamp(rng, now, days),
+            "icon": icon,
+        }
+
+
+def memory_rows(rng, text, count, now, days) -> Iterator[Dict[str, Any]]:
+    for i in range(1, count + 1):
+        created = _timestamp(rng, now, days)
+        yield {
+            "id": i,
+            "tipo": rng.choice(MEMORY_TYPES),
+            "titulo": text.sentence()[:80],
+            "conteudo": text.text(_lognormal_size(rng, 800, 1.0, 50, 20_000)),
+            "categoria": rng.choice(CATEGORIAS),
+            "importancia": _weighted(rng, IMPORTANCIAS),
+            "empresa": rng.choice(EMPRESAS),
+            "tags": ",".join(rng.sample(WORDS, rng.randint(0, 3))) or None,
+            "created_at": created,
+            "updated_at": created,
+        }
+
+
+def document_rows(rng, text, count, now, days, tasks) -> Iterator[Dict[str, Any]]:
+    for i in range(1, count + 1):
+        tipo = rng.choice(DOC_TYPES)
+        size = _lognormal_size(rng, 4096, 1.0, 100, 256 * 1024)
+        conteudo = json.dumps(result_payload(rng, text, size), ensure_ascii=False) if tipo == "json" else text.text(size)
+        yield {
+            "id": i,
+            "titulo": text.sentence()[:80],
+            "descricao": text.sentence(),
+            "tipo": tipo,
+            "conteudo": conteudo,
+            "file_size": len(conteudo.encode("utf-8")),
+            "empresa": rng.choice(EMPRESAS),
+            "projeto": rng.choice(PROJETOS),
+            "task_id": rng.randint(1, tasks) if tasks and rng.random() < 0.7 else None,
+            "tags": ",".join(rng.sample(WORDS, rng.randint(0, 3))) or None,
+            "versao": "v1",
+            "created_at": _timestamp(rng, now, days),
+            "created_by": "Kalu",
+        }
+
+
+def event_rows(rng, text, count, now, days, tasks) -> Iterator[Dict[str, Any]]:
+    for i in range(1, count + 1):
+        start = now + timedelta(seconds=rng.uniform(-days * 86400, 60 * 86400))
+        yield {
+            "id": i,
+            "titulo": text.sentence()[:60],
+            "descricao": text.sentence() if rng.random() < 0.5 else None,
+            "tipo": rng.choice(["task", "meeting", "deadline", "reminder"]),
+            "start_date": start,
+            "end_date": start + timedelta(hours=rng.randint(1, 4)),
+            "all_day": rng.random() < 0.1,
+            "empresa": rng.choice(EMPRESAS),
+            "task_id": rng.randint(1, tasks) if tasks and rng.random() < 0.5 else None,
+            "recorrente": False,
+            "cor": "#3b82f6",
+            "created_at": start - timedelta(days=1),
+        }
+
+
+# ---------- modelo em cache ----------
+
+def _database():
+    """
+    Modelos do backend, importados só quando precisos: o engine do módulo
+    database lê DATABASE_URL ao importar, que o load_app define primeiro
+    """
+    for path in (REPO_DIR, BACKEND_DIR):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+    import database
+    return database
+
+
+def _schema_fingerprint() -> str:
+    database = _database()
+    tables = database.Base.metadata.sorted_tables
+    return ";".join(f"{t.name}({','.join(c.name for c in t.columns)})" for t in tables)
+
+
+def template_path(volumes: Dict[str, int], seed: int, days: float, median_kb: float) -> str:
+    key = json.dumps([sorted(volumes.items()), seed, days, median_kb, _schema_fingerprint()])
+    digest = hashlib.sha1(key.encode()).hexdigest()[:12]
+    return os.path.join(SEED_CACHE_DIR, f"kalu_seed_{volumes['tasks']}t_{digest}.db")
+
+
+def _fast_sqlite(engine):
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.close()
+
+
+def _insert(conn, table, rows: Iterator[Dict[str, Any]], total: int):
+    started, chunk, done = time.perf_counter(), [], 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK:
+            conn.execute(insert(table), chunk)
+            done += len(chunk)
+            chunk = []
+            if done % (CHUNK * 20) == 0:
+                print(f"   {table.name}: {done:,}/{total:,} ({done / (time.perf_counter() - started):,.0f} linhas/s)")
+    if chunk:
+        conn.execute(insert(table), chunk)
+
+
+def build_template(path: str, volumes: Dict[str, int], seed: int = 42, days: float = 60,
+                   median_kb: float = 2, now: datetime = None) -> str:
+    """Gera o ficheiro modelo (ignorado se já existe)"""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+
+    database = _database()
+    rng = random.Random(seed)
+    text = TextPool(rng)
+    # "agora" fixo por seed, para os dados serem iguais entre corridas (deslocados em shift_dates)
+    now = now or datetime(2026, 1, 1)
+    engine = create_engine(f"sqlite:///{tmp}")
+    _fast_sqlite(engine)
+    database.Base.metadata.create_all(bind=engine)
+
+    tasks = volumes["tasks"]
+    generators = [
+        (database.Task, task_rows(rng, text, tasks, now, days, median_kb), tasks),
+        (database.Activity, activity_rows(rng, text, volumes["activities"], now, days, tasks), volumes["activities"]),
+        (database.Memory, memory_rows(rng, text, volumes["memories"], now, days), volumes["memories"]),
+        (database.Document, document_rows(rng, text, volumes["documents"], now, days, tasks), volumes["documents"]),
+        (database.CalendarEvent, event_rows(rng, text, volumes["events"], now, days, tasks), volumes["events"]),
+    ]
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for model, rows, total in generators:
+            print(f"🌱 {model.__tablename__}: {total:,} linhas")
+            _insert(conn, model.__table__, rows, total)
+    engine.dispose()
+    os.replace(tmp, path)
+    print(f"✅ Modelo gerado em {time.perf_counter() - started:.1f}s: {path} ({os.path.getsize(path) / 1e6:,.0f} MB)")
+    return path
+
+
+def load_template(engine, path: str, now: datetime = None) -> Dict[str, int]:
+    """
+    Copia o modelo para a base de dados da API e desloca as datas para "agora"
+
+    Returns:
+        Dict com o nº de linhas copiadas por tabela
+    """
+    database = _database()
+    copied = {}
+    shift = ((now or datetime.utcnow()) - datetime(2026, 1, 1)).total_seconds()
+    date_columns = {
+        "tasks": ["created_at", "updated_at", "deadline", "completado_em"],
+        "activities": ["created_at"],
+        "memories": ["created_at", "updated_at"],
+        "documents": ["created_at"],
+        "calendar_events": ["start_date", "end_date", "created_at"],
+    }
+    # Ligação DBAPI directa: fora dos eventos do engine (sql_profile) e com ATTACH/DETACH fora da transacção
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(f"ATTACH DATABASE '{path}' AS seed")
+        for table in database.Base.metadata.sorted_tables:
+            if table.name == database.User.__tablename__:
+                continue
+            shifted = set(date_columns.get(table.name, []))
+            columns = [c.name for c in table.columns]
+            values = [f"datetime({c}, '{shift:+.0f} seconds')" if c in shifted else c for c in columns]
+            cursor.execute(
+                f"INSERT INTO main.{table.name} ({', '.join(columns)}) "
+                f"SELECT {', '.join(values)} FROM seed.{table.name}"
+            )
+            copied[table.name] = cursor.rowcount
+        raw.commit()
+        cursor.execute("DETACH DATABASE seed")
+    finally:
+        raw.close()
+    return copied
+
+
+def volumes_from_args(args) -> Dict[str, int]:
+    volumes = dict(PRESETS[args.preset])
+    for name in volumes:
+        value = getattr(args, name, None)
+        if value is not None:
+            volumes[name] = value
+    return volumes
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Argumentos de volume partilhados pelos benchmarks que usam este gerador"""
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small", help="volumes pré-definidos")
+    for name in PRESETS["small"]:
+        parser.add_argument(f"--{name}", type=int, help=f"nº de {name} (sobrepõe o preset)")
+    parser.add_argument("--seed", type=int, default=42, help="seed do gerador (mesma seed -> mesmos dados)")
+    parser.add_argument("--days", type=float, default=60, help="intervalo de datas dos dados (dias até agora)")
+    parser.add_argument("--result-kb", type=float, default=2, help="mediana do tamanho dos resultados (KB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    add_arguments(parser)
+    parser.add_argument("--output", help="copiar também para esta base de dados SQLite (ex: kalu.db)")
+    args = parser.parse_args()
+    if args.output and os.path.exists(args.output):
+        parser.error(f"{args.output} já existe")
+
+    volumes = volumes_from_args(args)
+    path = template_path(volumes, args.seed, args.days, args.result_kb)
+    build_template(path, volumes, args.seed, args.days, args.result_kb)
+    if args.output:
+        engine = create_engine(f"sqlite:///{os.path.abspath(args.output)}")
+        _database().Base.metadata.create_all(bind=engine)
+        copied = load_template(engine, path)
+        engine.dispose()
+        print(f"✅ {args.output}: " + ", ".join(f"{name} {count:,}" for name, count in copied.items()))
+    print(path)
@@ -0,0 +1,127 @@
+"""
+Kalu Bulk Operations
+====================
+
+Helpers para os endpoints em lote: validação item a item com os schemas
+bilíngues (sucesso parcial) e inserts/updates com executemany numa
+única transacção.
+"""
+
+import os
+from typing import Any, Dict, List, Tuple, Type
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+MAX_BULK_ITEMS = int(os.getenv("MAX_BULK_ITEMS", "5000"))
+
+
+def check_size(items: List[Any]):
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo de {MAX_BULK_ITEMS} itens por pedido"
+        )
+
+
+def item_error(index: int, error) -> Dict[str, Any]:
+    """Formata o erro de um item (índice na lista enviada + mensagem)"""
+    if isinstance(error, ValidationError):
+        detail = [
+            {"loc": list(err["loc"]), "msg": err["msg"]}
+            for err in error.errors()
+        ]
+    else:
+        detail = str(error)
+    return {"index": index, "error": detail}
+
+
+def validate_items(
+    schema: Type[BaseModel],
+    items: List[Any],
+    exclude_unset: bool = False,
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    Valida cada item com o schema (aceita nomes PT ou EN)
+
+    Returns:
+        (válidos, erros): válidos como (índice, dict com nomes PT); erros por índice
+    """
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, schema.model_validate(item).dict(exclude_unset=exclude_unset)))
+        except ValidationError as e:
+            errors.append(item_error(index, e))
+    return valid, errors
+
+
+def bulk_insert(db: Session, model, rows: List[Dict[str, Any]]) -> List[int]:
+    """
+    Insere todas as linhas com um único executemany (sem commit)
+
+    Returns:
+        List[int]: IDs gerados, pela mesma ordem das linhas
+    """
+    if not rows:
+        return []
+    stmt = insert(model).returning(model.id, sort_by_parameter_order=True)
+    return list(db.execute(stmt, rows).scalars().all())
+
+
+def bulk_update(db: Session, model, rows: List[Dict[str, Any]]) -> int:
+    """Actualiza por chave primária (cada linha inclui 'id') com executemany (sem commit)"""
+    if rows:
+        db.execute(update(model), rows)
+    return len(rows)
+
+
+def bulk_response(created_or_updated: str, indexed_ids: List[Tuple[int, int]], errors: List[Dict]) -> Dict[str, Any]:
+    """Resposta comum dos endpoints em lote"""
+    return {
+        created_or_updated: len(indexed_ids),
+        "items": [{"index": index, "id": row_id} for index, row_id in indexed_ids],
+        "errors": sorted(errors, key=lambda e: e["index"]),
+    }
+
+
+def validate_updates(
+    schema: Type[BaseModel],
+    items: List[Any],
+) -> Tuple[List[Tuple[int, int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    """
+    Valida itens de update: cada um precisa de 'id' inteiro + campos do schema
+
+    Returns:
+        (válidos, erros): válidos como (índice, id, campos alterados)
+    """
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        row_id = item.get("id") if isinstance(item, dict) else None
+        if not isinstance(row_id, int) or isinstance(row_id, bool):
+            errors.append(item_error(index, "Campo 'id' em falta ou inválido"))
+            continue
+        fields = {k: v for k, v in item.items() if k != "id"}
+        try:
+            valid.append((index, row_id, schema.model_validate(fields).dict(exclude_unset=True)))
+        except ValidationError as e:
+            errors.append(item_error(index, e))
+    return valid, errors
+
+
+def create_many(db: Session, schema: Type[BaseModel], model, items: List[Any], prepare=None):
+    """
+    Valida e insere todos os itens válidos com um executemany (sem commit)
+
+    Args:
+        prepare: função opcional que ajusta cada linha validada antes do insert
+
+    Returns:
+        (índice→id, linhas inseridas, erros)
+    """
+    valid, errors = validate_items(schema, items)
+    rows = [prepare(row) if prepare else row for _, row in valid]
+    ids = bulk_insert(db, model, rows)
+    return list(zip([index for index, _ in valid], ids)), rows, errors
@@ -0,0 +1,253 @@
+"""
+Kalu Bundle
+===========
+
+Download num único ZIP de todos os formatos (HTML/DOCX/XLSX/PDF) de uma ou
+várias tarefas, seleccionadas por ids ou por filtro (empresa, status, datas).
+
+O ZIP é escrito em streaming: as tarefas são carregadas em lotes, renderizadas
+em paralelo (BUNDLE_WORKERS) com no máximo BUNDLE_PREFETCH tarefas em voo, e
+cada ficheiro é enviado ao cliente assim que a sua tarefa fica pronta (pela
+ordem da selecção). A memória depende da janela em voo, não do tamanho do
+bundle. Erros por tarefa/formato não interrompem o download - ficam no
+manifest.json escrito no fim do ZIP.
+"""
+
+import io
+import json
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+import archive
+import database
+import downloads
+import filters
+import pdf_service
+import result_render
+
+BUNDLE_WORKERS = int(os.getenv("BUNDLE_WORKERS", "4"))
+BUNDLE_PREFETCH = int(os.getenv("BUNDLE_PREFETCH", str(2 * BUNDLE_WORKERS)))  # tarefas em voo
+BUNDLE_LOAD_BATCH = 100
+
+BUNDLE_FORMATS = ("html", "docx", "xlsx", "pdf")
+# DOCX/XLSX já são ZIPs e o PDF já vem comprimido - só o HTML ganha com deflate
+COMPRESSION = {"html": zipfile.ZIP_DEFLATED}
+
+
+def parse_formats(formats: str) -> List[str]:
+    """'html,pdf' -> ['html', 'pdf'] (400 se algum formato não é suportado)"""
+    selected = [f.strip().lower() for f in formats.split(",") if f.strip()]
+    invalid = [f for f in selected if f not in BUNDLE_FORMATS]
+    if invalid or not selected:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formatos suportados: {', '.join(BUNDLE_FORMATS)}",
+        )
+    return list(dict.fromkeys(selected))
+
+
+def select_task_ids(
+    db,
+    ids: Optional[List[int]] = None,
+    empresa: str = None,
+    status: str = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+) -> List[int]:
+    """
+    Ids das tarefas do bundle (tabela quente + arquivo)
+
+    Com ids explícitos mantém a ordem pedida (repetidos removidos); com filtro
+    ordena por data de criação.
+    """
+    if ids:
+        return list(dict.fromkeys(ids))
+
+    hot = filters.filter_tasks(db.query(database.Task.id, database.Task.created_at), status, empresa)
+    hot = filters.filter_created(hot, database.Task, date_from, date_to)
+
+    cold = db.query(database.ArchivedTask.id, database.ArchivedTask.created_at)
+    if status:
+        cold = cold.filter(database.ArchivedTask.status == status)
+    if empresa:
+        cold = cold.filter(database.ArchivedTask.empresa == empresa)
+    cold = filters.filter_created(cold, database.ArchivedTask, date_from, date_to)
+
+    rows = hot.all() + cold.all()
+    rows.sort(key=lambda row: (row.created_at or datetime.min, row.id))
+    return [row.id for row in rows]
+
+
+def load_tasks(ids: List[int]) -> Iterator[Tuple[int, Optional["database.Task"]]]:
+    """(id, tarefa ou None) em lotes, com sessão própria (o pedido já terminou)"""
+    db = database.SessionLocal()
+    try:
+        for start in range(0, len(ids), BUNDLE_LOAD_BATCH):
+            chunk = ids[start:start + BUNDLE_LOAD_BATCH]
+            found = {t.id: t for t in db.query(database.Task).filter(database.Task.id.in_(chunk))}
+            missing = [task_id for task_id in chunk if task_id not in found]
+            if missing:
+                for row in db.query(database.ArchivedTask).filter(database.ArchivedTask.id.in_(missing)):
+                    found[row.id] = archive.unpack_row(database.Task, row.payload)
+            db.expunge_all()  # objectos desligados - não ficam presos à sessão
+            for task_id in chunk:
+                yield task_id, found.get(task_id)
+    finally:
+        db.close()
+
+
+def _render(task: "database.Task", formats: List[str]) -> Dict[str, Any]:
+    """Gera os ficheiros de uma tarefa (corre numa thread do executor)"""
+    from kalu_document_generator_advanced import generate_excel_document, generate_word_document
+
+    files: List[Tuple[str, BinaryIO]] = []
+    errors: Dict[str, str] = {}
+    html = data = None
+    for fmt in formats:
+        try:
+            if fmt in ("html", "pdf") and html is None:
+                html = result_render.report_html(task)
+            if fmt in ("docx", "xlsx") and data is None:
+                data = result_render.report_data(task)
+
+            if fmt == "html":
+                files.append((fmt, io.BytesIO(html.encode("utf-8"))))
+            elif fmt == "docx":
+                files.append((fmt, downloads.spool(generate_word_document, data, task.titulo)))
+            elif fmt == "xlsx":
+                files.append((fmt, downloads.spool(generate_excel_document, data, task.titulo)))
+            elif fmt == "pdf":
+                files.append((fmt, io.BytesIO(pdf_service.renderer.render(html))))
+        except Exception as e:
+            errors[fmt] = f"{type(e).__name__}: {e}"
+    return {"files": files, "errors": errors}
+
+
+def _close_files(result: Dict[str, Any]):
+    for _, buffer in result["files"]:
+        buffer.close()
+
+
+def _discard(future: Future):
+    if not future.cancelled() and future.exception() is None:
+        _close_files(future.result())
+
+
+class _ZipSink:
+    """Destino do ZipFile sem seek: acumula os bytes escritos até serem enviados"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.size = 0
+        return data
+
+
+def _entry_name(task: "database.Task", fmt: str) -> str:
+    filename = downloads.download_filename(task.titulo or f"tarefa_{task.id}", fmt)
+    return f"{task.id}_{filename.replace('/', '_').replace(chr(92), '_')}"
+
+
+def stream_bundle(ids: List[int], formats: List[str]) -> Iterator[bytes]:
+    """
+    Gera o ZIP em blocos
+
+    Args:
+        ids: Tarefas pela ordem em que entram no ZIP
+        formats: Formatos a incluir por tarefa
+
+    Returns:
+        Iterador de bytes para uma StreamingResponse
+    """
+    manifest: Dict[str, Any] = {
+        "generated_at": datetime.utcnow().isoformat(),
+        "formats": formats,
+        "tasks": [],
+    }
+    if "pdf" in formats and pdf_service.renderer.start() not in ("wkhtmltopdf", "weasyprint"):
+        formats = [f for f in formats if f != "pdf"]
+        manifest["warnings"] = ["PDF indisponível: wkhtmltopdf ou weasyprint não instalados"]
+
+    sink = _ZipSink()
+    zf = zipfile.ZipFile(sink, "w")
+    executor = ThreadPoolExecutor(max_workers=max(1, BUNDLE_WORKERS), thread_name_prefix="bundle")
+    in_flight: "deque[Tuple[int, Optional[database.Task], Optional[Future]]]" = deque()
+    tasks = load_tasks(ids)
+
+    def write_task(task_id, task, future) -> Iterator[bytes]:
+        if task is None:
+            manifest["tasks"].append({"id": task_id, "error": "Tarefa não encontrada"})
+            return
+        entry = {"id": task.id, "titulo": task.titulo, "empresa": task.empresa, "status": task.status}
+        if future is None:
+            manifest["tasks"].append({**entry, "error": "Tarefa não tem resultado"})
+            return
+
+        result = future.result()
+        entry["files"] = []
+        try:
+            for fmt, buffer in result["files"]:
+                name = _entry_name(task, fmt)
+                info = zipfile.ZipInfo(name, datetime.now().timetuple()[:6])
+                info.compress_type = COMPRESSION.get(fmt, zipfile.ZIP_STORED)
+                info.file_size = downloads.buffer_size(buffer)  # decide zip64 à partida
+                with zf.open(info, "w") as dest:
+                    for chunk in downloads.iter_buffer(buffer):
+                        dest.write(chunk)
+                        if sink.size >= downloads.DOCUMENT_CHUNK_SIZE:
+                            yield sink.drain()
+                entry["files"].append(name)
+        finally:
+            _close_files(result)
+        if result["errors"]:
+            entry["errors"] = result["errors"]
+        manifest["tasks"].append(entry)
+        if sink.size:
+            yield sink.drain()
+
+    try:
+        for task_id, task in tasks:
+            future = executor.submit(_render, task, formats) if task is not None and task.resultado else None
+            in_flight.append((task_id, task, future))
+            if len(in_flight) >= max(1, BUNDLE_PREFETCH):
+                yield from write_task(*in_flight.popleft())
+        while in_flight:
+            yield from write_task(*in_flight.popleft())
+
+        zf.writestr(
+            zipfile.ZipInfo("manifest.json", datetime.now().timetuple()[:6]),
+            json.dumps(manifest, ensure_ascii=False, indent=2),
+            compress_type=zipfile.ZIP_DEFLATED,
+        )
+        zf.close()
+        yield sink.drain()
+    finally:
+        # Cliente desligou a meio: cancelar o que falta e libertar os buffers já gerados
+        executor.shutdown(wait=False, cancel_futures=True)
+        for _, _, future in in_flight:
+            if future is not None:
+                future.add_done_callback(_discard)
+        tasks.close()
+
+
+def bundle_filename(empresa: str = None) -> str:
+    stamp = datetime.utcnow().strftime("%Y%m%d_%H%M")
+    return downloads.download_filename(f"kalu_{empresa}_{stamp}" if empresa else f"kalu_tarefas_{stamp}", "zip")
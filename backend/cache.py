@@ -0,0 +1,286 @@
+"""
+Kalu Response Cache
+===================
+
+Cache read-through das respostas de listagem e estatísticas, com
+invalidação por tags disparada pelos endpoints de escrita.
+
+Tags por entidade:
+    tasks                - listagens sem filtro de empresa e estatísticas
+    tasks:empresa=X      - listagens filtradas pela empresa X
+
+Uma escrita numa tarefa da empresa X invalida "tasks" e "tasks:empresa=X";
+as listagens de outras empresas continuam em cache.
+
+Backends (CACHE_BACKEND):
+    local  - LRU em memória, por processo (padrão)
+    redis  - partilhado entre workers (requer o pacote redis e CACHE_REDIS_URL)
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from fastapi.responses import Response
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "local")  # local, redis
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CACHE_TTL = float(os.getenv("CACHE_TTL", "300"))  # segundos (rede de segurança)
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+
+class LocalBackend:
+    """LRU em memória limitado por nº de entradas e por bytes, com índice de tags"""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[bytes, float, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._tag_versions: Dict[str, int] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            body, expires_at, _ = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return body
+
+    def tag_versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        with self._lock:
+            # setdefault regista a tag para que invalidate_prefix também a apanhe
+            return tuple(self._tag_versions.setdefault(tag, 0) for tag in tags)
+
+    def set(self, key: str, body: bytes, tags: List[str], versions: Tuple[int, ...], ttl: float):
+        with self._lock:
+            # Houve invalidação enquanto a resposta era calculada - não guardar dados velhos
+            if tuple(self._tag_versions.get(tag, 0) for tag in tags) != versions:
+                return
+            if len(body) > self.max_bytes:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (body, time.monotonic() + ttl, tuple(tags))
+            self._bytes += len(body)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for tag in tags:
+                self._tag_versions[tag] = self._tag_versions.get(tag, 0) + 1
+                for key in self._tags.pop(tag, set()):
+                    if key in self._entries:
+                        self._remove(key)
+                        removed += 1
+        return removed
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        with self._lock:
+            tags = [tag for tag in set(self._tags) | set(self._tag_versions) if tag.startswith(prefix)]
+        return self.invalidate(tags)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def size(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+    def _remove(self, key: str):
+        body, _, tags = self._entries.pop(key)
+        self._bytes -= len(body)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys:
+                keys.discard(key)
+
+
+class RedisBackend:
+    """Backend partilhado entre workers (LRU e limite de memória ficam a cargo do Redis)"""
+
+    def __init__(self, url: str = CACHE_REDIS_URL, prefix: str = "kalu:cache:"):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("Biblioteca redis não instalada. Execute: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.prefix + key)
+
+    def tag_versions(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        tags = list(tags)
+        if not tags:
+            return ()
+        values = self.client.mget([self.prefix + "v:" + tag for tag in tags])
+        return tuple(int(v or 0) for v in values)
+
+    def set(self, key: str, body: bytes, tags: List[str], versions: Tuple[int, ...], ttl: float):
+        if self.tag_versions(tags) != versions:
+            return
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + key, body, ex=max(1, int(ttl)))
+        for tag in tags:
+            pipe.sadd(self.prefix + "t:" + tag, key)
+        pipe.execute()
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        removed = 0
+        for tag in tags:
+            tag_key = self.prefix + "t:" + tag
+            keys = self.client.smembers(tag_key)
+            pipe = self.client.pipeline()
+            pipe.incr(self.prefix + "v:" + tag)
+            if keys:
+                pipe.delete(*[self.prefix + k.decode() for k in keys])
+            pipe.delete(tag_key)
+            pipe.execute()
+            removed += len(keys)
+        return removed
+
+    def invalidate_prefix(self, prefix: str) -> int:
+        tags = set()
+        for pattern in ("t:", "v:"):
+            for raw in self.client.scan_iter(f"{self.prefix}{pattern}{prefix}*"):
+                tags.add(raw.decode()[len(self.prefix) + len(pattern):])
+        return self.invalidate(tags)
+
+    def clear(self):
+        for raw in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(raw)
+
+    def size(self) -> Dict[str, int]:
+        return {"entries": sum(1 for _ in self.client.scan_iter(self.prefix + "*"))}
+
+
+class ResponseCache:
+    """Cache read-through de respostas JSON (guarda os bytes já serializados)"""
+
+    def __init__(self, backend=None, enabled: bool = CACHE_ENABLED, ttl: float = CACHE_TTL):
+        self.backend = backend if backend is not None else self._make_backend()
+        self.enabled = enabled
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0}
+        self._stats_lock = threading.Lock()  # incrementados no event loop e nas threads do threadpool
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    @staticmethod
+    def _make_backend():
+        if CACHE_BACKEND == "redis":
+            return RedisBackend()
+        return LocalBackend()
+
+    @staticmethod
+    def make_key(endpoint: str, params: Dict[str, Any]) -> str:
+        """Chave normalizada: parâmetros ordenados, valores None ignorados"""
+        normalized = "&".join(f"{k}={params[k]}" for k in sorted(params) if params[k] is not None)
+        return f"{endpoint}?{normalized}"
+
+    @staticmethod
+    def render(data: Any) -> bytes:
+        # Corpos já serializados (fast_json) passam directamente
+        if isinstance(data, bytes):
+            return data
+        # Mesmo formato do JSONResponse do FastAPI
+        return json.dumps(
+            data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+
+    def cached_response(
+        self,
+        endpoint: str,
+        params: Dict[str, Any],
+        tags: List[str],
+        load: Callable[[], Any],
+    ) -> Response:
+        """
+        Devolve a resposta em cache ou calcula-a com load() e guarda-a
+
+        Args:
+            endpoint: Nome lógico do endpoint (parte da chave)
+            params: Parâmetros da query (parte da chave)
+            tags: Tags que invalidam esta entrada
+            load: Função que devolve os dados já JSON-serializáveis (ou os bytes JSON)
+        """
+        if not self.enabled:
+            return Response(content=self.render(load()), media_type="application/json")
+
+        key = self.make_key(endpoint, params)
+        body = self.backend.get(key)
+        if body is not None:
+            self._count("hits")
+            return Response(content=body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+        self._count("misses")
+        versions = self.backend.tag_versions(tags)
+        body = self.render(load())
+        self.backend.set(key, body, tags, versions, self.ttl)
+        return Response(content=body, media_type="application/json", headers={"X-Cache": "MISS"})
+
+    def invalidate(self, entity: str, empresas: Optional[Iterable[str]] = None):
+        """
+        Invalida as entradas de uma entidade após uma escrita
+
+        Args:
+            entity: tasks, documents, memories
+            empresas: Empresas afectadas; None invalida todas as entradas da entidade
+        """
+        if not self.enabled:
+            return
+        self._count("invalidations")
+        if empresas is None:
+            self.backend.invalidate_prefix(entity)
+        else:
+            self.backend.invalidate([entity] + [f"{entity}:empresa={e}" for e in set(empresas) if e])
+
+    def stats_snapshot(self) -> Dict[str, int]:
+        """Cópia consistente dos contadores (hits/misses do mesmo instante)"""
+        with self._stats_lock:
+            return dict(self.stats)
+
+    def metrics(self) -> Dict[str, Any]:
+        stats = self.stats_snapshot()
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "backend": type(self.backend).__name__,
+            **stats,
+            "evictions": self.backend.evictions,
+            "hit_ratio": round(stats["hits"] / lookups, 3) if lookups else 0.0,
+            **self.backend.size(),
+        }
+
+
+def entity_tags(entity: str, empresa: str = None) -> List[str]:
+    """Tags de uma entrada de listagem: por empresa se filtrada, senão a tag geral"""
+    return [f"{entity}:empresa={empresa}"] if empresa else [entity]
+
+
+response_cache = ResponseCache()
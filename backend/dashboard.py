@@ -0,0 +1,97 @@
+"""
+Kalu Dashboard Bootstrap
+========================
+
+Projecções resumidas e estatísticas usadas pelo endpoint /dashboard/bootstrap,
+que devolve numa só resposta tudo o que o frontend precisa no primeiro ecrã.
+"""
+
+import os
+from typing import Any, Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import archive
+import database
+
+# Limite de linhas por secção (o bootstrap é o primeiro ecrã, não uma exportação)
+DASHBOARD_MAX_LIMIT = int(os.getenv("DASHBOARD_MAX_LIMIT", "500"))
+
+# Campos pesados que ficam de fora dos resumos (obtidos depois via /tasks/{id} ou /documents/{id})
+TASK_SUMMARY_EXCLUDE = {"resultado", "resultado_json", "resultado_html", "render_error"}
+DOCUMENT_SUMMARY_EXCLUDE = {"conteudo"}
+
+
+def summary_columns(model, exclude: set) -> list:
+    return [column for column in model.__table__.columns if column.name not in exclude]
+
+
+def rows_to_dicts(rows) -> List[Dict[str, Any]]:
+    return [dict(row._mapping) for row in rows]
+
+
+def overview_stats(db: Session) -> Dict[str, Any]:
+    """Estatísticas de /stats/overview calculadas com uma única query GROUP BY"""
+    counts = dict(
+        db.query(database.Task.status, func.count(database.Task.id))
+        .group_by(database.Task.status)
+        .all()
+    )
+    # Tarefas arquivadas estão todas concluídas
+    archived = archive.archived_task_counts(db)
+    total_tasks = sum(counts.values()) + archived
+    concluidas = counts.get("Concluído", 0) + archived
+
+    return {
+        "total_tasks": total_tasks,
+        "pendentes": counts.get("Pendente", 0),
+        "em_progresso": counts.get("Em Progresso", 0),
+        "concluidas": concluidas,
+        "taxa_conclusao": round((concluidas / total_tasks * 100) if total_tasks > 0 else 0, 1)
+    }
+
+
+def task_summaries(db: Session, limit: int) -> List[Dict[str, Any]]:
+    """Tarefas sem o campo resultado, com has_resultado para os badges do UI"""
+    has_resultado = (func.coalesce(func.length(database.Task.resultado), 0) > 0).label("has_resultado")
+    rows = (
+        db.query(*summary_columns(database.Task, TASK_SUMMARY_EXCLUDE), has_resultado)
+        .order_by(database.Task.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+    tasks = rows_to_dicts(rows)
+    for task in tasks:
+        task["has_resultado"] = bool(task["has_resultado"])
+    return tasks
+
+
+def recent_activities(db: Session, limit: int) -> List[Dict[str, Any]]:
+    rows = (
+        db.query(*database.Activity.__table__.columns)
+        .order_by(database.Activity.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+    return rows_to_dicts(rows)
+
+
+def document_summaries(db: Session, limit: int) -> List[Dict[str, Any]]:
+    rows = (
+        db.query(*summary_columns(database.Document, DOCUMENT_SUMMARY_EXCLUDE))
+        .order_by(database.Document.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+    return rows_to_dicts(rows)
+
+
+def memory_summaries(db: Session, limit: int) -> List[Dict[str, Any]]:
+    rows = (
+        db.query(*database.Memory.__table__.columns)
+        .order_by(database.Memory.created_at.desc())
+        .limit(limit)
+        .all()
+    )
+    return rows_to_dicts(rows)
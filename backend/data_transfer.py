@@ -0,0 +1,255 @@
+"""
+Kalu Data Transfer
+==================
+
+Export em streaming (NDJSON ou CSV) e import NDJSON em blocos para todas
+as entidades. O export percorre a tabela com yield_per (cursor do lado
+do servidor onde o driver suporta), por isso a memória é constante
+independentemente do tamanho da tabela.
+"""
+
+import csv
+import io
+import itertools
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import DateTime, insert
+from sqlalchemy.orm import Session
+
+import archive
+import database
+
+EXPORT_YIELD_PER = int(os.getenv("EXPORT_YIELD_PER", "1000"))
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 100
+
+ENTITY_MODELS = {
+    "tasks": database.Task,
+    "activities": database.Activity,
+    "documents": database.Document,
+    "memories": database.Memory,
+    "calendar": database.CalendarEvent,
+}
+
+# Entidades com tabela de arquivo (o export inclui as linhas arquivadas)
+ARCHIVE_MODELS = {
+    "tasks": database.ArchivedTask,
+    "activities": database.ArchivedActivity,
+}
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def get_model(entity: str):
+    model = ENTITY_MODELS.get(entity)
+    if model is None:
+        raise HTTPException(status_code=404, detail=f"Entidade desconhecida: {entity}")
+    return model
+
+
+def _json_value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+# ==================== EXPORT ====================
+
+def iter_rows(build_query: Callable[[Session], Any], model) -> Iterator[Dict[str, Any]]:
+    """
+    Percorre a query em blocos de EXPORT_YIELD_PER linhas numa sessão própria
+
+    A sessão é aberta aqui (e não via Depends) porque o corpo da resposta
+    é produzido depois de o endpoint ter retornado.
+    """
+    db = database.SessionLocal()
+    try:
+        columns = list(model.__table__.columns)
+        query = build_query(db.query(*columns)).order_by(model.id.asc())
+        for row in query.yield_per(EXPORT_YIELD_PER):
+            yield {key: _json_value(value) for key, value in row._mapping.items()}
+    finally:
+        db.close()
+
+
+def iter_archived_rows(entity: str, model, match: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Linhas arquivadas da entidade (por id), com as colunas da tabela quente"""
+    db = database.SessionLocal()
+    try:
+        columns = [column.name for column in model.__table__.columns]
+        for row in archive.iter_archived(db, ARCHIVE_MODELS[entity], match, newest_first=False):
+            yield {name: row.get(name) for name in columns}
+    finally:
+        db.close()
+
+
+def iter_ndjson(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    for row in rows:
+        yield (json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def iter_csv(rows: Iterator[Dict[str, Any]], fieldnames: List[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        # Esvaziar o buffer de vez em quando mantém a memória constante
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def export_response(
+    entity: str,
+    build_query: Callable,
+    format: str = "ndjson",
+    archived_match: Optional[Dict[str, Any]] = None,
+) -> StreamingResponse:
+    """
+    Resposta em streaming com todas as linhas da entidade
+
+    Args:
+        entity: Nome da entidade (tasks, activities, documents, memories, calendar)
+        build_query: Função que aplica os filtros à query base
+        format: ndjson ou csv
+        archived_match: Os mesmos filtros como {coluna: valor} para incluir as linhas
+            arquivadas (tasks, activities) a seguir às quentes; None exclui o arquivo
+    """
+    model = get_model(entity)
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato não suportado: {format}")
+
+    rows = iter_rows(build_query, model)
+    if archived_match is not None and entity in ARCHIVE_MODELS:
+        rows = itertools.chain(rows, iter_archived_rows(entity, model, archived_match))
+    if format == "csv":
+        body = iter_csv(rows, [column.name for column in model.__table__.columns])
+    else:
+        body = iter_ndjson(rows)
+
+    filename = f"{entity}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+# ==================== IMPORT ====================
+
+def prepare_import_row(model, data: Dict[str, Any], keep_ids: bool) -> Dict[str, Any]:
+    """Filtra as colunas da tabela e converte datas ISO em datetime"""
+    row = {}
+    for column in model.__table__.columns:
+        if column.name not in data or (column.name == "id" and not keep_ids):
+            continue
+        value = data[column.name]
+        if isinstance(column.type, DateTime) and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        row[column.name] = value
+    return row
+
+
+def insert_chunk(model, chunk: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    Insere um bloco de (nº da linha, dados) numa transacção
+
+    Se o bloco falhar, tenta linha a linha para isolar as linhas inválidas.
+
+    Returns:
+        List[Dict]: erros por linha
+    """
+    db = database.SessionLocal()
+    try:
+        try:
+            db.execute(insert(model), [row for _, row in chunk])
+            db.commit()
+            return []
+        except Exception:
+            db.rollback()
+
+        errors = []
+        for line_no, row in chunk:
+            try:
+                db.execute(insert(model), [row])
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                errors.append({"line": line_no, "error": str(e.__cause__ or e).splitlines()[0]})
+        return errors
+    finally:
+        db.close()
+
+
+async def import_ndjson(
+    entity: str,
+    stream: AsyncIterator[bytes],
+    keep_ids: bool = True,
+    run_sync: Callable = None,
+) -> Dict[str, Any]:
+    """
+    Lê um corpo NDJSON em streaming e insere em blocos de IMPORT_CHUNK_SIZE linhas
+
+    Args:
+        entity: Nome da entidade
+        stream: Iterador assíncrono do corpo do pedido (request.stream())
+        keep_ids: Manter os IDs do ficheiro (restore) ou deixar a BD gerar novos
+        run_sync: Executor para as escritas na BD (ex: run_in_threadpool)
+
+    Returns:
+        dict: {"imported": n, "failed": n, "errors": [...]}
+    """
+    model = get_model(entity)
+    imported, failed, errors = 0, 0, []
+    chunk: List[tuple] = []
+    pending = b""
+    line_no = 0
+
+    async def flush():
+        nonlocal imported, failed, chunk
+        if not chunk:
+            return
+        if run_sync:
+            chunk_errors = await run_sync(insert_chunk, model, chunk)
+        else:
+            chunk_errors = insert_chunk(model, chunk)
+        failed += len(chunk_errors)
+        imported += len(chunk) - len(chunk_errors)
+        errors.extend(chunk_errors[:MAX_REPORTED_ERRORS - len(errors)])
+        chunk = []
+
+    def parse(line: bytes):
+        nonlocal failed
+        if not line.strip():
+            return
+        try:
+            chunk.append((line_no, prepare_import_row(model, json.loads(line), keep_ids)))
+        except (ValueError, TypeError, AttributeError) as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"line": line_no, "error": str(e)})
+
+    async for data in stream:
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_no += 1
+            parse(line)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                await flush()
+
+    if pending:
+        line_no += 1
+        parse(pending)
+    await flush()
+
+    return {"imported": imported, "failed": failed, "errors": errors}
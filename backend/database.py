@@ -1,6 +1,6 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime
 import os
 
@@ -15,6 +15,8 @@ Base = declarative_base()
 # Models
 class Task(Base):
     __tablename__ = "tasks"
+    # Ids nunca reutilizados em SQLite - tarefas arquivadas mantêm o seu id
+    __table_args__ = {"sqlite_autoincrement": True}
     
     id = Column(Integer, primary_key=True, index=True)
     titulo = Column(String, nullable=False)
@@ -32,10 +34,37 @@ class Task(Base):
     resultado_tipo = Column(String)  # json, text, file, image
     resultado_url = Column(String)  # URL se ficheiro externo
     
+    # Render antecipado (EAGER_RENDER) - ver result_render.py
+    resultado_json = Column(Text)  # JSON canónico do resultado
+    resultado_html = Column(Text)  # vista HTML pré-renderizada
+    render_status = Column(String)  # pending, done, failed
+    render_error = Column(Text)
+    rendered_at = Column(DateTime)
+    
     # Metadata
     tags = Column(String)  # comma-separated
     deadline = Column(DateTime)
     completado_em = Column(DateTime)
+    
+    # Relações (só leitura - as tabelas relacionadas guardam task_id sem FK)
+    documents = relationship(
+        "Document",
+        primaryjoin="Task.id == foreign(Document.task_id)",
+        order_by="Document.created_at.desc()",
+        viewonly=True,
+    )
+    calendar_events = relationship(
+        "CalendarEvent",
+        primaryjoin="Task.id == foreign(CalendarEvent.task_id)",
+        order_by="CalendarEvent.start_date.asc()",
+        viewonly=True,
+    )
+    activities = relationship(
+        "Activity",
+        primaryjoin="and_(Task.id == foreign(Activity.target_id), Activity.target_type == 'task')",
+        order_by="Activity.created_at.desc()",
+        viewonly=True,
+    )
 
 class User(Base):
     __tablename__ = "users"
@@ -60,8 +89,13 @@ class Activity(Base):
     target_id = Column(Integer)  # ID da entidade relacionada (task, doc, etc.)
     target_type = Column(String)  # 'task', 'document', 'memory'
     extra_data = Column(Text)  # JSON com dados adicionais
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
     icon = Column(String, default="📌")  # emoji para o feed
+    
+    __table_args__ = (
+        Index("ix_activities_target", "target_type", "target_id"),
+        {"sqlite_autoincrement": True},
+    )
 
 class Document(Base):
     """Biblioteca de Deliverables - todos os ficheiros gerados"""
@@ -76,7 +110,7 @@ class Document(Base):
     file_size = Column(Integer)  # tamanho em bytes
     empresa = Column(String)
     projeto = Column(String)  # Delabento IA, IMPULSO, etc.
-    task_id = Column(Integer)  # relação com tarefa (opcional)
+    task_id = Column(Integer, index=True)  # relação com tarefa (opcional)
     tags = Column(String)  # comma-separated
     versao = Column(String, default="v1")  # versionamento
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -109,12 +143,36 @@ class CalendarEvent(Base):
     end_date = Column(DateTime)
     all_day = Column(Boolean, default=False)
     empresa = Column(String)
-    task_id = Column(Integer)  # relação com tarefa
+    task_id = Column(Integer, index=True)  # relação com tarefa
     recorrente = Column(Boolean, default=False)
     recorrencia = Column(String)  # daily, weekly, monthly
     cor = Column(String, default="#3b82f6")  # cor no calendário
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class ArchivedTask(Base):
+    """Arquivo frio de tarefas concluídas (linha completa em JSON comprimido)"""
+    __tablename__ = "tasks_archive"
+    
+    id = Column(Integer, primary_key=True)  # mesmo id da tabela tasks
+    empresa = Column(String, index=True)
+    status = Column(String)
+    created_at = Column(DateTime)
+    completado_em = Column(DateTime, index=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    payload = Column(LargeBinary, nullable=False)  # zlib(JSON) com todas as colunas
+
+class ArchivedActivity(Base):
+    """Arquivo frio de actividades antigas (linha completa em JSON comprimido)"""
+    __tablename__ = "activities_archive"
+    
+    id = Column(Integer, primary_key=True)  # mesmo id da tabela activities
+    tipo = Column(String)
+    target_id = Column(Integer, index=True)  # histórico de uma tarefa (/tasks/{id}/full)
+    target_type = Column(String)
+    created_at = Column(DateTime, index=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    payload = Column(LargeBinary, nullable=False)
+
 # Create tables
 def init_db():
     Base.metadata.create_all(bind=engine)
@@ -0,0 +1,93 @@
+"""
+Kalu Downloads
+==============
+
+Documentos gerados (DOCX/XLSX/PDF) servidos sem caminhos fixos em /tmp.
+
+Os geradores escrevem para um SpooledTemporaryFile: fica em memória até
+DOCUMENT_SPOOL_MAX_BYTES e só acima disso passa para um ficheiro temporário
+único (criado sem nome e apagado automaticamente ao fechar). A resposta é
+enviada em blocos e o buffer é fechado no fim, mesmo que o cliente desligue.
+"""
+
+import os
+import tempfile
+from typing import BinaryIO, Callable, Iterator
+from urllib.parse import quote
+
+from fastapi.responses import StreamingResponse
+
+DOCUMENT_SPOOL_MAX_BYTES = int(os.getenv("DOCUMENT_SPOOL_MAX_BYTES", str(8 * 1024 * 1024)))
+DOCUMENT_CHUNK_SIZE = 64 * 1024
+
+MEDIA_TYPES = {
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+    "html": "text/html; charset=utf-8",
+    "zip": "application/zip",
+}
+
+
+def spool(render: Callable[..., object], *args, **kwargs) -> BinaryIO:
+    """
+    Executa render(*args, output, **kwargs) para um buffer em memória/ficheiro temporário
+
+    Args:
+        render: Gerador que aceita um ficheiro binário como último argumento posicional
+
+    Returns:
+        Buffer posicionado no início (fechar para libertar memória / apagar o ficheiro)
+    """
+    buffer = tempfile.SpooledTemporaryFile(max_size=DOCUMENT_SPOOL_MAX_BYTES, prefix="kalu_doc_")
+    try:
+        render(*args, buffer, **kwargs)
+        buffer.seek(0)
+    except BaseException:
+        buffer.close()
+        raise
+    return buffer
+
+
+def buffer_size(buffer: BinaryIO) -> int:
+    position = buffer.tell()
+    buffer.seek(0, os.SEEK_END)
+    size = buffer.tell()
+    buffer.seek(position)
+    return size
+
+
+def iter_buffer(buffer: BinaryIO, chunk_size: int = DOCUMENT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Lê o buffer em blocos e fecha-o no fim (também se o cliente desligar)"""
+    try:
+        while True:
+            chunk = buffer.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        buffer.close()
+
+
+def download_filename(title: str, extension: str) -> str:
+    """Nome do ficheiro a partir do título (mesmo formato de sempre: 50 chars, _ em vez de espaços)"""
+    return f"{title[:50].replace(' ', '_')}.{extension}"
+
+
+def content_disposition(filename: str) -> str:
+    # filename* (RFC 5987) para títulos com acentos
+    ascii_name = filename.encode("ascii", "replace").decode().replace("?", "_").replace('"', "")
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+
+def buffer_response(buffer: BinaryIO, extension: str, title: str) -> StreamingResponse:
+    """StreamingResponse de um buffer gerado por spool() (com Content-Length)"""
+    filename = download_filename(title, extension)
+    return StreamingResponse(
+        iter_buffer(buffer),
+        media_type=MEDIA_TYPES[extension],
+        headers={
+            "Content-Disposition": content_disposition(filename),
+            "Content-Length": str(buffer_size(buffer)),
+        },
+    )
@@ -0,0 +1,71 @@
+"""
+Kalu Fast JSON
+==============
+
+Caminho rápido (opt-in) para as respostas de listagem: selecciona só as
+colunas como tuplos, sem construir objectos ORM nem modelos pydantic por
+linha, e serializa directamente para bytes com orjson.
+
+Activar com FAST_LIST_SERIALIZATION=true. O JSON produzido tem as mesmas
+chaves e valores do caminho normal; sem orjson instalado usa o json da
+biblioteca standard.
+"""
+
+import json
+import os
+from datetime import date, datetime
+from typing import Any, Callable, Iterable, List, Sequence
+
+try:
+    import orjson
+except ImportError:  # opcional - cai para o json standard
+    orjson = None
+
+FAST_LIST_SERIALIZATION = os.getenv("FAST_LIST_SERIALIZATION", "false").lower() == "true"
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(value).__name__}")
+
+
+def dumps(data: Any) -> bytes:
+    """JSON compacto em UTF-8 (mesmo formato do JSONResponse do FastAPI)"""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def columns_for(model, schema=None) -> list:
+    """
+    Colunas da tabela, pela ordem dos campos do schema de resposta (se houver)
+
+    Args:
+        model: Modelo SQLAlchemy (ex: database.Task)
+        schema: Modelo pydantic de resposta (ex: schemas.Task)
+    """
+    columns = model.__table__.columns
+    if schema is None:
+        return list(columns)
+    return [columns[name] for name in schema.model_fields if name in columns]
+
+
+def rows_to_json(rows: Iterable[Sequence], keys: List[str]) -> bytes:
+    """Serializa tuplos de colunas como uma lista de objectos JSON"""
+    return dumps([dict(zip(keys, row)) for row in rows])
+
+
+def list_json(db, build_query: Callable, model, schema=None) -> bytes:
+    """
+    Corpo JSON (bytes) de uma listagem, sem objectos ORM nem pydantic por linha
+
+    Args:
+        db: Sessão SQLAlchemy
+        build_query: Função que recebe a query base e aplica filtros/ordem/limite
+        model: Modelo SQLAlchemy da listagem
+        schema: Modelo pydantic de resposta (define as chaves e a sua ordem)
+    """
+    columns = columns_for(model, schema)
+    rows = build_query(db.query(*columns)).all()
+    return rows_to_json(rows, [column.name for column in columns])
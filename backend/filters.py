@@ -0,0 +1,66 @@
+"""
+Kalu Query Filters
+==================
+
+Filtros partilhados entre os endpoints de listagem e de export, para que
+ambos aceitem exactamente os mesmos parâmetros.
+"""
+
+from datetime import datetime
+
+import database
+
+
+def filter_tasks(query, status: str = None, empresa: str = None, prioridade: str = None):
+    if status:
+        query = query.filter(database.Task.status == status)
+    if empresa:
+        query = query.filter(database.Task.empresa == empresa)
+    if prioridade:
+        query = query.filter(database.Task.prioridade == prioridade)
+    return query
+
+
+def filter_activities(query, tipo: str = None):
+    if tipo:
+        query = query.filter(database.Activity.tipo == tipo)
+    return query
+
+
+def filter_documents(query, tipo: str = None, empresa: str = None, projeto: str = None):
+    if tipo:
+        query = query.filter(database.Document.tipo == tipo)
+    if empresa:
+        query = query.filter(database.Document.empresa == empresa)
+    if projeto:
+        query = query.filter(database.Document.projeto == projeto)
+    return query
+
+
+def filter_memories(query, tipo: str = None, categoria: str = None, importancia: str = None):
+    if tipo:
+        query = query.filter(database.Memory.tipo == tipo)
+    if categoria:
+        query = query.filter(database.Memory.categoria == categoria)
+    if importancia:
+        query = query.filter(database.Memory.importancia == importancia)
+    return query
+
+
+def filter_calendar_events(query, start: datetime = None, end: datetime = None, tipo: str = None):
+    if start:
+        query = query.filter(database.CalendarEvent.start_date >= start)
+    if end:
+        query = query.filter(database.CalendarEvent.start_date <= end)
+    if tipo:
+        query = query.filter(database.CalendarEvent.tipo == tipo)
+    return query
+
+
+def filter_created(query, model, start: datetime = None, end: datetime = None):
+    """Intervalo de created_at (inclusivo) para qualquer modelo com essa coluna"""
+    if start:
+        query = query.filter(model.created_at >= start)
+    if end:
+        query = query.filter(model.created_at <= end)
+    return query
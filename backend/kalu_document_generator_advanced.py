@@ -5,262 +5,678 @@ Kalu Advanced Document Generator
 Gera documentos em múltiplos formatos: HTML, PDF, Word, Excel
 """
 
+import io
 import json
 import os
-from datetime import datetime
-from typing import Dict, Any, Optional
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union, BinaryIO
 import base64
 
-def generate_word_document(data: Dict[str, Any], task_title: str, output_path: str) -> str:
+# Métricas e tracing só existem dentro do backend; fora dele (uso standalone) são no-ops
+try:
+    from metrics import timed_render
+    from tracing import span, traced
+except ImportError:
+    from contextlib import nullcontext
+
+    def timed_render(fmt: str, kind: str = "task"):
+        return lambda func: func
+
+    def traced(name: str, cat: str = "render"):
+        return lambda func: func
+
+    def span(name: str, cat: str = "app", **attrs):
+        return nullcontext()
+
+# Template base do Word: construído (ou lido de DOCX_TEMPLATE_PATH) uma vez por processo
+DOCX_TEMPLATE_PATH = os.getenv("DOCX_TEMPLATE_PATH")
+DOCX_MAX_HEADING_LEVEL = 4
+DOCX_CONCLUSION_KEYS = ['conclusao', 'visao']
+
+_docx_template: Optional[bytes] = None
+_docx_template_lock = threading.Lock()
+
+
+def _docx_add_styles(doc):
+    """Estilos Kalu (parágrafo e carácter) - definidos uma vez no template"""
+    from docx.enum.style import WD_STYLE_TYPE
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+    from docx.shared import Pt, RGBColor
+    
+    styles = doc.styles
+    names = {style.name for style in styles}
+    
+    if "Kalu Title" not in names:
+        style = styles.add_style("Kalu Title", WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = styles["Title"]
+        style.font.color.rgb = RGBColor(31, 119, 180)  # Azul
+        style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    if "Kalu Label" not in names:
+        style = styles.add_style("Kalu Label", WD_STYLE_TYPE.CHARACTER)
+        style.font.bold = True
+    if "Kalu Footer" not in names:
+        style = styles.add_style("Kalu Footer", WD_STYLE_TYPE.PARAGRAPH)
+        style.base_style = styles["Normal"]
+        style.font.italic = True
+        style.font.size = Pt(10)
+        style.font.color.rgb = RGBColor(127, 140, 141)
+        style.paragraph_format.alignment = WD_ALIGN_PARAGRAPH.CENTER
+
+
+def _docx_template_bytes() -> bytes:
+    """Bytes do template base (com os estilos Kalu), em cache no processo"""
+    global _docx_template
+    if _docx_template is None:
+        with _docx_template_lock:
+            if _docx_template is None:
+                from docx import Document
+                
+                doc = Document(DOCX_TEMPLATE_PATH) if DOCX_TEMPLATE_PATH else Document()
+                _docx_add_styles(doc)
+                buffer = io.BytesIO()
+                doc.save(buffer)
+                _docx_template = buffer.getvalue()
+    return _docx_template
+
+
+def _docx_new_document():
+    """Cópia nova do template base (estilos já definidos, nada a reaplicar)"""
+    from docx import Document
+    return Document(io.BytesIO(_docx_template_bytes()))
+
+
+def _docx_label(key: str) -> str:
+    return key.replace('_', ' ').title()
+
+
+def _docx_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "Sim" if value else "Não"
+    return str(value)
+
+
+def _docx_is_scalar(value: Any) -> bool:
+    return not isinstance(value, (dict, list))
+
+
+def _docx_label_paragraph(doc, label: str, value: Any, style: Optional[str] = None):
+    p = doc.add_paragraph(style=style)
+    p.add_run(f"{label}: ", style="Kalu Label")
+    p.add_run(_docx_text(value))
+
+
+def _docx_table(doc, headers, rows):
+    """
+    Tabela com cabeçalho; as linhas são criadas de uma vez e preenchidas pelo XML
+    (table.rows[i].cells é O(n) por acesso, o que torna tabelas grandes quadráticas)
+    """
+    from docx.table import _Cell
+    
+    table = doc.add_table(rows=len(rows) + 1, cols=len(headers))
+    table.style = "Table Grid"
+    tr_list = table._tbl.tr_lst
+    for tc, header in zip(tr_list[0].tc_lst, headers):
+        cell = _Cell(tc, table)
+        cell.paragraphs[0].add_run(header, style="Kalu Label")
+    for tr, values in zip(tr_list[1:], rows):
+        for tc, value in zip(tr.tc_lst, values):
+            _Cell(tc, table).text = value
+    return table
+
+
+def _docx_render(doc, value: Any, level: int):
+    """Renderiza recursivamente listas e dicionários (tabelas, listas e sub-secções)"""
+    heading_level = min(level, DOCX_MAX_HEADING_LEVEL)
+    
+    if isinstance(value, dict):
+        scalars = [(k, v) for k, v in value.items() if _docx_is_scalar(v)]
+        if scalars:
+            _docx_table(doc, ["Campo", "Valor"], [[_docx_label(k), _docx_text(v)] for k, v in scalars])
+        for key, subvalue in value.items():
+            if not _docx_is_scalar(subvalue):
+                doc.add_heading(_docx_label(key), heading_level)
+                _docx_render(doc, subvalue, level + 1)
+    
+    elif isinstance(value, list):
+        if value and all(isinstance(item, dict) for item in value) \
+                and all(_docx_is_scalar(v) for item in value for v in item.values()):
+            # Lista de registos simples - uma tabela
+            keys = list(dict.fromkeys(k for item in value for k in item))
+            _docx_table(doc, [_docx_label(k) for k in keys],
+                        [[_docx_text(item.get(k)) for k in keys] for item in value])
+        else:
+            for index, item in enumerate(value, 1):
+                if _docx_is_scalar(item):
+                    doc.add_paragraph(_docx_text(item), style='List Bullet')
+                else:
+                    doc.add_heading(f"#{index}", heading_level)
+                    _docx_render(doc, item, level + 1)
+    
+    else:
+        doc.add_paragraph(_docx_text(value))
+
+
+def _docx_render_report(doc, data: Any):
+    """Conteúdo do relatório (sem título nem rodapé) - partilhado com o relatório consolidado"""
+    # Processar dados
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            pass
+    
+    if isinstance(data, dict) and data:
+        # Extrair estrutura (ex: análise_concorrentes, plano_expansao)
+        main_key = next(iter(data))
+        content = data[main_key]
+        if not isinstance(content, dict):
+            content = {main_key: content}
+        
+        for key, value in content.items():
+            if key in DOCX_CONCLUSION_KEYS and _docx_is_scalar(value):
+                # Conclusão destacada
+                doc.add_heading('Conclusão', 2)
+                doc.add_paragraph(_docx_text(value))
+            elif _docx_is_scalar(value):
+                # Informações gerais
+                _docx_label_paragraph(doc, _docx_label(key), value)
+            else:
+                doc.add_heading(_docx_label(key), 2)
+                _docx_render(doc, value, 3)
+    elif isinstance(data, str):
+        doc.add_paragraph(data)
+    else:
+        _docx_render(doc, data, 2)
+
+
+@traced("generate_word_document")
+@timed_render("docx", "task")
+def generate_word_document(data: Dict[str, Any], task_title: str, output_path: Union[str, BinaryIO]) -> Union[str, BinaryIO]:
     """
     Gera documento Word (.docx)
     
+    Parte de um template base em cache (estilos Kalu pré-definidos, ou o
+    ficheiro DOCX_TEMPLATE_PATH) e usa estilos em vez de formatação run a run.
+    Estruturas aninhadas são renderizadas recursivamente em tabelas.
+    
     Args:
         data: Dados do relatório
         task_title: Título da tarefa
-        output_path: Caminho completo para salvar
+        output_path: Caminho completo para salvar, ou ficheiro binário aberto (ex: BytesIO)
         
     Returns:
-        str: Caminho do ficheiro gerado
+        Caminho (ou ficheiro) onde o documento foi escrito
     """
     try:
-        from docx import Document
-        from docx.shared import Inches, Pt, RGBColor
-        from docx.enum.text import WD_ALIGN_PARAGRAPH
-        
-        doc = Document()
-        
-        # Título principal
-        title = doc.add_heading(task_title, 0)
-        title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        title_run = title.runs[0]
-        title_run.font.color.rgb = RGBColor(31, 119, 180)  # Azul
-        
-        # Data e info
-        info = doc.add_paragraph()
-        info.add_run(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n").bold = True
-        info.add_run(f"Gerado por: Kalu AI Assistant ⚡")
-        
-        doc.add_paragraph()  # Espaço
-        
-        # Processar dados
-        if isinstance(data, str):
-            try:
-                data = json.loads(data)
-            except:
-                doc.add_paragraph(data)
-                doc.save(output_path)
-                return output_path
-        
-        # Extrair estrutura (ex: análise_concorrentes, plano_expansao)
-        main_key = list(data.keys())[0] if data else None
-        content = data.get(main_key, {}) if main_key else data
-        
-        # Iterar pelos campos e formatar
-        for key, value in content.items():
-            if key in ['data', 'empresa', 'mercado', 'segmento']:
-                # Informações gerais
-                p = doc.add_paragraph()
-                p.add_run(f"{key.replace('_', ' ').title()}: ").bold = True
-                p.add_run(str(value))
-            
-            elif isinstance(value, list):
-                # Listas
-                heading = doc.add_heading(key.replace('_', ' ').title(), 2)
-                for item in value:
-                    if isinstance(item, dict):
-                        # Item complexo
-                        for subkey, subvalue in item.items():
-                            p = doc.add_paragraph(style='List Bullet')
-                            p.add_run(f"{subkey.replace('_', ' ').title()}: ").bold = True
-                            p.add_run(str(subvalue))
-                    else:
-                        doc.add_paragraph(str(item), style='List Bullet')
-            
-            elif isinstance(value, dict):
-                # Subsecções
-                heading = doc.add_heading(key.replace('_', ' ').title(), 2)
-                for subkey, subvalue in value.items():
-                    if isinstance(subvalue, (list, dict)):
-                        # Recursivo
-                        subheading = doc.add_heading(subkey.replace('_', ' ').title(), 3)
-                        p = doc.add_paragraph(str(subvalue))
-                    else:
-                        p = doc.add_paragraph()
-                        p.add_run(f"{subkey.replace('_', ' ').title()}: ").bold = True
-                        p.add_run(str(subvalue))
-            
-            elif key in ['conclusao', 'visao']:
-                # Conclusão destacada
-                doc.add_heading('Conclusão', 2)
-                doc.add_paragraph(str(value))
-        
-        # Rodapé
-        doc.add_page_break()
-        footer = doc.add_paragraph()
-        footer.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        footer_run = footer.add_run("Gerado automaticamente por Kalu AI Assistant")
-        footer_run.italic = True
-        footer_run.font.size = Pt(10)
-        footer_run.font.color.rgb = RGBColor(127, 140, 141)
-        
+        with span("docx.template", cat="render"):
+            doc = _docx_new_document()
+    except ImportError:
+        raise Exception("Biblioteca python-docx não instalada. Execute: pip install python-docx")
+    
+    # Título principal
+    doc.add_paragraph(task_title, style="Kalu Title")
+    
+    # Data e info
+    info = doc.add_paragraph()
+    info.add_run(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n", style="Kalu Label")
+    info.add_run(f"Gerado por: Kalu AI Assistant ⚡")
+    
+    doc.add_paragraph()  # Espaço
+    
+    with span("docx.render", cat="render"):
+        _docx_render_report(doc, data)
+    
+    # Rodapé
+    doc.add_page_break()
+    doc.add_paragraph("Gerado automaticamente por Kalu AI Assistant", style="Kalu Footer")
+    
+    with span("docx.save", cat="render"):
         doc.save(output_path)
-        return output_path
-        
+    return output_path
+
+
+def render_word_section(data: Any, section_title: str):
+    """
+    Secção do relatório consolidado num documento próprio (seguro em paralelo)
+
+    Returns:
+        Documento python-docx com o título (Heading 1) e o conteúdo da secção
+    """
+    try:
+        doc = _docx_new_document()
     except ImportError:
         raise Exception("Biblioteca python-docx não instalada. Execute: pip install python-docx")
 
+    # Remover o parágrafo vazio do template - a secção começa no título
+    for element in list(doc.element.body):
+        if element.tag.endswith('}p'):
+            doc.element.body.remove(element)
+    doc.add_heading(section_title, 1)
+    _docx_render_report(doc, data)
+    return doc
+
+
+def _docx_toc(doc, entries: List[str]):
+    """
+    Índice como campo TOC do Word; o resultado do campo é a lista das secções,
+    visível mesmo antes de o Word actualizar o campo (com números de página)
+    """
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+
+    def field_char(run, kind):
+        element = OxmlElement('w:fldChar')
+        element.set(qn('w:fldCharType'), kind)
+        run._r.append(element)
+
+    entries = entries or ["(sem secções)"]
+    for index, entry in enumerate(entries):
+        p = doc.add_paragraph()
+        if index == 0:
+            field_char(p.add_run(), 'begin')
+            instr = OxmlElement('w:instrText')
+            instr.set(qn('xml:space'), 'preserve')
+            instr.text = ' TOC \\o "1-1" \\h \\z \\u '
+            p.add_run()._r.append(instr)
+            field_char(p.add_run(), 'separate')
+        p.add_run(entry)
+        if index == len(entries) - 1:
+            field_char(p.add_run(), 'end')
+
+    # Pedir ao Word que actualize os campos ao abrir
+    settings = doc.settings.element
+    if settings.find(qn('w:updateFields')) is None:
+        update = OxmlElement('w:updateFields')
+        update.set(qn('w:val'), 'true')
+        settings.append(update)
+
+
+@timed_render("docx", "batch")
+def generate_word_batch_report(
+    title: str,
+    summary_rows: List[Tuple[str, Any]],
+    section_titles: List[str],
+    sections: Iterable[Any],
+    output_path: Union[str, BinaryIO],
+) -> Union[str, BinaryIO]:
+    """
+    Relatório Word consolidado: resumo, índice e uma secção por tarefa
+
+    Args:
+        title: Título do relatório
+        summary_rows: Linhas (indicador, valor) da tabela de resumo
+        section_titles: Títulos das secções (para o índice), pela ordem
+        sections: Documentos de render_word_section, pela mesma ordem (podem chegar em streaming)
+        output_path: Caminho completo para salvar, ou ficheiro binário aberto
+
+    Returns:
+        Caminho (ou ficheiro) onde o documento foi escrito
+    """
+    try:
+        doc = _docx_new_document()
+    except ImportError:
+        raise Exception("Biblioteca python-docx não instalada. Execute: pip install python-docx")
+
+    doc.add_paragraph(title, style="Kalu Title")
+    info = doc.add_paragraph()
+    info.add_run(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}\n", style="Kalu Label")
+    info.add_run(f"Gerado por: Kalu AI Assistant ⚡")
+
+    doc.add_heading("Resumo", 1)
+    _docx_table(doc, ["Indicador", "Valor"], [[label, _docx_text(value)] for label, value in summary_rows])
+
+    doc.add_heading("Índice", 1)
+    _docx_toc(doc, section_titles)
+
+    # Secções: os elementos do corpo de cada documento passam para o relatório
+    # (mesmo template, logo os mesmos estilos)
+    body = doc.element.body
+    for section in sections:
+        doc.add_page_break()
+        for element in list(section.element.body):
+            if element.tag.endswith('}sectPr'):
+                continue
+            body.sectPr.addprevious(element)
+
+    doc.add_page_break()
+    doc.add_paragraph("Gerado automaticamente por Kalu AI Assistant", style="Kalu Footer")
 
-def generate_excel_document(data: Dict[str, Any], task_title: str, output_path: str) -> str:
+    doc.save(output_path)
+    return output_path
+
+
+# Estilos partilhados do Excel (registados uma vez por workbook como NamedStyle)
+EXCEL_STYLES = {
+    "kalu_title": {"font": {"size": 16, "bold": True, "color": "1F77B4"}},
+    "kalu_meta": {"font": {"italic": True}},
+    "kalu_section": {"font": {"size": 14, "bold": True, "color": "2C3E50"}, "fill": "E8F4F8"},
+    "kalu_header": {"font": {"bold": True}, "fill": "D6EAF8"},
+    "kalu_key": {"font": {"bold": True}},
+    "kalu_date": {"number_format": "DD/MM/YYYY"},
+    "kalu_datetime": {"number_format": "DD/MM/YYYY HH:MM"},
+    "kalu_footer": {"font": {"italic": True, "size": 9, "color": "7F8C8D"}},
+}
+
+EXCEL_COLUMN_WIDTH = 25
+EXCEL_MAX_COLUMNS = 50
+
+
+def _excel_named_styles():
+    from openpyxl.styles import Font, NamedStyle, PatternFill
+
+    styles = []
+    for name, spec in EXCEL_STYLES.items():
+        style = NamedStyle(name=name)
+        if "font" in spec:
+            style.font = Font(**spec["font"])
+        if "fill" in spec:
+            style.fill = PatternFill(start_color=spec["fill"], end_color=spec["fill"], fill_type="solid")
+        if "number_format" in spec:
+            style.number_format = spec["number_format"]
+        styles.append(style)
+    return styles
+
+
+def _excel_value(value: Any):
+    """
+    Valor tipado para uma célula: números, booleanos e datas ISO ficam nativos,
+    estruturas aninhadas viram JSON compacto
+
+    Returns:
+        (valor, nome do estilo ou None)
+    """
+    if value is None or isinstance(value, (bool, int, float)):
+        return value, None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")), None
+    if isinstance(value, datetime):
+        return _excel_naive_utc(value), "kalu_datetime"
+    text = str(value)
+    # Datas ISO (2026-02-12 ou 2026-02-12T10:00:00)
+    if 10 <= len(text) <= 32 and text[4:5] == "-" and text[7:8] == "-" and text[:4].isdigit():
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            return text, None
+        if len(text) == 10:
+            return parsed, "kalu_date"
+        return _excel_naive_utc(parsed), "kalu_datetime"
+    return text, None
+
+
+def _excel_naive_utc(value: datetime) -> datetime:
+    """O Excel não guarda fuso: datas com offset são convertidas para UTC (como a BD)"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _excel_sheet_title(name: str, used: set) -> str:
+    """Nome de folha válido (31 chars, sem []:*?/\\) e único no workbook"""
+    title = "".join("_" if ch in '[]:*?/\\' else ch for ch in name)[:31] or "Secção"
+    candidate, n = title, 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate, n = title[:31 - len(suffix)] + suffix, n + 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def _excel_sections(data: Any) -> Dict[str, Any]:
+    """Secções do relatório (conteúdo da chave principal, como no Word)"""
+    if isinstance(data, dict) and data:
+        main_key = next(iter(data))
+        content = data[main_key]
+        return content if isinstance(content, dict) else {main_key: content}
+    return {"resultado": data}
+
+
+def _excel_cell(ws, value, style=None):
+    """Só células com estilo precisam de WriteOnlyCell; o resto vai como valor simples"""
+    from openpyxl.cell import WriteOnlyCell
+
+    value, typed_style = _excel_value(value)
+    style = style or typed_style
+    if style is None:
+        return value
+    c = WriteOnlyCell(ws, value=value)
+    c.style = style
+    return c
+
+
+def _excel_workbook():
+    """Workbook write-only com os NamedStyles Kalu e uma função para criar folhas"""
+    try:
+        from openpyxl import Workbook
+        from openpyxl.utils import get_column_letter
+    except ImportError:
+        raise Exception("Biblioteca openpyxl não instalada. Execute: pip install openpyxl")
+    
+    wb = Workbook(write_only=True)
+    for style in _excel_named_styles():
+        wb.add_named_style(style)
+    used_titles = set()
+    
+    def new_sheet(name: str):
+        ws = wb.create_sheet(_excel_sheet_title(name, used_titles))
+        for column in range(1, 6):
+            ws.column_dimensions[get_column_letter(column)].width = EXCEL_COLUMN_WIDTH
+        return ws
+    
+    return wb, new_sheet
+
+
+def _excel_write_table(ws, section_title: str, value: Union[list, dict]) -> int:
+    """
+    Escreve uma secção lista (tabela com cabeçalho) ou dicionário (chave-valor)
+
+    Returns:
+        Nº de linhas de dados escritas
+    """
+    cell = _excel_cell
+    ws.append([cell(ws, section_title, "kalu_section")])
+    if isinstance(value, dict):
+        for subkey, subvalue in value.items():
+            ws.append([cell(ws, subkey.replace('_', ' ').title(), "kalu_key"), cell(ws, subvalue)])
+        return len(value)
+    
+    headers = list(dict.fromkeys(k for item in value if isinstance(item, dict) for k in item))
+    headers = headers[:EXCEL_MAX_COLUMNS]
+    if headers:
+        ws.append([cell(ws, h.replace('_', ' ').title(), "kalu_header") for h in headers])
+    for item in value:
+        if isinstance(item, dict):
+            ws.append([cell(ws, item.get(h)) for h in headers])
+        else:
+            ws.append([cell(ws, item)])
+    return len(value)
+
+
+@traced("generate_excel_document")
+@timed_render("xlsx", "task")
+def generate_excel_document(data: Dict[str, Any], task_title: str, output_path: Union[str, BinaryIO]) -> Union[str, BinaryIO]:
     """
     Gera documento Excel (.xlsx) com dados tabulares
     
+    Usa o modo write-only do openpyxl: as linhas são escritas em streaming
+    (memória constante mesmo com centenas de milhares de linhas), os estilos
+    são NamedStyles partilhados e os valores mantêm o tipo (números, datas).
+    Folha "Relatório" com o resumo e uma folha por secção com listas/tabelas.
+    
     Args:
         data: Dados do relatório
         task_title: Título da tarefa
-        output_path: Caminho completo para salvar
+        output_path: Caminho completo para salvar, ou ficheiro binário aberto (ex: BytesIO)
         
     Returns:
-        str: Caminho do ficheiro gerado
+        Caminho (ou ficheiro) onde o documento foi escrito
     """
-    try:
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, Alignment, PatternFill
-        from openpyxl.utils import get_column_letter
-        
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Relatório"
-        
-        # Título
-        ws['A1'] = task_title
-        ws['A1'].font = Font(size=16, bold=True, color="1F77B4")
-        ws['A1'].alignment = Alignment(horizontal='center')
-        ws.merge_cells('A1:E1')
-        
-        # Data
-        ws['A2'] = f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}"
-        ws['A2'].font = Font(italic=True)
-        
-        row = 4  # Começar dados na linha 4
-        
-        # Processar dados
-        if isinstance(data, str):
-            try:
-                data = json.loads(data)
-            except:
-                ws.cell(row=row, column=1, value=data)
-                wb.save(output_path)
-                return output_path
-        
-        # Extrair estrutura
-        main_key = list(data.keys())[0] if data else None
-        content = data.get(main_key, {}) if main_key else data
-        
-        # Criar tabelas por secção
-        for key, value in content.items():
-            # Cabeçalho de secção
-            ws.cell(row=row, column=1, value=key.replace('_', ' ').title())
-            ws.cell(row=row, column=1).font = Font(size=14, bold=True, color="2C3E50")
-            ws.cell(row=row, column=1).fill = PatternFill(start_color="E8F4F8", end_color="E8F4F8", fill_type="solid")
-            row += 1
-            
-            if isinstance(value, list):
-                # Tabela de lista
-                for i, item in enumerate(value, 1):
-                    if isinstance(item, dict):
-                        if i == 1:
-                            # Cabeçalhos
-                            for col, header in enumerate(item.keys(), 1):
-                                cell = ws.cell(row=row, column=col, value=header.replace('_', ' ').title())
-                                cell.font = Font(bold=True)
-                                cell.fill = PatternFill(start_color="D6EAF8", end_color="D6EAF8", fill_type="solid")
-                            row += 1
-                        
-                        # Dados
-                        for col, val in enumerate(item.values(), 1):
-                            ws.cell(row=row, column=col, value=str(val))
-                        row += 1
-                    else:
-                        ws.cell(row=row, column=1, value=str(item))
-                        row += 1
-            
-            elif isinstance(value, dict):
-                # Tabela chave-valor
-                for subkey, subvalue in value.items():
-                    ws.cell(row=row, column=1, value=subkey.replace('_', ' ').title())
-                    ws.cell(row=row, column=1).font = Font(bold=True)
-                    ws.cell(row=row, column=2, value=str(subvalue))
-                    row += 1
-            
-            else:
-                # Valor simples
-                ws.cell(row=row, column=1, value=str(value))
-                row += 1
-            
-            row += 1  # Espaço entre secções
+    wb, new_sheet = _excel_workbook()
+    cell = _excel_cell
+    
+    # Processar dados
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            pass
+    
+    summary = new_sheet("Relatório")
+    summary.append([cell(summary, task_title, "kalu_title")])
+    summary.append([cell(summary, f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}", "kalu_meta")])
+    summary.append([])
+    
+    if isinstance(data, str):
+        summary.append([cell(summary, data)])
+        sections = {}
+    else:
+        sections = _excel_sections(data)
+    
+    for key, value in sections.items():
+        section_title = key.replace('_', ' ').title()
         
-        # Ajustar largura das colunas
-        for column in range(1, 6):
-            ws.column_dimensions[get_column_letter(column)].width = 25
+        if isinstance(value, list):
+            # Tabela de lista - folha própria
+            ws = new_sheet(section_title)
+            _excel_write_table(ws, section_title, value)
+            summary.append([cell(summary, section_title, "kalu_key"), cell(summary, f"{len(value)} linha(s) - folha '{ws.title}'")])
         
-        # Rodapé
-        row += 2
-        ws.cell(row=row, column=1, value="Gerado automaticamente por Kalu AI Assistant")
-        ws.cell(row=row, column=1).font = Font(italic=True, size=9, color="7F8C8D")
+        elif isinstance(value, dict):
+            # Tabela chave-valor - folha própria
+            ws = new_sheet(section_title)
+            _excel_write_table(ws, section_title, value)
+            summary.append([cell(summary, section_title, "kalu_key"), cell(summary, f"folha '{ws.title}'")])
         
+        else:
+            # Valor simples - fica no resumo
+            summary.append([cell(summary, section_title, "kalu_key"), cell(summary, value)])
+    
+    # Rodapé
+    summary.append([])
+    summary.append([])
+    summary.append([cell(summary, "Gerado automaticamente por Kalu AI Assistant", "kalu_footer")])
+    
+    with span("xlsx.save", cat="render"):
         wb.save(output_path)
-        return output_path
-        
-    except ImportError:
-        raise Exception("Biblioteca openpyxl não instalada. Execute: pip install openpyxl")
+    return output_path
 
 
-def generate_pdf_from_html(html_content: str, output_path: str) -> str:
+@timed_render("xlsx", "batch")
+def generate_excel_batch_report(
+    title: str,
+    summary_rows: List[Tuple[str, Any]],
+    section_titles: List[str],
+    sections: Iterable[Any],
+    output_path: Union[str, BinaryIO],
+) -> Union[str, BinaryIO]:
     """
-    Converte HTML para PDF
-    
+    Relatório Excel consolidado: folha "Resumo" (estatísticas), folha "Índice"
+    com ligações e uma folha por tarefa com as suas secções empilhadas
+
     Args:
-        html_content: Conteúdo HTML completo
-        output_path: Caminho para salvar PDF
-        
+        title: Título do relatório
+        summary_rows: Linhas (indicador, valor) do resumo
+        section_titles: Títulos das tarefas, pela ordem
+        sections: Dados de cada tarefa (report_data), pela mesma ordem (podem chegar em streaming)
+        output_path: Caminho completo para salvar, ou ficheiro binário aberto
+
     Returns:
-        str: Caminho do ficheiro gerado
+        Caminho (ou ficheiro) onde o documento foi escrito
     """
+    wb, new_sheet = _excel_workbook()
+    cell = _excel_cell
+    
+    summary = new_sheet("Resumo")
+    summary.append([cell(summary, title, "kalu_title")])
+    summary.append([cell(summary, f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}", "kalu_meta")])
+    summary.append([])
+    for label, value in summary_rows:
+        summary.append([cell(summary, label, "kalu_key"), cell(summary, value)])
+    summary.append([])
+    summary.append([cell(summary, "Gerado automaticamente por Kalu AI Assistant", "kalu_footer")])
+    
+    index = new_sheet("Índice")
+    index.append([cell(index, "Índice", "kalu_section")])
+    index.append([cell(index, h, "kalu_header") for h in ("#", "Tarefa", "Folha", "Linhas")])
+    
+    # Folhas write-only são independentes - o índice vai sendo escrito com as tarefas
+    for number, (section_title, data) in enumerate(zip(section_titles, sections), 1):
+        ws = new_sheet(f"{number} {section_title}")
+        ws.append([cell(ws, section_title, "kalu_title")])
+        rows = 0
+        if isinstance(data, str):
+            ws.append([cell(ws, data)])
+        else:
+            for key, value in _excel_sections(data).items():
+                label = key.replace('_', ' ').title()
+                ws.append([])
+                if isinstance(value, (list, dict)):
+                    rows += _excel_write_table(ws, label, value)
+                else:
+                    ws.append([cell(ws, label, "kalu_key"), cell(ws, value)])
+        # HYPERLINK como fórmula - em modo write-only a célula não guarda hyperlinks internos
+        sheet_ref = ws.title.replace("'", "''")
+        link_text = ws.title.replace('"', '""')
+        link = cell(index, f'=HYPERLINK("#\'{sheet_ref}\'!A1", "{link_text}")', "kalu_key")
+        index.append([number, cell(index, section_title), link, rows])
+    
+    wb.save(output_path)
+    return output_path
+
+
+def _pdf_direct(html_content: str) -> bytes:
+    """Conversão sem o pdf_service (uso standalone): wkhtmltopdf por pipes, senão weasyprint"""
+    import subprocess
+    
     try:
-        # Opção 1: wkhtmltopdf (requer instalação sistema)
-        import subprocess
-        
-        # Salvar HTML temporário
-        temp_html = output_path.replace('.pdf', '_temp.html')
-        with open(temp_html, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        # Converter
         result = subprocess.run(
-            ['wkhtmltopdf', '--enable-local-file-access', temp_html, output_path],
-            capture_output=True,
-            text=True
+            ['wkhtmltopdf', '--quiet', '--enable-local-file-access', '--encoding', 'utf-8', '-', '-'],
+            input=html_content.encode('utf-8'),
+            capture_output=True
         )
-        
-        # Limpar temp
-        if os.path.exists(temp_html):
-            os.remove(temp_html)
-        
-        if result.returncode == 0:
-            return output_path
-        else:
-            raise Exception(f"wkhtmltopdf error: {result.stderr}")
-            
     except FileNotFoundError:
         # wkhtmltopdf não instalado, tentar alternativa
         try:
-            # Opção 2: weasyprint (Python puro)
             from weasyprint import HTML
-            HTML(string=html_content).write_pdf(output_path)
-            return output_path
         except ImportError:
             raise Exception("wkhtmltopdf ou weasyprint não instalados. Instale um deles.")
+        return HTML(string=html_content).write_pdf()
+    if result.returncode != 0 or not result.stdout:
+        raise Exception(f"wkhtmltopdf error: {result.stderr.decode('utf-8', 'replace')}")
+    return result.stdout
+
+
+@traced("generate_pdf_from_html")
+def generate_pdf_from_html(html_content: str, output_path: Union[str, BinaryIO]) -> Union[str, BinaryIO]:
+    """
+    Converte HTML para PDF
+    
+    Usa o serviço de PDF do backend (pdf_service): backend escolhido uma vez,
+    workers quentes, HTML por pipe/memória sem ficheiros temporários. Fora do
+    backend converte directamente com wkhtmltopdf ou weasyprint.
+    
+    Args:
+        html_content: Conteúdo HTML completo
+        output_path: Caminho para salvar PDF, ou ficheiro binário aberto
+        
+    Returns:
+        Caminho (ou ficheiro) onde o PDF foi escrito
+    """
+    try:
+        from pdf_service import renderer
+    except ImportError:
+        pdf = _pdf_direct(html_content)
+    else:
+        pdf = renderer.render(html_content)
+    if isinstance(output_path, str):
+        with open(output_path, 'wb') as f:
+            f.write(pdf)
+    else:
+        output_path.write(pdf)
+    return output_path
 
 
 def generate_document_with_downloads(
@@ -1,16 +1,40 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, Response
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Dict, Any
 from datetime import timedelta, datetime
+import io
 import json
 import os
 
 import database
 import schemas
+import schemas_bilingual
 import auth
+import activity_queue
+import bulk
+import filters
+import data_transfer
+import dashboard
+import fast_json
+from cache import response_cache, entity_tags
+import versions
+import wire
+import archive
+import result_render
+import downloads
+import pdf_service
+import bundle
+import batch_report
+import metrics
+import sql_profile
+import profiling
+import tracing
+from activity_buffer import recent_buffer
 
 # Initialize database - FORÇAR RECRIAÇÃO COMPLETA
 print("🔄 A recriar base de dados completa...")
@@ -18,6 +42,12 @@ database.Base.metadata.drop_all(bind=database.engine)
 database.Base.metadata.create_all(bind=database.engine)
 print("✅ Base de dados recriada com TODAS as tabelas")
 
+# Queries por pedido, queries lentas (com EXPLAIN) e detecção de N+1
+sql_profile.install(database.engine)
+
+# Spans SQL nos traces dos pedidos (TRACING_ENABLED)
+tracing.install(database.engine)
+
 # Create FastAPI app
 app = FastAPI(
     title="Kalu Dashboard API",
@@ -25,6 +55,9 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# JSON ou MessagePack (Accept / Content-Type) e corpos comprimidos nas rotas de tarefas e actividades
+app.router.route_class = wire.NegotiatedRoute
+
 # CORS
 app.add_middleware(
     CORSMiddleware,
@@ -34,6 +67,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Headers X-DB-Queries / X-DB-Time-Ms e métricas de queries por rota
+app.add_middleware(sql_profile.QueryProfileMiddleware)
+
+# Métricas Prometheus (GET /metrics) - mais exterior, mede também o CORS
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Tracing (TRACING_ENABLED): span raiz por pedido, continua o traceparent do cliente, devolve X-Trace-Id
+app.add_middleware(tracing.TracingMiddleware)
+
+# Profiling on-demand (X-Kalu-Profile: 1 de um admin) - o mais exterior, apanha o pedido todo
+app.add_middleware(profiling.ProfilingMiddleware)
+
 # Criar utilizador padrão ao iniciar
 @app.on_event("startup")
 def create_default_user():
@@ -79,6 +124,76 @@ def create_default_user():
     finally:
         db.close()
 
+# Cada escrita de actividades (fila, sync ou bulk) entra no buffer de recentes
+# e sobe a versão do feed - por esta ordem, para um ETag novo nunca servir dados velhos
+activity_queue.add_listener(recent_buffer.append)
+activity_queue.add_listener(lambda rows: versions.mark_changed("activities"))
+
+@app.on_event("startup")
+def warm_recent_buffer():
+    db = database.SessionLocal()
+    try:
+        recent_buffer.warm(db)
+    finally:
+        db.close()
+
+def on_archived(entity: str):
+    """Listener do arquivo: actividades arquivadas saem do buffer; versões e cache são invalidadas"""
+    if entity == "activities":
+        warm_recent_buffer()
+    versions.mark_changed(entity)
+
+archive.add_listener(on_archived)
+
+@app.on_event("startup")
+def start_archive_worker():
+    archive.worker.start()
+
+@app.on_event("startup")
+def resume_result_renders():
+    pending = result_render.resume_pending()
+    if pending:
+        print(f"🔄 {pending} resultado(s) por renderizar reagendado(s)")
+
+@app.on_event("startup")
+def start_pdf_renderer():
+    pdf_service.renderer.start()
+
+@app.on_event("startup")
+def start_continuous_profiling():
+    if profiling.CONTINUOUS_PROFILING:
+        profiling.continuous.start()
+
+@app.on_event("startup")
+def start_activity_queue():
+    if activity_queue.ACTIVITY_WRITE_MODE != "sync":
+        activity_queue.queue.start()
+
+@app.on_event("shutdown")
+def flush_activity_queue():
+    """Garante que nenhuma actividade em fila se perde ao desligar"""
+    activity_queue.queue.stop()
+
+@app.on_event("shutdown")
+def stop_archive_worker():
+    archive.worker.stop()
+
+@app.on_event("shutdown")
+def stop_result_renders():
+    result_render.shutdown()
+
+@app.on_event("shutdown")
+def stop_pdf_renderer():
+    pdf_service.renderer.stop()
+
+@app.on_event("shutdown")
+def stop_batch_reports():
+    batch_report.reports.shutdown()
+
+@app.on_event("shutdown")
+def stop_continuous_profiling():
+    profiling.continuous.stop()
+
 # ==================== AUTH ENDPOINTS ====================
 
 @app.post("/token", response_model=schemas.Token)
@@ -115,29 +230,113 @@ async def create_task(
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
+    versions.mark_changed("tasks", [db_task.empresa])
     return db_task
 
+@app.post("/tasks/bulk", status_code=status.HTTP_201_CREATED)
+async def create_tasks_bulk(
+    items: List[Dict[str, Any]],
+    response: Response,
+    db: Session = Depends(database.get_db),
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Criar várias tarefas numa única transacção (aceita PT ou EN, sucesso parcial)"""
+    bulk.check_size(items)
+    created, rows, errors = bulk.create_many(
+        db, schemas_bilingual.TaskCreate, database.Task, items,
+        prepare=lambda row: dict(row, created_by=current_user.username)
+    )
+    db.commit()
+    versions.mark_changed("tasks", [row["empresa"] for row in rows])
+    
+    if errors:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return bulk.bulk_response("created", created, errors)
+
+@app.patch("/tasks/bulk")
+async def update_tasks_bulk(
+    items: List[Dict[str, Any]],
+    response: Response,
+    db: Session = Depends(database.get_db),
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Actualizar várias tarefas numa única transacção (cada item com 'id', sucesso parcial)"""
+    bulk.check_size(items)
+    valid, errors = bulk.validate_updates(schemas_bilingual.TaskUpdate, items)
+    
+    # Uma só query para confirmar que existem, saber quais já têm data de conclusão e a empresa actual
+    existing = {
+        row.id: row for row in
+        db.query(database.Task.id, database.Task.completado_em, database.Task.empresa)
+        .filter(database.Task.id.in_({task_id for _, task_id, _ in valid}))
+        .all()
+    } if valid else {}
+    completed = {task_id for task_id, row in existing.items() if row.completado_em}
+    
+    now = datetime.utcnow()
+    rows, updated, empresas = [], [], set()
+    for index, task_id, fields in valid:
+        if task_id not in existing:
+            errors.append(bulk.item_error(index, "Tarefa não encontrada"))
+            continue
+        row = dict(fields, id=task_id, updated_at=now)
+        # Se mudou para "Concluído", marcar data de conclusão
+        if fields.get("status") == "Concluído" and task_id not in completed:
+            row["completado_em"] = now
+            completed.add(task_id)
+        rows.append(row)
+        updated.append((index, task_id))
+        empresas.update([existing[task_id].empresa, fields.get("empresa")])
+    
+    bulk.bulk_update(db, database.Task, rows)
+    # O HTML pré-renderizado inclui o título
+    render_pending = result_render.invalidate_many(db, [row["id"] for row in rows if "titulo" in row])
+    db.commit()
+    versions.mark_changed("tasks", empresas)
+    for task_id in render_pending:
+        result_render.submit(task_id)
+    
+    if errors:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return bulk.bulk_response("updated", updated, errors)
+
 @app.get("/tasks/", response_model=List[schemas.Task])
 async def list_tasks(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     status: str = None,
     empresa: str = None,
     prioridade: str = None,
+    include_archived: bool = False,
     db: Session = Depends(database.get_db),
     current_user: database.User = Depends(auth.get_current_active_user)
 ):
-    query = db.query(database.Task)
+    def build(query):
+        query = filters.filter_tasks(query, status, empresa, prioridade)
+        return query.order_by(database.Task.created_at.desc()).offset(skip).limit(limit)
     
-    if status:
-        query = query.filter(database.Task.status == status)
-    if empresa:
-        query = query.filter(database.Task.empresa == empresa)
-    if prioridade:
-        query = query.filter(database.Task.prioridade == prioridade)
+    def load():
+        if include_archived:
+            hot_query = filters.filter_tasks(db.query(database.Task), status, empresa, prioridade)
+            tasks = archive.merged_page(
+                db, hot_query.order_by(database.Task.created_at.desc()), database.Task, database.ArchivedTask,
+                dict(status=status, empresa=empresa, prioridade=prioridade), skip, limit
+            )
+        elif fast_json.FAST_LIST_SERIALIZATION:
+            return fast_json.list_json(db, build, database.Task, schemas.Task)
+        else:
+            tasks = build(db.query(database.Task)).all()
+        return [schemas.Task.model_validate(t).model_dump(mode="json") for t in tasks]
     
-    tasks = query.order_by(database.Task.created_at.desc()).offset(skip).limit(limit).all()
-    return tasks
+    tags = entity_tags("tasks", empresa)
+    return versions.conditional_response(request, tags, lambda: response_cache.cached_response(
+        "tasks:list",
+        dict(skip=skip, limit=limit, status=status, empresa=empresa, prioridade=prioridade,
+             include_archived=include_archived),
+        tags,
+        load
+    ))
 
 @app.get("/tasks/pending", response_model=List[schemas.Task])
 async def get_pending_tasks(
@@ -156,11 +355,56 @@ async def get_task(
     db: Session = Depends(database.get_db),
     current_user: database.User = Depends(auth.get_current_active_user)
 ):
-    task = db.query(database.Task).filter(database.Task.id == task_id).first()
+    # Tarefas concluídas antigas podem já estar no arquivo
+    task = archive.load_task(db, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Tarefa não encontrada")
     return task
 
+@app.get("/tasks/{task_id}/full", response_model=schemas.TaskFull)
+async def get_task_full(
+    task_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Tarefa com documentos, eventos e histórico de actividades, incluindo o arquivo (5 queries, independente do volume)"""
+    # O histórico inclui as actividades já arquivadas
+    archived_activities = archive.archived_target_activities(db, "task", task_id)
+    
+    def history(activities):
+        return sorted(activities + archived_activities,
+                      key=lambda a: a.created_at or datetime.min, reverse=True)
+    
+    task = db.query(database.Task).options(
+        selectinload(database.Task.documents),
+        selectinload(database.Task.calendar_events),
+        selectinload(database.Task.activities)
+    ).filter(database.Task.id == task_id).first()
+    if task and not archived_activities:
+        return task
+    if task:
+        return {
+            **schemas.Task.model_validate(task).model_dump(),
+            "documents": task.documents,
+            "calendar_events": task.calendar_events,
+            "activities": history(list(task.activities)),
+        }
+    
+    task = archive.load_task(db, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    # Tarefa arquivada: objecto fora da sessão, relações carregadas à mão
+    return {
+        **schemas.Task.model_validate(task).model_dump(),
+        "documents": db.query(database.Document).filter(database.Document.task_id == task_id)
+            .order_by(database.Document.created_at.desc()).all(),
+        "calendar_events": db.query(database.CalendarEvent).filter(database.CalendarEvent.task_id == task_id)
+            .order_by(database.CalendarEvent.start_date.asc()).all(),
+        "activities": history(db.query(database.Activity).filter(
+            database.Activity.target_type == "task", database.Activity.target_id == task_id
+        ).all()),
+    }
+
 @app.put("/tasks/{task_id}", response_model=schemas.Task)
 @app.patch("/tasks/{task_id}", response_model=schemas.Task)
 async def update_task(
@@ -172,6 +416,7 @@ async def update_task(
     task = db.query(database.Task).filter(database.Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    old_empresa = task.empresa
     
     update_data = task_update.dict(exclude_unset=True)
     for field, value in update_data.items():
@@ -183,8 +428,14 @@ async def update_task(
     if task_update.status == "Concluído" and not task.completado_em:
         task.completado_em = datetime.utcnow()
     
+    # O HTML pré-renderizado inclui o título
+    render_pending = "titulo" in update_data and result_render.invalidate(task)
+    
     db.commit()
     db.refresh(task)
+    versions.mark_changed("tasks", [old_empresa, task.empresa])
+    if render_pending:
+        result_render.submit(task.id, task.resultado)
     return task
 
 @app.post("/tasks/{task_id}/result", response_model=schemas.Task)
@@ -204,9 +455,14 @@ async def add_task_result(
     task.status = "Concluído"
     task.completado_em = datetime.utcnow()
     task.updated_at = datetime.utcnow()
+    # EAGER_RENDER: JSON validado/canonicalizado já, HTML gerado em segundo plano
+    render_pending = result_render.prepare(task)
     
     db.commit()
     db.refresh(task)
+    versions.mark_changed("tasks", [task.empresa])
+    if render_pending:
+        result_render.submit(task.id, task.resultado)
     return task
 
 @app.delete("/tasks/{task_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -217,48 +473,130 @@ async def delete_task(
 ):
     task = db.query(database.Task).filter(database.Task.id == task_id).first()
     if not task:
-        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+        empresa = archive.delete_archived_task(db, task_id)
+        if empresa is None:
+            raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+        versions.mark_changed("tasks", [empresa])
+        return None
     
     db.delete(task)
     db.commit()
+    versions.mark_changed("tasks", [task.empresa])
     return None
 
 # ==================== STATS ENDPOINTS ====================
 
 @app.get("/stats/overview")
 async def get_overview_stats(
+    request: Request,
     db: Session = Depends(database.get_db),
     current_user: database.User = Depends(auth.get_current_active_user)
 ):
-    total_tasks = db.query(database.Task).count()
-    pendentes = db.query(database.Task).filter(database.Task.status == "Pendente").count()
-    em_progresso = db.query(database.Task).filter(database.Task.status == "Em Progresso").count()
-    concluidas = db.query(database.Task).filter(database.Task.status == "Concluído").count()
-    
-    return {
-        "total_tasks": total_tasks,
-        "pendentes": pendentes,
-        "em_progresso": em_progresso,
-        "concluidas": concluidas,
-        "taxa_conclusao": round((concluidas / total_tasks * 100) if total_tasks > 0 else 0, 1)
-    }
+    return versions.conditional_response(request, ["tasks"], lambda: response_cache.cached_response(
+        "stats:overview", {}, ["tasks"], lambda: dashboard.overview_stats(db)
+    ))
 
 @app.get("/stats/by-empresa")
 async def get_stats_by_empresa(
+    request: Request,
     db: Session = Depends(database.get_db),
     current_user: database.User = Depends(auth.get_current_active_user)
 ):
     from sqlalchemy import func
     
-    results = db.query(
-        database.Task.empresa,
-        func.count(database.Task.id).label('total')
-    ).group_by(database.Task.empresa).all()
+    def load():
+        results = db.query(
+            database.Task.empresa,
+            func.count(database.Task.id).label('total')
+        ).group_by(database.Task.empresa).all()
+        totals = {r.empresa: r.total for r in results}
+        for empresa, archived in archive.archived_task_counts(db, by_empresa=True).items():
+            totals[empresa] = totals.get(empresa, 0) + archived
+        return [{"empresa": empresa, "total": total} for empresa, total in totals.items()]
     
-    return [{"empresa": r.empresa, "total": r.total} for r in results]
+    return versions.conditional_response(
+        request, ["tasks"], lambda: response_cache.cached_response("stats:by-empresa", {}, ["tasks"], load)
+    )
+
+# ==================== DASHBOARD ====================
+
+@app.get("/dashboard/bootstrap")
+async def dashboard_bootstrap(
+    tasks_limit: int = Query(100, ge=1, le=dashboard.DASHBOARD_MAX_LIMIT),
+    activities_limit: int = Query(20, ge=1, le=dashboard.DASHBOARD_MAX_LIMIT),
+    documents_limit: int = Query(100, ge=1, le=dashboard.DASHBOARD_MAX_LIMIT),
+    memories_limit: int = Query(100, ge=1, le=dashboard.DASHBOARD_MAX_LIMIT),
+    db: Session = Depends(database.get_db),
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """
+    Tudo o que o dashboard precisa no primeiro ecrã numa só resposta
+    
+    Substitui os 6 pedidos iniciais do frontend (user, tasks, stats, activities,
+    documents, memories): uma autenticação, uma sessão de BD e projecções
+    resumidas (sem resultado das tarefas nem conteúdo dos documentos).
+    """
+    return {
+        "user": schemas.User.model_validate(current_user),
+        "tasks": dashboard.task_summaries(db, tasks_limit),
+        "stats": dashboard.overview_stats(db),
+        "activities": dashboard.recent_activities(db, activities_limit),
+        "documents": dashboard.document_summaries(db, documents_limit),
+        "memories": dashboard.memory_summaries(db, memories_limit),
+    }
 
 # ==================== DOCUMENT DOWNLOAD ====================
 
+@app.get("/tasks/download/bundle")
+async def download_task_bundle(
+    ids: List[int] = Query(None),
+    empresa: str = None,
+    status: str = None,
+    date_from: datetime = None,
+    date_to: datetime = None,
+    formats: str = "html,docx,xlsx,pdf",
+    db: Session = Depends(database.get_db),
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """
+    ZIP com todos os formatos de várias tarefas (por ids ou filtro), enviado em streaming
+    
+    Os ficheiros são renderizados em paralelo e entram no ZIP assim que ficam prontos;
+    erros por tarefa/formato ficam no manifest.json no fim do ZIP.
+    """
+    selected_formats = bundle.parse_formats(formats)
+    if not ids and not any([empresa, status, date_from, date_to]):
+        raise HTTPException(status_code=400, detail="Indique ids ou um filtro (empresa, status, date_from, date_to)")
+    
+    task_ids = bundle.select_task_ids(db, ids, empresa, status, date_from, date_to)
+    if not task_ids:
+        raise HTTPException(status_code=404, detail="Nenhuma tarefa encontrada")
+    
+    return StreamingResponse(
+        bundle.stream_bundle(task_ids, selected_formats),
+        media_type=downloads.MEDIA_TYPES["zip"],
+        headers={
+            "Content-Disposition": downloads.content_disposition(bundle.bundle_filename(empresa)),
+            "X-Bundle-Tasks": str(len(task_ids)),
+        },
+    )
+
+@app.get("/tasks/{task_id}/view")
+async def view_task_result(
+    task_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Vista HTML do resultado (pré-renderizada com EAGER_RENDER, senão gerada agora)"""
+    task = archive.load_task(db, task_id)
+    if not task:
+        raise HTTPException(status_code=404, detail="Tarefa não encontrada")
+    if not task.resultado:
+        raise HTTPException(status_code=400, detail="Tarefa não tem resultado")
+    
+    headers = {"X-Render-Status": task.render_status or "lazy"}
+    return HTMLResponse(content=result_render.report_html(task), headers=headers)
+
 @app.get("/tasks/{task_id}/download/{format}")
 async def download_task_document(
     task_id: int,
@@ -269,84 +607,107 @@ async def download_task_document(
     """
     Gera e faz download de documento em formato específico
     """
-    # Buscar tarefa
-    task = db.query(database.Task).filter(database.Task.id == task_id).first()
+    # Buscar tarefa (tabela quente ou arquivo)
+    task = archive.load_task(db, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Tarefa não encontrada")
     
     if not task.resultado:
         raise HTTPException(status_code=400, detail="Tarefa não tem resultado")
     
-    # Preparar dados
-    try:
-        # Tentar parsear como JSON
-        if task.resultado.strip().startswith('{'):
-            data = json.loads(task.resultado)
-        else:
-            # HTML ou texto
-            data = {"content": task.resultado}
-    except:
-        data = {"content": task.resultado}
+    # Preparar dados (JSON canónico pré-calculado ou parsing do resultado)
+    data = result_render.report_data(task)
     
     task_title = task.titulo
     
-    # Gerar documento conforme formato
+    # Gerar documento conforme formato (em memória; ficheiro temporário único só se for grande)
     try:
         if format == "docx":
             # Gerar Word
             from kalu_document_generator_advanced import generate_word_document
-            output_path = f"/tmp/task_{task_id}.docx"
-            generate_word_document(data, task_title, output_path)
-            
-            return FileResponse(
-                path=output_path,
-                media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                filename=f"{task_title[:50].replace(' ', '_')}.docx",
-                headers={"Content-Disposition": f"attachment; filename={task_title[:50].replace(' ', '_')}.docx"}
-            )
+            buffer = await run_in_threadpool(downloads.spool, generate_word_document, data, task_title)
+            return downloads.buffer_response(buffer, "docx", task_title)
         
         elif format == "xlsx":
             # Gerar Excel
             from kalu_document_generator_advanced import generate_excel_document
-            output_path = f"/tmp/task_{task_id}.xlsx"
-            generate_excel_document(data, task_title, output_path)
-            
-            return FileResponse(
-                path=output_path,
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                filename=f"{task_title[:50].replace(' ', '_')}.xlsx",
-                headers={"Content-Disposition": f"attachment; filename={task_title[:50].replace(' ', '_')}.xlsx"}
-            )
+            buffer = await run_in_threadpool(downloads.spool, generate_excel_document, data, task_title)
+            return downloads.buffer_response(buffer, "xlsx", task_title)
         
         elif format == "pdf":
-            # Gerar PDF
-            from kalu_document_generator_advanced import generate_pdf_from_html
-            from kalu_document_generator import generate_html_report, generate_markdown_report
-            
-            # Se já for HTML, usar direto
-            if task.resultado_tipo == "html" and task.resultado.strip().startswith('<'):
-                html_content = task.resultado
-            else:
-                # Gerar HTML do JSON/texto
-                markdown = generate_markdown_report(data, task_title)
-                html_content = generate_html_report(markdown)
-            
-            output_path = f"/tmp/task_{task_id}.pdf"
-            generate_pdf_from_html(html_content, output_path)
-            
-            return FileResponse(
-                path=output_path,
-                media_type="application/pdf",
-                filename=f"{task_title[:50].replace(' ', '_')}.pdf",
-                headers={"Content-Disposition": f"attachment; filename={task_title[:50].replace(' ', '_')}.pdf"}
-            )
+            # Gerar PDF (pool de renderers quentes, sem ficheiros temporários)
+            # HTML pré-renderizado (EAGER_RENDER) ou gerado agora do JSON/texto
+            html_content = result_render.report_html(task)
+            pdf = await run_in_threadpool(pdf_service.renderer.render, html_content)
+            return downloads.buffer_response(io.BytesIO(pdf), "pdf", task_title)
         
         else:
             raise HTTPException(status_code=400, detail=f"Formato não suportado: {format}")
     
+    except pdf_service.PDFUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erro ao gerar documento: {str(e)}")
 
+# ==================== BATCH REPORTS ====================
+
+@app.post("/reports/empresa/{empresa}", status_code=status.HTTP_202_ACCEPTED)
+async def create_batch_report(
+    empresa: str,
+    date_from: datetime = None,
+    date_to: datetime = None,
+    formats: str = "docx,xlsx,pdf",
+    db: Session = Depends(database.get_db),
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """
+    Relatório consolidado (DOCX/XLSX/PDF) das tarefas concluídas de uma empresa no período
+    
+    Corre em segundo plano: acompanhar em GET /reports/jobs/{job_id}
+    """
+    selected_formats = batch_report.parse_formats(formats)
+    task_ids = batch_report.select_completed_task_ids(db, empresa, date_from, date_to)
+    if not task_ids:
+        raise HTTPException(status_code=404, detail="Nenhuma tarefa concluída no período")
+    
+    job = batch_report.reports.submit(empresa, date_from, date_to, selected_formats, task_ids)
+    return job.progress()
+
+@app.get("/reports/jobs/{job_id}")
+async def get_batch_report(
+    job_id: str,
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Progresso do relatório (secções feitas por formato, estado, erros)"""
+    job = batch_report.reports.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Relatório não encontrado ou expirado")
+    return job.progress()
+
+@app.get("/reports/jobs/{job_id}/download/{format}")
+async def download_batch_report(
+    job_id: str,
+    format: str,
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    job = batch_report.reports.get(job_id)
+    if not job or format not in job.formats:
+        raise HTTPException(status_code=404, detail="Relatório não encontrado ou expirado")
+    if format in job.errors:
+        unavailable = job.errors[format].startswith(pdf_service.PDFUnavailable.__name__)
+        raise HTTPException(status_code=503 if unavailable else 500, detail=f"Erro ao gerar documento: {job.errors[format]}")
+    if format not in job.files:
+        raise HTTPException(status_code=409, detail=f"Relatório ainda em curso: {job.stage}")
+    
+    return StreamingResponse(
+        job.iter_file(format),
+        media_type=downloads.MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": downloads.content_disposition(downloads.download_filename(job.filename_title, format)),
+            "Content-Length": str(job.size(format)),
+        },
+    )
+
 # ==================== ACTIVITY FEED ENDPOINTS ====================
 
 @app.post("/activities/", status_code=status.HTTP_201_CREATED)
@@ -362,7 +723,7 @@ async def create_activity(
     db: Session = Depends(database.get_db)
 ):
     """Criar nova entrada no Activity Feed"""
-    activity = database.Activity(
+    fields = dict(
         tipo=tipo,
         titulo=titulo,
         descricao=descricao,
@@ -372,38 +733,98 @@ async def create_activity(
         extra_data=extra_data,
         icon=icon
     )
-    db.add(activity)
+    
+    if activity_queue.ACTIVITY_WRITE_MODE == "sync":
+        activity = database.Activity(**fields)
+        db.add(activity)
+        db.commit()
+        db.refresh(activity)
+        activity_queue.notify_written([activity_queue.activity_to_row(activity)])
+        return activity
+    
+    # Group commit: a actividade entra no próximo lote da fila
+    pending = activity_queue.queue.enqueue(**fields)
+    if activity_queue.ACTIVITY_WRITE_MODE == "group":
+        acked = await run_in_threadpool(pending.wait, activity_queue.ACTIVITY_ACK_TIMEOUT)
+        if not acked:
+            # Continua na fila, mas não podemos confirmar que foi gravada
+            raise HTTPException(status_code=504, detail="Actividade em fila sem confirmação de escrita (timeout)")
+        if pending.error:
+            raise HTTPException(status_code=503, detail=f"Erro ao gravar o lote de actividades: {pending.error}")
+    return pending.as_dict()
+
+@app.post("/activities/bulk", status_code=status.HTTP_201_CREATED)
+async def create_activities_bulk(
+    activities: List[schemas_bilingual.ActivityCreate],
+    db: Session = Depends(database.get_db)
+):
+    """Criar várias entradas no Activity Feed numa única transacção (aceita PT ou EN)"""
+    rows = [activity_queue.build_activity_row(a.dict()) for a in activities]
+    ids = activity_queue.insert_activities(db, rows)
     db.commit()
-    db.refresh(activity)
-    return activity
+    activity_queue.notify_written([dict(row, id=activity_id) for row, activity_id in zip(rows, ids)])
+    return {"created": len(ids), "ids": ids}
 
 @app.get("/activities/")
 async def list_activities(
+    request: Request,
     skip: int = 0,
     limit: int = 50,
     tipo: str = None,
+    include_archived: bool = False,
     db: Session = Depends(database.get_db),
     current_user: database.User = Depends(auth.get_current_active_user)
 ):
-    """Listar actividades (com filtros opcionais)"""
-    query = db.query(database.Activity)
+    """Listar actividades (com filtros opcionais; ?include_archived=true junta o arquivo)"""
+    def build(query):
+        query = filters.filter_activities(query, tipo)
+        return query.order_by(database.Activity.created_at.desc()).offset(skip).limit(limit)
     
-    if tipo:
-        query = query.filter(database.Activity.tipo == tipo)
+    def load():
+        if include_archived:
+            hot_query = filters.filter_activities(db.query(database.Activity), tipo)
+            return archive.merged_page(
+                db, hot_query.order_by(database.Activity.created_at.desc()), database.Activity,
+                database.ArchivedActivity, dict(tipo=tipo), skip, limit
+            )
+        if fast_json.FAST_LIST_SERIALIZATION:
+            return Response(content=fast_json.list_json(db, build, database.Activity),
+                            media_type="application/json")
+        return build(db.query(database.Activity)).all()
     
-    activities = query.order_by(database.Activity.created_at.desc()).offset(skip).limit(limit).all()
-    return activities
+    return versions.conditional_response(request, ["activities"], load)
 
 @app.get("/activities/recent")
 async def get_recent_activities(
+    request: Request,
     limit: int = 20,
     db: Session = Depends(database.get_db)
 ):
     """Actividades recentes (sem autenticação - para widgets)"""
-    activities = db.query(database.Activity).order_by(
-        database.Activity.created_at.desc()
-    ).limit(limit).all()
-    return activities
+    # Servido do buffer em memória; a BD só é usada para páginas mais fundas
+    if recent_buffer.can_serve(limit):
+        return versions.conditional_response(request, ["activities"], lambda: Response(
+            content=recent_buffer.render(limit), media_type="application/json"
+        ))
+    
+    def load():
+        return db.query(database.Activity).order_by(
+            database.Activity.created_at.desc()
+        ).limit(limit).all()
+    
+    return versions.conditional_response(request, ["activities"], load)
+
+@app.get("/activities/{activity_id}")
+async def get_activity(
+    activity_id: int,
+    db: Session = Depends(database.get_db),
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Actividade por id (inclui actividades já arquivadas)"""
+    activity = archive.load_activity(db, activity_id)
+    if not activity:
+        raise HTTPException(status_code=404, detail="Actividade não encontrada")
+    return activity
 
 # ==================== DOCUMENTS ENDPOINTS ====================
 
@@ -436,11 +857,11 @@ async def create_document(
         file_size=len(conteudo) if conteudo else 0
     )
     db.add(document)
-    db.commit()
-    db.refresh(document)
+    db.flush()
     
-    # Registar no Activity Feed
-    activity = database.Activity(
+    # Registar no Activity Feed (no mesmo commit ou na fila de group commit)
+    activity_queue.record_activity(
+        db,
         tipo="document_created",
         titulo=f"Documento criado: {titulo}",
         descricao=f"Tipo: {tipo} | Projeto: {projeto or 'N/A'}",
@@ -449,11 +870,50 @@ async def create_document(
         target_type="document",
         icon="📄"
     )
-    db.add(activity)
     db.commit()
+    db.refresh(document)
+    versions.mark_changed("documents", [empresa])
     
     return document
 
+@app.post("/documents/bulk", status_code=status.HTTP_201_CREATED)
+async def create_documents_bulk(
+    items: List[Dict[str, Any]],
+    response: Response,
+    created_by: str = "Kalu",
+    db: Session = Depends(database.get_db)
+):
+    """Criar vários documentos numa única transacção (aceita PT ou EN, sucesso parcial)"""
+    bulk.check_size(items)
+    created, rows, errors = bulk.create_many(
+        db, schemas_bilingual.DocumentCreate, database.Document, items,
+        prepare=lambda row: dict(
+            row,
+            created_by=created_by,
+            file_size=len(row["conteudo"]) if row["conteudo"] else 0
+        )
+    )
+    
+    # Registar no Activity Feed
+    activity_queue.record_activities(db, [
+        dict(
+            tipo="document_created",
+            titulo=f"Documento criado: {row['titulo']}",
+            descricao=f"Tipo: {row['tipo']} | Projeto: {row['projeto'] or 'N/A'}",
+            actor=created_by,
+            target_id=doc_id,
+            target_type="document",
+            icon="📄"
+        )
+        for (_, doc_id), row in zip(created, rows)
+    ])
+    db.commit()
+    versions.mark_changed("documents", [row["empresa"] for row in rows])
+    
+    if errors:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return bulk.bulk_response("created", created, errors)
+
 @app.get("/documents/")
 async def list_documents(
     skip: int = 0,
@@ -465,17 +925,21 @@ async def list_documents(
     current_user: database.User = Depends(auth.get_current_active_user)
 ):
     """Listar documentos com filtros"""
-    query = db.query(database.Document)
+    def build(query):
+        query = filters.filter_documents(query, tipo, empresa, projeto)
+        return query.order_by(database.Document.created_at.desc()).offset(skip).limit(limit)
     
-    if tipo:
-        query = query.filter(database.Document.tipo == tipo)
-    if empresa:
-        query = query.filter(database.Document.empresa == empresa)
-    if projeto:
-        query = query.filter(database.Document.projeto == projeto)
+    def load():
+        if fast_json.FAST_LIST_SERIALIZATION:
+            return fast_json.list_json(db, build, database.Document)
+        return jsonable_encoder(build(db.query(database.Document)).all())
     
-    documents = query.order_by(database.Document.created_at.desc()).offset(skip).limit(limit).all()
-    return documents
+    return response_cache.cached_response(
+        "documents:list",
+        dict(skip=skip, limit=limit, tipo=tipo, empresa=empresa, projeto=projeto),
+        entity_tags("documents", empresa),
+        load
+    )
 
 @app.get("/documents/{doc_id}")
 async def get_document(
@@ -502,6 +966,7 @@ async def delete_document(
     
     db.delete(doc)
     db.commit()
+    versions.mark_changed("documents", [doc.empresa])
     return None
 
 # ==================== MEMORY ENDPOINTS ====================
@@ -528,11 +993,11 @@ async def create_memory(
         tags=tags
     )
     db.add(memory)
-    db.commit()
-    db.refresh(memory)
+    db.flush()
     
-    # Registar no Activity Feed
-    activity = database.Activity(
+    # Registar no Activity Feed (no mesmo commit ou na fila de group commit)
+    activity_queue.record_activity(
+        db,
         tipo="memory_created",
         titulo=f"Memória registada: {titulo}",
         descricao=f"Tipo: {tipo} | Importância: {importancia}",
@@ -541,11 +1006,46 @@ async def create_memory(
         target_type="memory",
         icon="🧠"
     )
-    db.add(activity)
     db.commit()
+    db.refresh(memory)
+    versions.mark_changed("memories")
     
     return memory
 
+@app.post("/memories/bulk", status_code=status.HTTP_201_CREATED)
+async def create_memories_bulk(
+    items: List[Dict[str, Any]],
+    response: Response,
+    db: Session = Depends(database.get_db)
+):
+    """Criar várias memórias numa única transacção (aceita PT ou EN, sucesso parcial)"""
+    bulk.check_size(items)
+    # 'contexto' existe só no schema, não na tabela
+    created, rows, errors = bulk.create_many(
+        db, schemas_bilingual.MemoryCreate, database.Memory, items,
+        prepare=lambda row: {k: v for k, v in row.items() if k != "contexto"}
+    )
+    
+    # Registar no Activity Feed
+    activity_queue.record_activities(db, [
+        dict(
+            tipo="memory_created",
+            titulo=f"Memória registada: {row['titulo']}",
+            descricao=f"Tipo: {row['tipo']} | Importância: {row['importancia']}",
+            actor="Kalu",
+            target_id=memory_id,
+            target_type="memory",
+            icon="🧠"
+        )
+        for (_, memory_id), row in zip(created, rows)
+    ])
+    db.commit()
+    versions.mark_changed("memories")
+    
+    if errors:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return bulk.bulk_response("created", created, errors)
+
 @app.get("/memories/")
 async def list_memories(
     skip: int = 0,
@@ -557,17 +1057,21 @@ async def list_memories(
     current_user: database.User = Depends(auth.get_current_active_user)
 ):
     """Listar memórias com filtros"""
-    query = db.query(database.Memory)
+    def build(query):
+        query = filters.filter_memories(query, tipo, categoria, importancia)
+        return query.order_by(database.Memory.created_at.desc()).offset(skip).limit(limit)
     
-    if tipo:
-        query = query.filter(database.Memory.tipo == tipo)
-    if categoria:
-        query = query.filter(database.Memory.categoria == categoria)
-    if importancia:
-        query = query.filter(database.Memory.importancia == importancia)
+    def load():
+        if fast_json.FAST_LIST_SERIALIZATION:
+            return fast_json.list_json(db, build, database.Memory)
+        return jsonable_encoder(build(db.query(database.Memory)).all())
     
-    memories = query.order_by(database.Memory.created_at.desc()).offset(skip).limit(limit).all()
-    return memories
+    return response_cache.cached_response(
+        "memories:list",
+        dict(skip=skip, limit=limit, tipo=tipo, categoria=categoria, importancia=importancia),
+        ["memories"],
+        load
+    )
 
 @app.get("/memories/search")
 async def search_memories(
@@ -622,8 +1126,27 @@ async def create_calendar_event(
     db.add(event)
     db.commit()
     db.refresh(event)
+    versions.mark_changed("calendar")
     return event
 
+@app.post("/calendar/bulk", status_code=status.HTTP_201_CREATED)
+async def create_calendar_events_bulk(
+    items: List[Dict[str, Any]],
+    response: Response,
+    db: Session = Depends(database.get_db)
+):
+    """Criar vários eventos no calendário numa única transacção (aceita PT ou EN, sucesso parcial)"""
+    bulk.check_size(items)
+    created, _, errors = bulk.create_many(
+        db, schemas_bilingual.CalendarEventCreate, database.CalendarEvent, items
+    )
+    db.commit()
+    versions.mark_changed("calendar")
+    
+    if errors:
+        response.status_code = status.HTTP_207_MULTI_STATUS
+    return bulk.bulk_response("created", created, errors)
+
 @app.get("/calendar/")
 async def list_calendar_events(
     start: datetime = None,
@@ -633,15 +1156,7 @@ async def list_calendar_events(
     current_user: database.User = Depends(auth.get_current_active_user)
 ):
     """Listar eventos do calendário (com range de datas)"""
-    query = db.query(database.CalendarEvent)
-    
-    if start:
-        query = query.filter(database.CalendarEvent.start_date >= start)
-    if end:
-        query = query.filter(database.CalendarEvent.start_date <= end)
-    if tipo:
-        query = query.filter(database.CalendarEvent.tipo == tipo)
-    
+    query = filters.filter_calendar_events(db.query(database.CalendarEvent), start, end, tipo)
     events = query.order_by(database.CalendarEvent.start_date.asc()).all()
     return events
 
@@ -658,8 +1173,98 @@ async def delete_calendar_event(
     
     db.delete(event)
     db.commit()
+    versions.mark_changed("calendar")
     return None
 
+# ==================== EXPORT / IMPORT ====================
+
+@app.get("/export/tasks")
+async def export_tasks(
+    format: str = "ndjson",  # ndjson, csv
+    status: str = None,
+    empresa: str = None,
+    prioridade: str = None,
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Exportar todas as tarefas em streaming (mesmos filtros que GET /tasks/, incluindo o arquivo)"""
+    return data_transfer.export_response(
+        "tasks", lambda query: filters.filter_tasks(query, status, empresa, prioridade), format,
+        archived_match=dict(status=status, empresa=empresa, prioridade=prioridade)
+    )
+
+@app.get("/export/activities")
+async def export_activities(
+    format: str = "ndjson",
+    tipo: str = None,
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Exportar todas as actividades em streaming (mesmos filtros que GET /activities/, incluindo o arquivo)"""
+    return data_transfer.export_response(
+        "activities", lambda query: filters.filter_activities(query, tipo), format,
+        archived_match=dict(tipo=tipo)
+    )
+
+@app.get("/export/documents")
+async def export_documents(
+    format: str = "ndjson",
+    tipo: str = None,
+    empresa: str = None,
+    projeto: str = None,
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Exportar todos os documentos em streaming (mesmos filtros que GET /documents/)"""
+    return data_transfer.export_response(
+        "documents", lambda query: filters.filter_documents(query, tipo, empresa, projeto), format
+    )
+
+@app.get("/export/memories")
+async def export_memories(
+    format: str = "ndjson",
+    tipo: str = None,
+    categoria: str = None,
+    importancia: str = None,
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Exportar todas as memórias em streaming (mesmos filtros que GET /memories/)"""
+    return data_transfer.export_response(
+        "memories", lambda query: filters.filter_memories(query, tipo, categoria, importancia), format
+    )
+
+@app.get("/export/calendar")
+async def export_calendar_events(
+    format: str = "ndjson",
+    start: datetime = None,
+    end: datetime = None,
+    tipo: str = None,
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Exportar todos os eventos em streaming (mesmos filtros que GET /calendar/)"""
+    return data_transfer.export_response(
+        "calendar", lambda query: filters.filter_calendar_events(query, start, end, tipo), format
+    )
+
+@app.post("/import/{entity}")
+async def import_entity(
+    entity: str,
+    request: Request,
+    keep_ids: bool = True,
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """
+    Importar NDJSON em streaming (um objecto por linha, como gerado por /export)
+    
+    O corpo é lido e gravado em blocos, por isso um backup de milhões de
+    linhas pode ser restaurado num único pedido.
+    """
+    data_transfer.get_model(entity)
+    result = await data_transfer.import_ndjson(
+        entity, request.stream(), keep_ids=keep_ids, run_sync=run_in_threadpool
+    )
+    if entity == "activities":
+        await run_in_threadpool(warm_recent_buffer)
+    versions.mark_changed(entity)
+    return result
+
 # ==================== HEALTH CHECK ====================
 
 @app.get("/")
@@ -681,3 +1286,185 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+@app.get("/archive/stats")
+async def archive_stats(
+    db: Session = Depends(database.get_db),
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Tamanho das tabelas quentes e do arquivo, políticas e último ciclo do arquivo"""
+    return {
+        "tables": archive.table_stats(db),
+        "policy": {
+            "task_age_days": archive.ARCHIVE_TASK_AGE_DAYS,
+            "activity_age_days": archive.ARCHIVE_ACTIVITY_AGE_DAYS,
+            "task_retention_days": archive.ARCHIVE_TASK_RETENTION_DAYS,
+            "activity_retention_days": archive.ARCHIVE_ACTIVITY_RETENTION_DAYS,
+            "interval_s": archive.ARCHIVE_INTERVAL,
+        },
+        "worker": {**archive.worker.stats, "last_run": archive.worker.last_run},
+    }
+
+@app.post("/archive/run")
+async def run_archive(
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Corre já um ciclo de arquivo + retenção (normalmente feito pela thread)"""
+    return await run_in_threadpool(archive.worker.run_once)
+
+# ==================== METRICS ====================
+
+def db_pool_metrics():
+    pool = database.engine.pool
+    samples = {
+        "size": getattr(pool, "size", None),
+        "checked_out": getattr(pool, "checkedout", None),
+        "checked_in": getattr(pool, "checkedin", None),
+        "overflow": getattr(pool, "overflow", None),
+    }
+    return metrics.gauge_lines(
+        "kalu_db_pool_connections", "Ligações do pool da base de dados por estado",
+        [({"state": state}, read()) for state, read in samples.items() if read is not None],
+    )
+
+def cache_metrics():
+    caches = {"response": response_cache.stats_snapshot(), "parsed_results": result_render.parsed_cache_stats()}
+    lines = []
+    for kind in ("hits", "misses"):
+        lines += metrics.counter_lines(
+            f"kalu_cache_{kind}_total", f"Cache {kind} por cache",
+            [({"cache": name}, stats[kind]) for name, stats in caches.items()],
+        )
+    lines += metrics.gauge_lines(
+        "kalu_cache_hit_ratio", "Hit ratio desde o arranque",
+        [({"cache": name}, stats["hits"] / ((stats["hits"] + stats["misses"]) or 1)) for name, stats in caches.items()],
+    )
+    return lines
+
+def pdf_pool_metrics():
+    health = pdf_service.renderer.health()
+    return metrics.gauge_lines(
+        "kalu_pdf_workers", "Workers de PDF livres (weasyprint)",
+        [({"state": "idle"}, health["idle_workers"]), ({"state": "idle_alive"}, health["idle_workers_alive"])],
+    )
+
+def archive_table_metrics():
+    db = database.SessionLocal()
+    try:
+        tables = archive.table_stats(db)
+    finally:
+        db.close()
+    lines = metrics.gauge_lines(
+        "kalu_table_rows", "Linhas por tabela, na tabela quente e no arquivo",
+        [({"table": name, "tier": tier}, stats["hot_rows"] if tier == "hot" else stats["archive"]["rows"])
+         for name, stats in tables.items() for tier in ("hot", "archive")],
+    )
+    lines += metrics.gauge_lines(
+        "kalu_archive_compressed_bytes", "Bytes comprimidos no arquivo por tabela",
+        [({"table": name}, stats["archive"]["compressed_bytes"]) for name, stats in tables.items()],
+    )
+    return lines
+
+metrics.registry.add_collector(db_pool_metrics)
+metrics.registry.add_collector(cache_metrics)
+metrics.registry.add_collector(pdf_pool_metrics)
+metrics.registry.add_collector(archive_table_metrics)
+
+@app.get("/metrics")
+async def get_metrics(format: str = "prometheus"):
+    """Métricas em formato Prometheus (ou ?format=json com p50/p95/p99 estimados)"""
+    if format == "json":
+        return metrics.summary()
+    return Response(content=metrics.registry.exposition(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/debug/slow-queries")
+async def get_slow_queries(
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Últimas queries lentas (acima de SQL_SLOW_QUERY_MS) com o plano de execução"""
+    return {
+        "threshold_ms": sql_profile.SQL_SLOW_QUERY_MS,
+        "queries": list(reversed(sql_profile.slow_queries)),
+    }
+
+def require_profile_admin(
+    current_user: database.User = Depends(auth.get_current_active_user)
+) -> database.User:
+    if current_user.username not in profiling.PROFILE_ADMINS:
+        raise HTTPException(status_code=403, detail="Apenas administradores (PROFILE_ADMINS)")
+    return current_user
+
+@app.get("/debug/profiles")
+async def list_profiles(current_user: database.User = Depends(require_profile_admin)):
+    """Perfis guardados (on-demand e contínuos), mais recentes primeiro"""
+    return {
+        "continuous": profiling.CONTINUOUS_PROFILING,
+        "profiles": await run_in_threadpool(profiling.list_profiles),
+    }
+
+@app.get("/debug/profiles/{profile_id}")
+async def get_profile(
+    profile_id: str,
+    format: str = "speedscope",
+    current_user: database.User = Depends(require_profile_admin)
+):
+    """
+    Um perfil: speedscope JSON (abrir em https://www.speedscope.app)
+    ou ?format=collapsed para flamegraph.pl / inferno
+    """
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=400, detail="Formato inválido. Use: speedscope, collapsed")
+    path = profiling.profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil não encontrado")
+    with open(path, "rb") as f:
+        content = f.read()
+    if format == "collapsed":
+        return Response(
+            content=profiling.collapsed_stacks(json.loads(content)), media_type="text/plain",
+            headers={"Content-Disposition": f'attachment; filename="{profile_id}.folded"'},
+        )
+    return Response(
+        content=content, media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="{profile_id}.speedscope.json"'},
+    )
+
+@app.get("/debug/traces")
+async def list_traces(
+    min_ms: float = 0,
+    current_user: database.User = Depends(require_profile_admin)
+):
+    """Últimos traces deste processo (mais recentes primeiro); ?min_ms=500 só os lentos"""
+    return {
+        "enabled": tracing.TRACING_ENABLED,
+        "sample_rate": tracing.TRACE_SAMPLE_RATE,
+        "file": tracing.TRACE_FILE,
+        "traces": [t for t in reversed(tracing.recent) if t["ms"] >= min_ms],
+    }
+
+@app.get("/debug/traces/{trace_id}")
+async def get_trace(
+    trace_id: str,
+    current_user: database.User = Depends(require_profile_admin)
+):
+    """Um trace em formato Trace Event (abrir em https://ui.perfetto.dev ou chrome://tracing)"""
+    events = await run_in_threadpool(tracing.read_events, [tracing.TRACE_FILE], trace_id)
+    document = tracing.to_chrome(events)
+    if not any(event["ph"] == "X" for event in document["traceEvents"]):
+        raise HTTPException(status_code=404, detail="Trace não encontrado")
+    return Response(
+        content=json.dumps(document, ensure_ascii=False), media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="trace-{trace_id}.json"'},
+    )
+
+@app.get("/health/pdf")
+async def pdf_health():
+    """Estado do serviço de PDF: backend, workers, timeouts e latências"""
+    return pdf_service.renderer.health()
+
+@app.get("/cache/stats")
+async def cache_stats(
+    current_user: database.User = Depends(auth.get_current_active_user)
+):
+    """Métricas da cache de respostas (hit ratio, entradas, bytes, evictions)"""
+    return response_cache.metrics()
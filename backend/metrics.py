@@ -0,0 +1,315 @@
+"""
+Kalu Metrics
+============
+
+Métricas no formato de texto do Prometheus (GET /metrics), sem dependências.
+
+    kalu_http_requests_total{method,route,status}      contador de pedidos
+    kalu_http_request_duration_seconds{method,route}   histograma de latência
+    kalu_http_response_size_bytes{method,route}        histograma do tamanho das respostas
+    kalu_http_requests_in_flight                       pedidos em curso
+    kalu_document_render_seconds{format,kind}          duração da geração de documentos
+    kalu_db_pool_*                                     estado do pool de ligações (no scrape)
+    kalu_cache_*                                       hits/misses e hit ratio das caches (no scrape)
+    kalu_table_rows{table,tier}                        linhas nas tabelas quentes e no arquivo (no scrape)
+    kalu_archive_compressed_bytes{table}               tamanho comprimido do arquivo (no scrape)
+
+A rota é o template do FastAPI (/tasks/{task_id}), não o caminho, para a
+cardinalidade ficar limitada. O middleware é ASGI puro (não interfere com
+StreamingResponse) e cada observação custa um bisect e um lock - o resto é
+calculado só quando o /metrics é lido. p50/p95/p99 saem do histograma
+(histogram_quantile no Prometheus, ou estimados em GET /metrics?format=json).
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+RENDER_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+UNMATCHED_ROUTE = "unmatched"
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # o Starlette acrescenta o charset
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in values
+        ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, labels)} {_number(value)}" for labels, value in values
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [contagens por bucket (não cumulativas, +Inf no fim), soma, total]
+        self._series: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def _snapshot(self) -> List[Tuple[Tuple, List[int], float, int]]:
+        with self._lock:
+            return [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+
+    def quantile(self, q: float, counts: List[int]) -> Optional[float]:
+        """Estimativa do quantil q por interpolação linear dentro do bucket (como o histogram_quantile)"""
+        count = sum(counts)
+        if not count:
+            return None
+        rank = q * count
+        cumulative, lower = 0, 0.0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if bound == float("inf"):
+                    return self.buckets[-1]
+                return lower + (bound - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = bound
+        return self.buckets[-1]
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        result = {}
+        for labels, counts, total, count in self._snapshot():
+            key = " ".join(str(v) for v in labels) or self.name
+            result[key] = {
+                "count": count,
+                "avg": round(total / count, 6) if count else None,
+                **{f"p{int(q * 100)}": _round(self.quantile(q, counts)) for q in (0.5, 0.95, 0.99)},
+            }
+        return result
+
+    def collect(self) -> List[str]:
+        lines = self.header()
+        for labels, counts, total, count in self._snapshot():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 6) if value is not None else None
+
+
+# ---------- registo ----------
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]):
+        """Função chamada em cada scrape que devolve linhas já formatadas (gauges calculados na hora)"""
+        self._collectors.append(collector)
+
+    def exposition(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        for collector in self._collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                lines.append(f"# collector {getattr(collector, '__name__', collector)} falhou: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "kalu_http_requests_total", "Pedidos HTTP por rota e status", ("method", "route", "status")))
+LATENCY = registry.register(Histogram(
+    "kalu_http_request_duration_seconds", "Latência dos pedidos HTTP", ("method", "route"), LATENCY_BUCKETS))
+RESPONSE_SIZE = registry.register(Histogram(
+    "kalu_http_response_size_bytes", "Tamanho do corpo das respostas HTTP", ("method", "route"), SIZE_BUCKETS))
+IN_FLIGHT = registry.register(Gauge(
+    "kalu_http_requests_in_flight", "Pedidos HTTP em curso"))
+RENDER = registry.register(Histogram(
+    "kalu_document_render_seconds", "Duração da geração de documentos", ("format", "kind"), RENDER_BUCKETS))
+
+IN_FLIGHT.set(0)
+
+
+def gauge_lines(name: str, help_text: str, samples: Iterable[Tuple[Dict[str, Any], float]]) -> List[str]:
+    """Linhas de um gauge calculado no scrape: samples = [(labels, valor), ...]"""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {_number(value)}")
+    return lines
+
+
+def counter_lines(name: str, help_text: str, samples: Iterable[Tuple[Dict[str, Any], float]]) -> List[str]:
+    lines = gauge_lines(name, help_text, samples)
+    lines[1] = f"# TYPE {name} counter"
+    return lines
+
+
+@contextmanager
+def time_render(fmt: str, kind: str = "task"):
+    """Mede a geração de um documento (format: docx, xlsx, pdf, html; kind: task, batch)"""
+    with RENDER.time(fmt, kind):
+        yield
+
+
+def timed_render(fmt: str, kind: str = "task"):
+    """Decorador equivalente a time_render para funções geradoras"""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            with RENDER.time(fmt, kind):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+
+# ---------- middleware ----------
+
+def route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: contagem, latência, tamanho da resposta e pedidos em curso"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        state = {"status": 500, "size": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                state["size"] += len(message.get("body", b""))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            IN_FLIGHT.dec()
+            method = scope["method"]
+            route = route_label(scope)
+            REQUESTS.inc(method, route, str(state["status"]))
+            LATENCY.observe(time.perf_counter() - started, method, route)
+            RESPONSE_SIZE.observe(state["size"], method, route)
+
+
+def summary() -> Dict[str, Any]:
+    """Resumo JSON (p50/p95/p99 estimados dos histogramas) para consulta rápida"""
+    return {
+        "latency_seconds": LATENCY.summary(),
+        "response_size_bytes": RESPONSE_SIZE.summary(),
+        "render_seconds": RENDER.summary(),
+    }
@@ -0,0 +1,368 @@
+"""
+Kalu PDF Service
+================
+
+Conversão HTML -> PDF dentro do backend, sem ficheiros temporários.
+
+O backend é escolhido uma vez no arranque (PDF_BACKEND):
+    auto         - weasyprint (pool quente) se carregar, senão wkhtmltopdf, senão nenhum
+    wkhtmltopdf  - `wkhtmltopdf - -`: HTML pelo stdin, PDF pelo stdout
+    weasyprint   - pool de processos Python com o weasyprint já importado (quentes)
+    none         - PDFs desactivados (503)
+
+Cada trabalho tem timeout (PDF_TIMEOUT) e limite de memória (PDF_MEMORY_LIMIT_MB,
+via RLIMIT_AS). Um worker que exceda o timeout é morto e substituído; os
+workers são reciclados a cada PDF_MAX_JOBS_PER_WORKER trabalhos; a substituição
+arranca numa thread em segundo plano, fora do pedido. health()
+devolve estado dos workers, contadores e latências (p50/p95).
+"""
+
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import metrics
+import tracing
+
+PDF_BACKEND = os.getenv("PDF_BACKEND", "auto")  # auto, wkhtmltopdf, weasyprint, none
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", "2"))
+PDF_TIMEOUT = float(os.getenv("PDF_TIMEOUT", "60"))  # segundos por trabalho
+PDF_MEMORY_LIMIT_MB = int(os.getenv("PDF_MEMORY_LIMIT_MB", "2048"))  # 0 = sem limite
+PDF_MAX_JOBS_PER_WORKER = int(os.getenv("PDF_MAX_JOBS_PER_WORKER", "100"))
+PDF_QUEUE_TIMEOUT = float(os.getenv("PDF_QUEUE_TIMEOUT", "30"))  # espera por um worker livre
+
+# --enable-local-file-access: imagens e CSS locais (file://) como no conversor original
+WKHTMLTOPDF_ARGS = ["--quiet", "--enable-local-file-access", "--encoding", "utf-8", "-", "-"]
+
+
+class PDFRenderError(Exception):
+    """Falha na conversão (erro do renderer, timeout ou limite de memória)"""
+
+
+class PDFUnavailable(PDFRenderError):
+    """Nenhum backend de PDF disponível"""
+
+
+def _limit_memory(limit_mb: int):
+    if limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass  # plataforma sem RLIMIT_AS - corre sem limite
+
+
+def detect_backend(preferred: str = PDF_BACKEND) -> str:
+    """Escolhe o backend (uma vez, no arranque)"""
+    if preferred != "auto":
+        return preferred
+    # weasyprint primeiro: workers quentes; o wkhtmltopdf arranca um processo por PDF
+    try:
+        import weasyprint  # noqa: F401 - só para saber se carrega (precisa de pango)
+        return "weasyprint"
+    except Exception:
+        pass
+    if shutil.which("wkhtmltopdf"):
+        return "wkhtmltopdf"
+    return "none"
+
+
+# ---------- worker weasyprint (processo filho) ----------
+
+def _weasyprint_worker(conn, memory_limit_mb: int):
+    """Loop do processo filho: recebe HTML, devolve ("ok", pdf) ou ("error", mensagem)"""
+    _limit_memory(memory_limit_mb)
+    from weasyprint import HTML  # importado uma vez - o worker fica quente
+
+    conn.send(("ready", None))
+    while True:
+        try:
+            html = conn.recv()
+        except EOFError:
+            return
+        if html is None:
+            return
+        try:
+            conn.send(("ok", HTML(string=html).write_pdf()))
+        except MemoryError:
+            conn.send(("error", "limite de memória excedido"))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context, memory_limit_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_weasyprint_worker, args=(child_conn, memory_limit_mb), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.started_at = time.time()
+
+    def wait_ready(self, timeout: float):
+        if not self.conn.poll(timeout):
+            raise PDFRenderError("worker de PDF não arrancou a tempo")
+        status, message = self.conn.recv()
+        if status != "ready":
+            raise PDFRenderError(message or "worker de PDF falhou no arranque")
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(5)
+        finally:
+            self.conn.close()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+            self.process.join(5)
+        except (OSError, ValueError):
+            pass
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+# ---------- serviço ----------
+
+class PDFRenderer:
+    """Serviço de PDF com backend fixo, pool de workers e métricas"""
+
+    def __init__(
+        self,
+        backend: str = PDF_BACKEND,
+        workers: int = PDF_WORKERS,
+        timeout: float = PDF_TIMEOUT,
+        memory_limit_mb: int = PDF_MEMORY_LIMIT_MB,
+        max_jobs_per_worker: int = PDF_MAX_JOBS_PER_WORKER,
+    ):
+        self.preferred = backend
+        self.backend: Optional[str] = None
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=500)
+        self.stats = {"jobs": 0, "errors": 0, "timeouts": 0, "recycled": 0, "restarts": 0}
+
+    # ---------- ciclo de vida ----------
+
+    def start(self) -> str:
+        """Escolhe o backend e aquece os workers. Returns: nome do backend"""
+        with self._lock:
+            if self.backend is not None:
+                return self.backend
+            self.backend = detect_backend(self.preferred)
+            if self.backend == "weasyprint":
+                for _ in range(self.workers):
+                    try:
+                        self._idle.put(self._spawn())
+                    except Exception as e:
+                        print(f"⚠️ Erro ao arrancar worker de PDF: {e}")
+                        self._idle.put(_DeadWorker())  # reiniciado no próximo uso
+            print(f"📄 PDF: backend {self.backend}"
+                  + (f" ({self.workers} worker(s) quentes)" if self.backend == "weasyprint" else ""))
+            return self.backend
+
+    def stop(self):
+        with self._lock:
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+            self.backend = None
+
+    def _count(self, key: str):
+        # render() corre em várias threads do threadpool ao mesmo tempo
+        with self._lock:
+            self.stats[key] += 1
+
+    # ---------- API ----------
+
+    def render(self, html: str, timeout: Optional[float] = None, kind: str = "task") -> bytes:
+        """
+        Converte HTML em PDF (bytes); kind é só a etiqueta das métricas (task, batch)
+
+        Raises:
+            PDFUnavailable: sem backend
+            PDFRenderError: erro, timeout ou limite de memória
+        """
+        backend = self.backend or self.start()
+        timeout = timeout or self.timeout
+        started = time.perf_counter()
+        try:
+            with tracing.span(f"pdf.{backend}", cat="render", html_chars=len(html)) as span:
+                if backend == "wkhtmltopdf":
+                    pdf = self._render_wkhtmltopdf(html, timeout)
+                elif backend == "weasyprint":
+                    pdf = self._render_weasyprint(html, timeout)
+                else:
+                    raise PDFUnavailable("wkhtmltopdf ou weasyprint não instalados. Instale um deles.")
+                if span:
+                    span.set(pdf_bytes=len(pdf))
+        except PDFUnavailable:
+            raise
+        except PDFRenderError:
+            self._count("errors")
+            raise
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats["jobs"] += 1
+            self._latencies.append(elapsed)
+        metrics.RENDER.observe(elapsed, "pdf", kind)
+        return pdf
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = dict(self.stats)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+        workers = list(self._idle.queue)
+        return {
+            "backend": self.backend,
+            "healthy": self.backend in ("wkhtmltopdf", "weasyprint"),
+            "pool_size": self.workers,
+            "idle_workers": len(workers),
+            "idle_workers_alive": sum(1 for w in workers if w.alive()),
+            "timeout_s": self.timeout,
+            "memory_limit_mb": self.memory_limit_mb,
+            "max_jobs_per_worker": self.max_jobs_per_worker,
+            **stats,
+            "latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "samples": len(latencies)},
+        }
+
+    # ---------- backends ----------
+
+    def _render_wkhtmltopdf(self, html: str, timeout: float) -> bytes:
+        # O wkhtmltopdf não fica residente - o pool limita a concorrência e usa só pipes
+        if not self._slots.acquire(timeout=PDF_QUEUE_TIMEOUT):
+            raise PDFRenderError("todos os workers de PDF ocupados")
+        try:
+            result = subprocess.run(
+                ["wkhtmltopdf", *WKHTMLTOPDF_ARGS],
+                input=html.encode("utf-8"),
+                capture_output=True,
+                timeout=timeout,
+                preexec_fn=(lambda: _limit_memory(self.memory_limit_mb)) if os.name == "posix" else None,
+            )
+        except subprocess.TimeoutExpired:
+            self._count("timeouts")
+            raise PDFRenderError(f"PDF excedeu o timeout de {timeout:.0f}s")
+        finally:
+            self._slots.release()
+        if result.returncode != 0 or not result.stdout:
+            raise PDFRenderError(f"wkhtmltopdf error: {result.stderr.decode('utf-8', 'replace')[-500:]}")
+        return result.stdout
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._context, self.memory_limit_mb)
+        try:
+            worker.wait_ready(self.timeout)
+        except Exception:
+            worker.kill()
+            raise
+        return worker
+
+    def _render_weasyprint(self, html: str, timeout: float) -> bytes:
+        try:
+            worker = self._idle.get(timeout=PDF_QUEUE_TIMEOUT)
+        except queue.Empty:
+            raise PDFRenderError("todos os workers de PDF ocupados")
+
+        try:
+            if not worker.alive():
+                self._count("restarts")
+                worker.kill()
+                worker = self._spawn()
+            worker.conn.send(html)
+            if not worker.conn.poll(timeout):
+                self._count("timeouts")
+                worker.kill()
+                worker = None
+                raise PDFRenderError(f"PDF excedeu o timeout de {timeout:.0f}s")
+            status, payload = worker.conn.recv()
+            worker.jobs += 1
+        except (EOFError, OSError):
+            # Processo morreu a meio (ex: morto pelo limite de memória)
+            if worker is not None:
+                worker.kill()
+            worker = None
+            raise PDFRenderError("worker de PDF terminou inesperadamente (limite de memória?)")
+        finally:
+            self._return(worker)
+
+        if status != "ok":
+            raise PDFRenderError(payload)
+        return payload
+
+    def _return(self, worker: Optional[_Worker]):
+        """Devolve o worker à pool; reciclar ou substituir é feito em segundo plano"""
+        if self.backend is None:
+            if worker is not None:
+                worker.close()  # serviço parado entretanto
+            return
+        recycle = worker is not None and worker.jobs >= self.max_jobs_per_worker
+        if worker is not None and not recycle:
+            self._idle.put(worker)
+            return
+        self._count("recycled" if recycle else "restarts")
+        # Fechar e arrancar um processo demora - o pedido não fica à espera
+        threading.Thread(target=self._replace, args=(worker,), name="pdf-respawn", daemon=True).start()
+
+    def _replace(self, old: Optional[_Worker]):
+        """Fecha o worker antigo e põe um novo na pool (thread pdf-respawn)"""
+        if old is not None:
+            old.close()
+        try:
+            worker = self._spawn()
+        except Exception as e:
+            print(f"⚠️ Erro ao arrancar worker de PDF: {e}")
+            worker = _DeadWorker()  # reiniciado no próximo uso
+        with self._lock:
+            if self.backend is not None:
+                self._idle.put(worker)
+                return
+        worker.close()  # serviço parado entretanto
+
+
+class _DeadWorker:
+    """Lugar na pool de um worker que não arrancou - é reiniciado no próximo uso"""
+    jobs = 0
+    conn = None
+
+    def alive(self) -> bool:
+        return False
+
+    def kill(self):
+        pass
+
+    def close(self):
+        pass
+
+
+renderer = PDFRenderer()
@@ -0,0 +1,336 @@
+"""
+Kalu Profiling
+==============
+
+Profiler por amostragem (sys._current_frames numa thread própria), sem
+dependências, com saída no formato speedscope (https://www.speedscope.app)
+ou em stacks colapsadas (flamegraph.pl).
+
+Dois modos:
+
+    On-demand   - um admin (PROFILE_ADMINS) envia o header X-Kalu-Profile: 1
+                  (ou ?__profile=1) e esse pedido corre sob o profiler a
+                  PROFILE_INTERVAL_MS. A resposta traz X-Profile-Id; o ficheiro
+                  fica em GET /debug/profiles/{id}. Guarda os últimos PROFILE_KEEP.
+    Contínuo    - com CONTINUOUS_PROFILING=true, amostragem de baixa frequência
+                  (CONTINUOUS_INTERVAL_MS) de todo o processo, um ficheiro por
+                  janela de CONTINUOUS_WINDOW_S segundos, num anel em disco de
+                  CONTINUOUS_RING_SIZE ficheiros.
+
+São amostradas todas as threads (o pedido pode correr no event loop e no
+threadpool); threads paradas à espera (locks, filas, select) são ignoradas.
+Stacks iguais são agregadas, por isso a memória não cresce com a duração.
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from jose import JWTError, jwt
+from starlette.datastructures import MutableHeaders
+
+import auth
+
+PROFILE_ADMINS = {name.strip() for name in os.getenv("PROFILE_ADMINS", "Oscar").split(",") if name.strip()}
+PROFILE_HEADER = "x-kalu-profile"
+PROFILE_QUERY_FLAG = b"__profile=1"
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "kalu_profiles"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))  # pára de amostrar pedidos muito longos
+
+CONTINUOUS_PROFILING = os.getenv("CONTINUOUS_PROFILING", "false").lower() == "true"
+CONTINUOUS_INTERVAL_MS = float(os.getenv("CONTINUOUS_INTERVAL_MS", "50"))
+CONTINUOUS_WINDOW_S = float(os.getenv("CONTINUOUS_WINDOW_S", "60"))
+CONTINUOUS_RING_SIZE = int(os.getenv("CONTINUOUS_RING_SIZE", "60"))
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+PROFILE_SUFFIX = ".speedscope.json"
+
+# Folhas (ficheiro, função) de threads paradas à espera - não contam
+IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+
+# ---------- amostragem ----------
+
+class Sampler:
+    """Amostra as stacks de todas as threads a cada interval_ms (agregadas por stack)"""
+
+    def __init__(self, interval_ms: float, name: str = "kalu-profiler"):
+        self.interval = max(interval_ms, 0.1) / 1000
+        self.name = name
+        self.frames: Dict[Tuple[str, str, int], int] = {}
+        self.stacks: Dict[int, Counter] = {}  # thread id -> Counter(stack de índices)
+        self.thread_names: Dict[int, str] = {}
+        self.samples = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _frame_index(self, code) -> int:
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self.frames.get(key)
+        if index is None:
+            index = self.frames[key] = len(self.frames)
+        return index
+
+    def sample(self):
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_LEAVES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks.setdefault(thread_id, Counter())[tuple(stack)] += 1
+        self.samples += 1
+
+    def _run(self, deadline: float):
+        next_at = time.perf_counter()
+        while not self._stop.is_set() and time.perf_counter() < deadline:
+            self.sample()
+            next_at += self.interval
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_at = time.perf_counter()  # atrasado (GIL) - não acumular
+
+    def start(self, max_seconds: float = PROFILE_MAX_SECONDS) -> "Sampler":
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._t0 + max_seconds,), name=self.name, daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> "Sampler":
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.duration = time.perf_counter() - self._t0
+        self.thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        return self
+
+    def to_speedscope(self, name: str) -> Dict[str, Any]:
+        frames = [None] * len(self.frames)
+        for (func, filename, line), index in self.frames.items():
+            frames[index] = {"name": func, "file": filename, "line": line}
+        weight = self.interval * 1000
+        profiles = []
+        for thread_id, stacks in sorted(self.stacks.items(), key=lambda item: -sum(item[1].values())):
+            samples = [list(stack) for stack in stacks]
+            weights = [round(count * weight, 3) for count in stacks.values()]
+            profiles.append({
+                "type": "sampled",
+                "name": self.thread_names.get(thread_id, f"thread {thread_id}"),
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 3),
+                "samples": samples,
+                "weights": weights,
+            })
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "kalu-profiler",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+
+def collapsed_stacks(profile: Dict[str, Any]) -> str:
+    """speedscope -> stacks colapsadas ("a;b;c peso"), para flamegraph.pl / inferno"""
+    frames = profile["shared"]["frames"]
+    lines = []
+    for thread in profile["profiles"]:
+        for stack, weight in zip(thread["samples"], thread["weights"]):
+            names = [thread["name"]] + [f"{frames[i]['name']} ({os.path.basename(frames[i]['file'])})" for i in stack]
+            lines.append(f"{';'.join(name.replace(';', ',') for name in names)} {max(1, round(weight))}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- ficheiros ----------
+
+def _directory(kind: str) -> str:
+    path = os.path.join(PROFILE_DIR, kind)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _write(kind: str, profile_id: str, profile: Dict[str, Any], keep: int) -> str:
+    directory = _directory(kind)
+    path = os.path.join(directory, profile_id + PROFILE_SUFFIX)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f, separators=(",", ":"))
+    os.replace(tmp, path)
+    # Anel: apagar os mais antigos acima de keep
+    existing = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith(PROFILE_SUFFIX)),
+        key=lambda entry: entry.stat().st_mtime,
+    )
+    for entry in existing[:-keep] if keep > 0 else []:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+    return path
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    profiles = []
+    for kind in ("requests", "continuous"):
+        directory = os.path.join(PROFILE_DIR, kind)
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if entry.name.endswith(PROFILE_SUFFIX):
+                stat = entry.stat()
+                profiles.append({
+                    "id": entry.name[:-len(PROFILE_SUFFIX)],
+                    "kind": kind,
+                    "size": stat.st_size,
+                    "created_at": datetime.utcfromtimestamp(stat.st_mtime).isoformat(),
+                })
+    return sorted(profiles, key=lambda p: p["created_at"], reverse=True)
+
+
+def profile_path(profile_id: str) -> Optional[str]:
+    """Caminho de um perfil pelo id (ids só com [A-Za-z0-9_-] - sem path traversal)"""
+    if not profile_id or not all(ch.isalnum() or ch in "-_" for ch in profile_id):
+        return None
+    for kind in ("requests", "continuous"):
+        path = os.path.join(PROFILE_DIR, kind, profile_id + PROFILE_SUFFIX)
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+# ---------- on-demand ----------
+
+def is_admin_token(authorization: str) -> bool:
+    """Bearer token válido de um utilizador em PROFILE_ADMINS (sem ir à BD)"""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return False
+    try:
+        payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+    except JWTError:
+        return False
+    return payload.get("sub") in PROFILE_ADMINS
+
+
+def _wants_profile(scope) -> bool:
+    headers = dict(scope.get("headers") or [])
+    flagged = headers.get(PROFILE_HEADER.encode()) in (b"1", b"true") \
+        or PROFILE_QUERY_FLAG in (scope.get("query_string") or b"").split(b"&")
+    return flagged and is_admin_token(headers.get(b"authorization", b"").decode("latin-1"))
+
+
+class ProfilingMiddleware:
+    """Middleware ASGI: corre sob o profiler os pedidos marcados por um admin"""
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = threading.Lock()  # um perfil on-demand de cada vez
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        if not self._busy.acquire(blocking=False):
+            await self.app(scope, receive, self._with_headers(send, {"X-Profile": "busy"}))
+            return
+
+        profile_id = f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        headers = {"X-Profile-Id": profile_id, "X-Profile-Url": f"/debug/profiles/{profile_id}"}
+        sampler = Sampler(PROFILE_INTERVAL_MS).start()
+        try:
+            await self.app(scope, receive, self._with_headers(send, headers))
+        finally:
+            sampler.stop()
+            self._busy.release()
+            name = f"{scope['method']} {scope['path']}"
+            try:
+                _write("requests", profile_id, sampler.to_speedscope(name), PROFILE_KEEP)
+                print(f"🔬 Perfil {profile_id}: {name} ({sampler.duration * 1000:.0f} ms, {sampler.samples} amostras)")
+            except OSError as e:
+                print(f"⚠️ Erro ao guardar perfil {profile_id}: {e}")
+
+    @staticmethod
+    def _with_headers(send, extra: Dict[str, str]):
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                for key, value in extra.items():
+                    headers[key] = value
+            await send(message)
+        return send_wrapper
+
+
+# ---------- contínuo ----------
+
+class ContinuousProfiler:
+    """Amostragem de baixa frequência de todo o processo, em janelas num anel em disco"""
+
+    def __init__(self):
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sampler: Optional[Sampler] = None
+        self.windows = 0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="kalu-profiler-continuous", daemon=True)
+        self._thread.start()
+        print(f"🔬 Profiling contínuo: {CONTINUOUS_INTERVAL_MS:.0f} ms, janelas de {CONTINUOUS_WINDOW_S:.0f}s, "
+              f"anel de {CONTINUOUS_RING_SIZE} ficheiro(s) em {_directory('continuous')}")
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            profile_id = f"continuous-{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}"
+            self._sampler = Sampler(CONTINUOUS_INTERVAL_MS, name="kalu-profiler-window").start(CONTINUOUS_WINDOW_S)
+            self._stop.wait(CONTINUOUS_WINDOW_S)
+            sampler = self._sampler.stop()
+            if sampler.samples:
+                try:
+                    _write("continuous", profile_id, sampler.to_speedscope(profile_id), CONTINUOUS_RING_SIZE)
+                    self.windows += 1
+                except OSError as e:
+                    print(f"⚠️ Erro ao guardar perfil contínuo: {e}")
+
+
+continuous = ContinuousProfiler()
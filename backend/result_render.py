@@ -0,0 +1,280 @@
+"""
+Kalu Result Render
+==================
+
+Renderização antecipada (render-at-write) dos resultados das tarefas.
+
+Com EAGER_RENDER=true, POST /tasks/{id}/result valida e canonicaliza o JSON
+uma única vez (resultado_json) e agenda numa thread em segundo plano a
+geração da vista HTML completa (resultado_html). O estado fica em
+render_status:
+
+    pending  - resultado guardado, HTML ainda por gerar
+    done     - resultado_json / resultado_html prontos
+    failed   - erro na renderização (render_error); leituras usam o caminho antigo
+
+Leituras (/tasks/{id}/view e downloads) usam os campos pré-calculados quando
+existem e só caem para o parsing/geração por pedido em tarefas antigas.
+
+O HTML inclui o título: mudar o titulo (PATCH /tasks/{id} ou /tasks/bulk)
+volta a pôr a tarefa em pending e agenda novo render (invalidate).
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+import database
+import metrics
+import tracing
+import versions
+
+EAGER_RENDER = os.getenv("EAGER_RENDER", "false").lower() == "true"
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", "2"))
+RENDER_PARSED_CACHE_SIZE = int(os.getenv("RENDER_PARSED_CACHE_SIZE", "128"))
+RENDER_PARSED_CACHE_BYTES = int(os.getenv("RENDER_PARSED_CACHE_BYTES", str(8 * 1024 * 1024)))
+
+RENDER_PENDING = "pending"
+RENDER_DONE = "done"
+RENDER_FAILED = "failed"
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def canonicalize(resultado: str, resultado_tipo: str) -> Optional[str]:
+    """
+    JSON canónico (compacto, UTF-8) de um resultado do tipo json
+
+    Raises:
+        HTTPException: 422 se o resultado_tipo é json mas o conteúdo não é JSON válido
+
+    Returns:
+        str com o JSON canónico, ou None se o resultado não é JSON
+    """
+    if resultado_tipo != "json":
+        return None
+    try:
+        data = json.loads(resultado)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=422, detail=f"resultado não é JSON válido: {e}")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+
+class ParsedCache:
+    """
+    LRU de JSON canónico -> objecto, limitado por nº de entradas e por bytes
+
+    O custo de cada entrada conta-se pelo tamanho do texto canónico (a chave),
+    por isso meia dúzia de resultados enormes não ficam todos em memória.
+    """
+
+    def __init__(self, max_entries: int = RENDER_PARSED_CACHE_SIZE, max_bytes: int = RENDER_PARSED_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, canonical: str) -> Any:
+        with self._lock:
+            if canonical in self._entries:
+                self._entries.move_to_end(canonical)
+                self.hits += 1
+                return self._entries[canonical]
+            self.misses += 1
+        data = json.loads(canonical)
+        if len(canonical) > self.max_bytes:
+            return data
+        with self._lock:
+            if canonical not in self._entries:
+                self._entries[canonical] = data
+                self._bytes += len(canonical)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest, _ = self._entries.popitem(last=False)
+                self._bytes -= len(oldest)
+        return data
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "bytes": self._bytes}
+
+
+_parsed_cache = ParsedCache()
+
+
+def _parse_canonical(canonical: str) -> Any:
+    return _parsed_cache.parse(canonical)
+
+
+def parsed_cache_stats() -> Dict[str, int]:
+    return _parsed_cache.stats()
+
+
+@tracing.traced("result.parse", cat="app")
+def report_data(task: "database.Task") -> Dict[str, Any]:
+    """Dados do relatório: JSON canónico (parse em cache) ou o sniffing antigo"""
+    if task.resultado_json:
+        data = _parse_canonical(task.resultado_json)
+        if isinstance(data, dict):
+            return data
+        return {"content": task.resultado}
+    try:
+        if task.resultado.strip().startswith('{'):
+            return json.loads(task.resultado)
+    except ValueError:
+        pass
+    return {"content": task.resultado}
+
+
+def build_html(task: "database.Task", data: Any = None) -> str:
+    """Vista HTML completa de um resultado (o mesmo HTML usado para o PDF)"""
+    if task.resultado_tipo == "html" and task.resultado.strip().startswith('<'):
+        return task.resultado
+    from kalu_document_generator import generate_html_report, generate_markdown_report
+
+    with metrics.time_render("html"):
+        if data is None:
+            data = report_data(task)
+        return generate_html_report(generate_markdown_report(data, task.titulo))
+
+
+def report_html(task: "database.Task") -> str:
+    """HTML pré-renderizado se pronto, senão gerado agora"""
+    if task.render_status == RENDER_DONE and task.resultado_html:
+        return task.resultado_html
+    return build_html(task)
+
+
+def prepare(task: "database.Task") -> bool:
+    """
+    Chamado na escrita do resultado: canonicaliza o JSON e marca a tarefa para render
+
+    Returns:
+        bool: True se a tarefa ficou pendente de renderização
+    """
+    task.resultado_html = None
+    task.render_error = None
+    task.rendered_at = None
+    if not EAGER_RENDER:
+        task.resultado_json = None
+        task.render_status = None
+        return False
+    task.resultado_json = canonicalize(task.resultado, task.resultado_tipo)
+    task.render_status = RENDER_PENDING
+    return True
+
+
+def invalidate(task: "database.Task") -> bool:
+    """
+    Chamado quando muda o titulo (que vai no HTML): volta a pôr o render em pending
+
+    Returns:
+        bool: True se a tarefa tem de ser renderizada de novo (submit depois do commit)
+    """
+    if task.render_status is None:
+        return False
+    task.resultado_html = None
+    task.render_error = None
+    task.rendered_at = None
+    task.render_status = RENDER_PENDING
+    return True
+
+
+def invalidate_many(db: Session, task_ids: Iterable[int]) -> List[int]:
+    """invalidate() para um lote (sem commit). Returns: IDs a submeter depois do commit"""
+    ids = [row.id for row in db.query(database.Task.id).filter(
+        database.Task.id.in_(set(task_ids)), database.Task.render_status.isnot(None)
+    )] if task_ids else []
+    if ids:
+        db.query(database.Task).filter(database.Task.id.in_(ids)).update({
+            database.Task.resultado_html: None,
+            database.Task.render_error: None,
+            database.Task.rendered_at: None,
+            database.Task.render_status: RENDER_PENDING,
+        }, synchronize_session=False)
+    return ids
+
+
+def render_task(task_id: int, expected: Optional[str] = None) -> str:
+    """
+    Gera e grava o HTML de uma tarefa pendente (corre na thread de render)
+
+    Args:
+        task_id: Tarefa a renderizar
+        expected: Resultado que originou o pedido; se entretanto mudou, não grava
+
+    Returns:
+        str: estado final (done, failed ou skipped)
+    """
+    db = database.SessionLocal()
+    try:
+        task = db.get(database.Task, task_id)
+        if task is None or task.render_status != RENDER_PENDING:
+            return "skipped"
+        if expected is not None and task.resultado != expected:
+            return "skipped"  # houve outro POST de resultado - o seu próprio render trata dele
+        resultado, titulo, empresa = task.resultado, task.titulo, task.empresa
+        values = {database.Task.render_error: None}
+        try:
+            data = _parse_canonical(task.resultado_json) if task.resultado_json else None
+            values[database.Task.resultado_html] = build_html(task, data)
+            values[database.Task.render_status] = status = RENDER_DONE
+        except Exception as e:
+            values[database.Task.render_status] = status = RENDER_FAILED
+            values[database.Task.render_error] = str(e)[:500]
+            print(f"⚠️ Erro ao renderizar resultado da tarefa #{task_id}: {e}")
+        values[database.Task.rendered_at] = datetime.utcnow()
+        # Só grava se nada mudou durante o render (novo resultado ou titulo: o render desse trata)
+        written = db.query(database.Task).filter(
+            database.Task.id == task_id,
+            database.Task.render_status == RENDER_PENDING,
+            database.Task.resultado == resultado,
+            database.Task.titulo == titulo,
+        ).update(values, synchronize_session=False)
+        db.commit()
+        if not written:
+            return "skipped"
+        versions.mark_changed("tasks", [empresa])
+        return status
+    finally:
+        db.close()
+
+
+def submit(task_id: int, expected: Optional[str] = None):
+    """Agenda a renderização de uma tarefa na pool de render"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="result-render")
+    return _executor.submit(render_task, task_id, expected)
+
+
+def resume_pending() -> int:
+    """No arranque: volta a agendar tarefas que ficaram pendentes (ex: após um crash)"""
+    if not EAGER_RENDER:
+        return 0
+    db = database.SessionLocal()
+    try:
+        ids = [row.id for row in db.query(database.Task.id).filter(
+            database.Task.render_status == RENDER_PENDING
+        )]
+    finally:
+        db.close()
+    for task_id in ids:
+        submit(task_id)
+    return len(ids)
+
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional
+from typing import Optional, List
 
 # Task Schemas
 class TaskBase(BaseModel):
@@ -39,6 +39,7 @@ class Task(TaskBase):
     resultado_tipo: Optional[str] = None
     resultado_url: Optional[str] = None
     completado_em: Optional[datetime] = None
+    render_status: Optional[str] = None
     
     class Config:
         from_attributes = True
@@ -146,3 +147,9 @@ class CalendarEvent(CalendarEventBase):
     
     class Config:
         from_attributes = True
+
+# Task com entidades relacionadas (GET /tasks/{id}/full)
+class TaskFull(Task):
+    documents: List[Document] = []
+    calendar_events: List[CalendarEvent] = []
+    activities: List[Activity] = []
@@ -0,0 +1,234 @@
+"""
+Kalu SQL Profile
+================
+
+Instrumentação das queries SQL (eventos do engine SQLAlchemy).
+
+Cada statement é atribuído ao pedido HTTP em curso (contextvar definido pelo
+middleware, que passa para as threads do threadpool). No fim do pedido:
+
+    X-DB-Queries / X-DB-Time-Ms      nº de queries e tempo total na BD
+    Server-Timing: db;dur=...        o mesmo, visível nas devtools do browser
+    X-DB-Repeated                    nº de SELECTs repetidos >= SQL_N_PLUS_ONE_THRESHOLD
+                                     vezes no pedido (provável N+1, também vai para o log)
+
+Queries acima de SQL_SLOW_QUERY_MS vão para o log com o plano (EXPLAIN) e
+ficam nas últimas SQL_SLOW_QUERY_LOG_SIZE em GET /debug/slow-queries.
+
+query_budget() conta as queries de um bloco (ex: num script de verificação)
+e falha se passarem do orçamento - ver benchmarks/check_query_budgets.py.
+"""
+
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+import metrics
+
+SQL_PROFILE_ENABLED = os.getenv("SQL_PROFILE_ENABLED", "true").lower() == "true"
+SQL_SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+SQL_SLOW_QUERY_EXPLAIN = os.getenv("SQL_SLOW_QUERY_EXPLAIN", "true").lower() == "true"
+SQL_SLOW_QUERY_LOG_SIZE = int(os.getenv("SQL_SLOW_QUERY_LOG_SIZE", "100"))
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+
+QUERY_SECONDS = metrics.registry.register(metrics.Histogram(
+    "kalu_db_query_duration_seconds", "Duração de cada statement SQL", (),
+    (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)))
+REQUEST_QUERIES = metrics.registry.register(metrics.Histogram(
+    "kalu_db_queries_per_request", "Queries SQL por pedido HTTP", ("method", "route"),
+    (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)))
+REQUEST_DB_SECONDS = metrics.registry.register(metrics.Histogram(
+    "kalu_db_time_per_request_seconds", "Tempo total na BD por pedido HTTP", ("method", "route"),
+    (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)))
+SLOW_QUERIES = metrics.registry.register(metrics.Counter(
+    "kalu_db_slow_queries_total", "Queries acima de SQL_SLOW_QUERY_MS"))
+REPEATED = metrics.registry.register(metrics.Counter(
+    "kalu_db_repeated_statements_total", "Statements repetidos num pedido (provável N+1)", ("method", "route")))
+
+slow_queries: "deque[Dict[str, Any]]" = deque(maxlen=SQL_SLOW_QUERY_LOG_SIZE)
+
+
+class QueryLog:
+    """Queries de um pedido (ou de um bloco query_budget)"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, elapsed: float):
+        with self._lock:
+            self.count += 1
+            self.seconds += elapsed
+            self.statements[statement] += 1
+
+    def repeated(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        """
+        SELECTs idênticos (mesmo SQL, parâmetros diferentes) executados >= threshold vezes
+        (escritas repetidas são lotes, não N+1)
+        """
+        with self._lock:
+            return [
+                (sql, n) for sql, n in self.statements.most_common()
+                if n >= threshold and sql.lstrip()[:6].upper() == "SELECT"
+            ]
+
+
+_current: ContextVar[Optional[QueryLog]] = ContextVar("kalu_sql_request", default=None)
+_captures: List[QueryLog] = []
+_captures_lock = threading.Lock()
+
+
+def current() -> Optional[QueryLog]:
+    return _current.get()
+
+
+# ---------- eventos do engine ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if conn.info.get("kalu_explaining"):
+        return
+    conn.info.setdefault("kalu_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if conn.info.get("kalu_explaining"):
+        return
+    starts = conn.info.get("kalu_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    QUERY_SECONDS.observe(elapsed)
+
+    log = _current.get()
+    if log is not None:
+        log.record(statement, elapsed)
+    if _captures:
+        with _captures_lock:
+            for capture in _captures:
+                capture.record(statement, elapsed)
+
+    if elapsed * 1000 >= SQL_SLOW_QUERY_MS:
+        _log_slow_query(conn, statement, parameters, elapsed, executemany, log)
+
+
+def _explain(conn, statement: str, parameters) -> Optional[str]:
+    """Plano da query (só SELECT; EXPLAIN QUERY PLAN no SQLite)"""
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    conn.info["kalu_explaining"] = True
+    try:
+        rows = conn.exec_driver_sql(prefix + statement, parameters).fetchall()
+        return "\n".join(" | ".join(str(value) for value in row) for row in rows)
+    except Exception as e:
+        return f"EXPLAIN falhou: {e}"
+    finally:
+        conn.info["kalu_explaining"] = False
+
+
+def _log_slow_query(conn, statement, parameters, elapsed, executemany, log: Optional[QueryLog]):
+    SLOW_QUERIES.inc()
+    plan = _explain(conn, statement, parameters) if SQL_SLOW_QUERY_EXPLAIN and not executemany else None
+    entry = {
+        "at": datetime.utcnow().isoformat(),
+        "ms": round(elapsed * 1000, 1),
+        "request": log.label if log else None,
+        "statement": statement,
+        "plan": plan,
+    }
+    slow_queries.append(entry)
+    print(f"🐢 Query lenta ({entry['ms']} ms){' em ' + log.label if log and log.label else ''}: "
+          f"{' '.join(statement.split())[:300]}" + (f"\n   plano: {plan}" if plan else ""))
+
+
+def install(engine):
+    """Liga a instrumentação a um engine (uma vez, no arranque)"""
+    if not SQL_PROFILE_ENABLED or event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------- middleware ----------
+
+class QueryProfileMiddleware:
+    """Middleware ASGI: atribui as queries ao pedido e escreve os headers X-DB-*"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_PROFILE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        log = QueryLog()
+        token = _current.set(log)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                log.label = f"{scope['method']} {metrics.route_label(scope)}"
+                headers = MutableHeaders(scope=message)
+                db_ms = log.seconds * 1000
+                headers["X-DB-Queries"] = str(log.count)
+                headers["X-DB-Time-Ms"] = f"{db_ms:.1f}"
+                headers.append("Server-Timing", f'db;dur={db_ms:.1f};desc="{log.count} queries"')
+                repeated = log.repeated()
+                if repeated:
+                    headers["X-DB-Repeated"] = str(len(repeated))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            method, route = scope["method"], metrics.route_label(scope)
+            REQUEST_QUERIES.observe(log.count, method, route)
+            REQUEST_DB_SECONDS.observe(log.seconds, method, route)
+            for statement, count in log.repeated():
+                REPEATED.inc(method, route)
+                print(f"⚠️ Possível N+1 em {method} {route}: {count}x {' '.join(statement.split())[:200]}")
+
+
+# ---------- orçamentos de queries ----------
+
+class QueryBudgetExceeded(AssertionError):
+    """Mais queries do que o orçamento definido"""
+
+
+@contextmanager
+def query_budget(max_queries: int, label: str = "") -> Iterator[QueryLog]:
+    """
+    Conta todas as queries executadas dentro do bloco (em qualquer thread)
+
+    Raises:
+        QueryBudgetExceeded: se o bloco executar mais de max_queries queries
+
+    Exemplo:
+        with query_budget(3, "GET /tasks/"):
+            client.get("/tasks/")
+    """
+    log = QueryLog(label)
+    with _captures_lock:
+        _captures.append(log)
+    try:
+        yield log
+    finally:
+        with _captures_lock:
+            _captures.remove(log)
+    if log.count > max_queries:
+        statements = "\n".join(f"  {n}x {' '.join(sql.split())[:160]}" for sql, n in log.statements.most_common())
+        raise QueryBudgetExceeded(
+            f"{label or 'bloco'}: {log.count} queries (orçamento {max_queries})\n{statements}"
+        )
@@ -0,0 +1,429 @@
+"""
+Kalu Tracing
+============
+
+Tracing leve por pedido, só com a biblioteca standard: cada pedido HTTP é um
+trace com spans para o handler, cada statement SQL, cada passo dos geradores
+(markdown, HTML, DOCX, XLSX, PDF) e as chamadas do cliente KaluDashboard.
+
+    TRACING_ENABLED=true         liga (desligado custa um ContextVar.get por span)
+    TRACE_SAMPLE_RATE            fracção de pedidos sem traceparent que são traçados
+    TRACE_FILE                   ficheiro JSON-lines (roda para .1 acima de TRACE_FILE_MAX_MB)
+
+Os ids propagam-se no header W3C traceparent (00-<trace>-<span>-01): o
+cliente (KALU_TRACING=true em kalu_integration.py, que grava os seus spans em
+KALU_TRACE_FILE) envia-o, a API continua o mesmo trace e devolve X-Trace-Id.
+
+Cada linha do ficheiro é um evento do formato Trace Event (ph "X", ts/dur em
+µs, trace_id/span_id/parent_id em args). Para abrir em https://ui.perfetto.dev
+ou chrome://tracing:
+
+    python tracing.py /tmp/kalu_traces.jsonl --trace <trace_id> > trace.json
+
+ou GET /debug/traces/{trace_id}. Vários ficheiros (API + cliente) são juntos
+num só trace, cada processo na sua linha.
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(tempfile.gettempdir(), "kalu_traces.jsonl"))
+TRACE_FILE_MAX_MB = float(os.getenv("TRACE_FILE_MAX_MB", "100"))
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "5000"))  # por trace; o resto só é contado
+TRACE_SQL_MAX_CHARS = int(os.getenv("TRACE_SQL_MAX_CHARS", "1000"))
+TRACE_RECENT_SIZE = int(os.getenv("TRACE_RECENT_SIZE", "200"))
+
+TRACEPARENT_HEADER = "traceparent"
+TRACE_ID_HEADER = "x-trace-id"
+_TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+# Últimos traces terminados neste processo (GET /debug/traces)
+recent: "deque[Dict[str, Any]]" = deque(maxlen=TRACE_RECENT_SIZE)
+
+
+def _process_name() -> str:
+    """Nome do processo no visualizador: uvicorn, kalu_integration.py, ..."""
+    script = sys.argv[0] if sys.argv and sys.argv[0] not in ("", "-", "-c") else "python"
+    if os.path.basename(script) == "__main__.py":  # python -m pacote
+        return os.path.basename(os.path.dirname(script))
+    return os.path.basename(script)
+
+
+TRACE_PROCESS_NAME = os.getenv("TRACE_PROCESS_NAME") or _process_name()
+
+
+def _new_id(chars: int) -> str:
+    return uuid.uuid4().hex[:chars]
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """(trace_id, parent_span_id, sampled) de um header traceparent, ou None se inválido"""
+    match = _TRACEPARENT_RE.match((value or "").strip().lower())
+    if not match or match.group(1) == "0" * 32 or match.group(2) == "0" * 16:
+        return None
+    return match.group(1), match.group(2), bool(int(match.group(3), 16) & 1)
+
+
+# ---------- spans ----------
+
+class _Trace:
+    """Spans terminados de um trace, escritos de uma vez quando o span raiz acaba"""
+
+    __slots__ = ("trace_id", "events", "dropped", "closed", "lock")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.events: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "cat", "trace", "span_id", "parent_id", "attrs", "_ts", "_started", "_tid")
+
+    def __init__(self, name: str, cat: str, trace: _Trace, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.name = name
+        self.cat = cat
+        self.trace = trace
+        self.span_id = _new_id(16)
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self._ts = time.time_ns() // 1000
+        self._started = time.perf_counter()
+        self._tid = threading.get_native_id()
+        if self._tid not in _thread_names:
+            _thread_names[self._tid] = threading.current_thread().name
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    def traceparent(self) -> str:
+        """Header para propagar o trace num pedido feito dentro deste span"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def _event(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "cat": self.cat,
+            "ph": "X",
+            "ts": self._ts,
+            "dur": round((time.perf_counter() - self._started) * 1_000_000),
+            "pid": os.getpid(),
+            "tid": self._tid,
+            "args": {"trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id, **self.attrs},
+        }
+
+    def finish(self):
+        event = self._event()
+        trace = self.trace
+        with trace.lock:
+            if trace.closed:
+                # Span que acabou depois do pedido (ex: thread em segundo plano) - vai sozinho
+                exporter.write([event])
+            elif len(trace.events) < TRACE_MAX_SPANS:
+                trace.events.append(event)
+            else:
+                trace.dropped += 1
+
+    def _finish_root(self):
+        trace = self.trace
+        if trace.dropped:
+            self.attrs["dropped_spans"] = trace.dropped
+        event = self._event()
+        with trace.lock:
+            trace.closed = True
+            events, trace.events = trace.events + [event], []
+        exporter.write(events)
+        recent.append({
+            "trace_id": trace.trace_id,
+            "name": self.name,
+            "at": datetime.utcfromtimestamp(event["ts"] / 1_000_000).isoformat(),
+            "ms": round(event["dur"] / 1000, 1),
+            "spans": len(events),
+            **{key: value for key, value in self.attrs.items() if key in ("status", "error")},
+        })
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("kalu_trace_span", default=None)
+_thread_names: Dict[int, str] = {}
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def _activate(span: Span, root: bool = False) -> Iterator[Span]:
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.attrs["error"] = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        _current.reset(token)
+        if root:
+            span._finish_root()
+        else:
+            span.finish()
+
+
+@contextmanager
+def span(name: str, cat: str = "app", **attrs) -> Iterator[Optional[Span]]:
+    """
+    Span filho do span actual; sem trace activo não faz nada (devolve None)
+
+    Exemplo:
+        with tracing.span("docx.save", cat="render") as s:
+            doc.save(output)
+    """
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    with _activate(Span(name, cat, parent.trace, parent.span_id, attrs)) as child:
+        yield child
+
+
+@contextmanager
+def trace(name: str, cat: str = "app", traceparent: Optional[str] = None, **attrs) -> Iterator[Optional[Span]]:
+    """
+    Span raiz (ou filho, se já houver um trace activo)
+
+    Continua o trace de traceparent se vier um; senão começa um novo, com
+    probabilidade TRACE_SAMPLE_RATE. Devolve None se o tracing está desligado
+    ou o trace não foi amostrado.
+    """
+    parent = _current.get()
+    if parent is not None:
+        with span(name, cat, **attrs) as child:
+            yield child
+        return
+    if not TRACING_ENABLED:
+        yield None
+        return
+
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+    else:
+        trace_id, parent_id, sampled = _new_id(32), None, random.random() < TRACE_SAMPLE_RATE
+    if not sampled:
+        yield None
+        return
+    with _activate(Span(name, cat, _Trace(trace_id), parent_id, attrs), root=True) as root:
+        yield root
+
+
+def traced(name: str, cat: str = "render"):
+    """Decorador: span à volta da função (só com trace activo)"""
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return func(*args, **kwargs)
+            with span(name, cat):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        wrapper.__wrapped__ = func
+        return wrapper
+    return decorator
+
+
+# ---------- exportação ----------
+
+class _Exporter:
+    """Acrescenta eventos ao TRACE_FILE (uma escrita por trace), com metadados de processo/thread"""
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._named_tids: set = set()
+        self._named_process = False
+
+    def _metadata(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        pid = os.getpid()
+        metadata = []
+        if not self._named_process:
+            metadata.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": TRACE_PROCESS_NAME}})
+            self._named_process = True
+        for event in events:
+            tid = event["tid"]
+            if tid not in self._named_tids:
+                metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                                 "args": {"name": _thread_names.get(tid, str(tid))}})
+                self._named_tids.add(tid)
+        return metadata
+
+    def write(self, events: List[Dict[str, Any]]):
+        if not events:
+            return
+        with self._lock:
+            try:
+                if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    os.replace(self.path, self.path + ".1")
+                    self._named_tids.clear()
+                    self._named_process = False
+                lines = "".join(
+                    json.dumps(event, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+                    for event in self._metadata(events) + events
+                )
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+            except OSError as e:
+                print(f"⚠️ Tracing: não foi possível escrever em {self.path}: {e}")
+
+
+exporter = _Exporter(TRACE_FILE, int(TRACE_FILE_MAX_MB * 1024 * 1024))
+
+
+def read_events(paths: Iterable[str], trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Eventos dos ficheiros (e das suas rotações .1), filtrados por trace; metadados incluídos"""
+    events = []
+    for path in paths:
+        for candidate in (path + ".1", path):
+            if not os.path.exists(candidate):
+                continue
+            with open(candidate, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue  # linha cortada (escrita em curso ou disco cheio)
+                    if event.get("ph") == "M" or trace_id is None or event["args"].get("trace_id") == trace_id:
+                        events.append(event)
+    return events
+
+
+def to_chrome(events: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Documento Trace Event (Perfetto, chrome://tracing, speedscope); só metadados dos processos presentes"""
+    spans = [event for event in events if event.get("ph") != "M"]
+    pids = {event["pid"] for event in spans}
+    seen = set()
+    metadata = []
+    for event in events:
+        key = (event["name"], event["pid"], event.get("tid"))
+        if event.get("ph") == "M" and event["pid"] in pids and key not in seen:
+            metadata.append(event)
+            seen.add(key)
+    return {"traceEvents": metadata + sorted(spans, key=lambda event: event["ts"]), "displayTimeUnit": "ms"}
+
+
+# ---------- SQL (eventos do engine) ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None or conn.info.get("kalu_explaining"):
+        return
+    attrs = {"statement": statement[:TRACE_SQL_MAX_CHARS]}
+    if executemany:
+        attrs["executemany"] = len(parameters)
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+    conn.info.setdefault("kalu_trace_sql", []).append(Span(f"SQL {verb}", "sql", parent.trace, parent.span_id, attrs))
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    spans = conn.info.get("kalu_trace_sql")
+    if not spans or conn.info.get("kalu_explaining"):
+        return
+    sql_span = spans.pop()
+    if cursor.rowcount >= 0:
+        sql_span.attrs["rows"] = cursor.rowcount
+    sql_span.finish()
+
+
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    spans = connection.info.get("kalu_trace_sql") if connection is not None else None
+    if spans:
+        sql_span = spans.pop()
+        sql_span.attrs["error"] = str(exception_context.original_exception)[:300]
+        sql_span.finish()
+
+
+def install(engine):
+    """Liga os spans SQL a um engine (uma vez, no arranque)"""
+    from sqlalchemy import event
+
+    if not TRACING_ENABLED or event.contains(engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# ---------- middleware ----------
+
+class TracingMiddleware:
+    """Middleware ASGI: span raiz por pedido, continua o traceparent recebido e devolve X-Trace-Id"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not TRACING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == TRACEPARENT_HEADER.encode():
+                traceparent = value.decode("latin-1")
+                break
+
+        method = scope["method"]
+        with trace(f"{method} {scope['path']}", "http", traceparent,
+                   **{"http.method": method, "http.target": scope["path"]}) as root:
+            if root is None:
+                await self.app(scope, receive, send)
+                return
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    # Nome pela rota (/tasks/{task_id}) para agrupar; o caminho fica em http.target
+                    route = getattr(scope.get("route"), "path", None)
+                    if route:
+                        root.name = f"{method} {route}"
+                    root.attrs["status"] = message["status"]
+                    message["headers"] = [*message.get("headers", []),
+                                          (TRACE_ID_HEADER.encode(), root.trace_id.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Converte ficheiros de trace (JSON-lines) para Trace Event JSON")
+    parser.add_argument("files", nargs="*", default=[TRACE_FILE], help="ficheiros JSON-lines (API, cliente, ...)")
+    parser.add_argument("--trace", help="só este trace_id (X-Trace-Id)")
+    parser.add_argument("--output", help="ficheiro de saída (por omissão stdout)")
+    args = parser.parse_args()
+
+    document = json.dumps(to_chrome(read_events(args.files, args.trace)), ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(document)
+    else:
+        print(document)
@@ -0,0 +1,191 @@
+"""
+Kalu Change Versions
+====================
+
+Versão de alterações por tabela (e por filtro de empresa), actualizada por
+todos os caminhos de escrita. Serve de base aos validadores HTTP ETag e
+Last-Modified: um pedido com If-None-Match / If-Modified-Since recebe 304
+sem correr a query nem serializar nada.
+
+Os âmbitos ("scopes") são os mesmos das tags da cache: "tasks",
+"tasks:empresa=X", "documents", "memories", "activities".
+
+Com CACHE_BACKEND=redis as versões ficam no Redis e são partilhadas entre
+workers; em modo local são por processo (correcto com um único worker).
+"""
+
+import threading
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+import wire
+from cache import CACHE_BACKEND, CACHE_REDIS_URL, response_cache
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _settled(modified: datetime) -> bool:
+    """
+    True se a alteração foi num segundo já terminado
+
+    O Last-Modified HTTP só tem resolução de segundos: enquanto o segundo da
+    última escrita não acabou, outra escrita pode ter a mesma data e um
+    If-Modified-Since daria um 304 errado.
+    """
+    return modified < _now().replace(microsecond=0)
+
+
+class LocalVersionStore:
+    """Versões em memória; o boot_id muda a cada arranque para invalidar ETags antigos"""
+
+    def __init__(self):
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.boot_time = _now()
+        self._versions = {}
+        self._modified = {}
+        self._lock = threading.Lock()
+
+    def get(self, scopes: List[str]) -> Tuple[Tuple[int, ...], datetime]:
+        with self._lock:
+            # setdefault regista o scope para que bump_prefix também o apanhe
+            versions = tuple(self._versions.setdefault(scope, 0) for scope in scopes)
+            modified = max((self._modified.get(scope, self.boot_time) for scope in scopes),
+                           default=self.boot_time)
+        return versions, modified
+
+    def bump(self, scopes: Iterable[str]):
+        now = _now()
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+                self._modified[scope] = now
+
+    def bump_prefix(self, prefix: str):
+        with self._lock:
+            scopes = [scope for scope in self._versions if scope.startswith(prefix)]
+        self.bump(scopes or [prefix])
+
+
+class RedisVersionStore:
+    """Versões partilhadas entre workers (um hash por scope com versão e data)"""
+
+    def __init__(self, url: str = CACHE_REDIS_URL, prefix: str = "kalu:ver:"):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("Biblioteca redis não instalada. Execute: pip install redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.boot_id = "r"
+        self.boot_time = _now()
+
+    def get(self, scopes: List[str]) -> Tuple[Tuple[int, ...], datetime]:
+        pipe = self.client.pipeline()
+        for scope in scopes:
+            pipe.hmget(self.prefix + scope, "v", "m")
+        versions, modified = [], self.boot_time
+        for version, stamp in pipe.execute():
+            versions.append(int(version or 0))
+            if stamp:
+                modified = max(modified, datetime.fromtimestamp(float(stamp), timezone.utc))
+        return tuple(versions), modified
+
+    def bump(self, scopes: Iterable[str]):
+        stamp = _now().timestamp()
+        pipe = self.client.pipeline()
+        for scope in scopes:
+            pipe.hincrby(self.prefix + scope, "v", 1)
+            pipe.hset(self.prefix + scope, "m", stamp)
+        pipe.execute()
+
+    def bump_prefix(self, prefix: str):
+        scopes = [raw.decode()[len(self.prefix):] for raw in self.client.scan_iter(f"{self.prefix}{prefix}*")]
+        self.bump(scopes or [prefix])
+
+
+table_versions = RedisVersionStore() if CACHE_BACKEND == "redis" else LocalVersionStore()
+
+
+def mark_changed(entity: str, empresas: Optional[Iterable[str]] = None):
+    """
+    Regista uma escrita: sobe as versões e invalida a cache de respostas
+
+    Args:
+        entity: tasks, documents, memories, activities, calendar
+        empresas: Empresas afectadas; None marca todos os âmbitos da entidade
+    """
+    if empresas is None:
+        table_versions.bump_prefix(entity)
+    else:
+        table_versions.bump([entity] + [f"{entity}:empresa={e}" for e in set(empresas) if e])
+    response_cache.invalidate(entity, empresas)
+
+
+def validators(scopes: List[str]) -> Tuple[str, datetime]:
+    """ETag fraco e Last-Modified para o estado actual dos âmbitos"""
+    versions, modified = table_versions.get(scopes)
+    etag = f'W/"{table_versions.boot_id}-{".".join(str(v) for v in versions)}"'
+    return etag, modified
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime) -> bool:
+    """
+    Avalia If-None-Match (prioritário) e If-Modified-Since como no RFC 9110
+
+    If-Modified-Since só dá 304 se a última alteração for num segundo já
+    terminado (ver _settled); senão responde 200 por segurança.
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _settled(last_modified) and last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def conditional_response(request: Request, scopes: List[str], build: Callable[[], object]) -> Response:
+    """
+    Responde 304 se o cliente já tem a versão actual; senão chama build()
+
+    As versões são lidas antes de build(), por isso uma escrita concorrente
+    produz no máximo um 200 extra no poll seguinte, nunca um 304 errado.
+
+    Args:
+        scopes: Âmbitos de que a resposta depende (ex: entity_tags("tasks", empresa))
+        build: Função que devolve a Response ou dados JSON-serializáveis
+    """
+    etag, last_modified = validators(scopes)
+    etag = wire.negotiated_etag(etag)
+    # no-cache: o browser guarda a resposta mas revalida sempre (recebendo 304 quando nada mudou)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    # Sem Last-Modified enquanto o segundo da última escrita não acabou (o ETag chega)
+    if _settled(last_modified):
+        headers["Last-Modified"] = format_datetime(last_modified.replace(microsecond=0), usegmt=True)
+
+    if request.method == "GET" and is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    response = build()
+    if not isinstance(response, Response):
+        response = JSONResponse(jsonable_encoder(response))
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,200 @@
+"""
+Kalu Wire Format
+================
+
+Negociação de conteúdo nos endpoints de tarefas, resultados e actividades:
+
+    Accept: application/msgpack        - resposta em MessagePack
+    Content-Type: application/msgpack  - corpo do pedido em MessagePack
+    Content-Encoding: gzip | deflate   - corpo do pedido comprimido
+
+Sem estes headers tudo continua em JSON, como antes. A rota (NegotiatedRoute)
+descomprime e descodifica o pedido antes da validação do FastAPI e converte
+a resposta JSON já produzida pelo endpoint (incluindo as da cache e do buffer
+de actividades, que guardam bytes JSON).
+"""
+
+import contextvars
+import json
+import os
+import zlib
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from fastapi.routing import APIRoute
+
+try:
+    import msgpack
+except ImportError:  # opcional - sem msgpack só há JSON
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+WIRE_PATH_PREFIXES = tuple(os.getenv("WIRE_PATH_PREFIXES", "/tasks,/activities").split(","))
+WIRE_MAX_BODY_BYTES = int(os.getenv("WIRE_MAX_BODY_BYTES", str(64 * 1024 * 1024)))
+
+# Formato negociado para o pedido em curso ("json" ou "msgpack")
+_response_format: contextvars.ContextVar[str] = contextvars.ContextVar("wire_format", default="json")
+
+
+def _media_type(value: Optional[str]) -> str:
+    return (value or "").split(";")[0].strip().lower()
+
+
+def wants_msgpack(accept: Optional[str]) -> bool:
+    """True se o Accept pede MessagePack com qualidade >= à de JSON"""
+    if msgpack is None or not accept:
+        return False
+    quality = {}
+    for part in accept.split(","):
+        media, _, params = part.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        quality[media.strip().lower()] = q
+    msgpack_q = max((quality.get(t, 0.0) for t in MSGPACK_TYPES), default=0.0)
+    json_q = quality.get("application/json", quality.get("*/*", 0.0))
+    return msgpack_q > 0 and msgpack_q >= json_q
+
+
+def current_format() -> str:
+    return _response_format.get()
+
+
+def negotiated_etag(etag: str) -> str:
+    """ETag distinto por representação (JSON e MessagePack não são o mesmo corpo)"""
+    if current_format() == "msgpack":
+        return etag[:-1] + '-msgpack"'
+    return etag
+
+
+def decompress(body: bytes, encoding: str) -> bytes:
+    """
+    Descomprime o corpo do pedido (gzip/deflate), limitado a WIRE_MAX_BODY_BYTES
+
+    Raises:
+        HTTPException: 415 para codificação não suportada, 400 se corrompido,
+            413 se o corpo descomprimido exceder o limite
+    """
+    encoding = encoding.strip().lower()
+    if encoding in ("", "identity"):
+        return body
+    if encoding in ("gzip", "x-gzip"):
+        wbits = 16 + zlib.MAX_WBITS
+    elif encoding == "deflate":
+        wbits = zlib.MAX_WBITS
+    else:
+        raise HTTPException(status_code=415, detail=f"Content-Encoding não suportado: {encoding}")
+
+    decompressor = zlib.decompressobj(wbits)
+    try:
+        data = decompressor.decompress(body, WIRE_MAX_BODY_BYTES)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Corpo comprimido inválido: {e}")
+    if decompressor.unconsumed_tail:
+        raise HTTPException(status_code=413, detail="Corpo do pedido demasiado grande")
+    return data
+
+
+def _loads(body: bytes):
+    return orjson.loads(body) if orjson is not None else json.loads(body)
+
+
+class WireRequest(Request):
+    """Request com corpo descomprimido e descodificação MessagePack em json()"""
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_wire_body"):
+            body = await super().body()
+            encoding = self.scope.get("kalu.content_encoding")
+            self._wire_body = decompress(body, encoding) if encoding else body
+        return self._wire_body
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            body = await self.body()
+            if self.scope.get("kalu.msgpack_body"):
+                try:
+                    self._json = msgpack.unpackb(body, raw=False)
+                except Exception as e:
+                    raise HTTPException(status_code=400, detail=f"Corpo MessagePack inválido: {e}")
+            else:
+                self._json = json.loads(body)
+        return self._json
+
+
+def _prepare_scope(scope: dict):
+    """Retira Content-Encoding e apresenta corpos MessagePack ao FastAPI como JSON"""
+    headers = []
+    for name, value in scope["headers"]:
+        if name == b"content-encoding":
+            scope["kalu.content_encoding"] = value.decode("latin-1")
+            continue
+        if name == b"content-type" and _media_type(value.decode("latin-1")) in MSGPACK_TYPES:
+            if msgpack is None:
+                raise HTTPException(status_code=415, detail="MessagePack não suportado neste servidor")
+            scope["kalu.msgpack_body"] = True
+            value = b"application/json"
+        headers.append((name, value))
+    scope["headers"] = headers
+
+
+def to_msgpack(response: Response) -> Response:
+    """Converte uma resposta JSON já renderizada para MessagePack"""
+    if _media_type(response.media_type or response.headers.get("content-type")) != "application/json":
+        return response
+    if not getattr(response, "body", None):  # 304, ficheiros e streaming ficam como estão
+        return response
+    headers = {
+        k: v for k, v in response.headers.items()
+        if k.lower() not in ("content-length", "content-type")
+    }
+    return Response(
+        content=msgpack.packb(_loads(response.body), use_bin_type=True),
+        status_code=response.status_code,
+        headers=headers,
+        media_type=MSGPACK_MEDIA_TYPE,
+        background=response.background,
+    )
+
+
+class NegotiatedRoute(APIRoute):
+    """Rota com negociação JSON/MessagePack e corpos comprimidos (ver docstring do módulo)"""
+
+    def get_route_handler(self) -> Callable:
+        original_handler = super().get_route_handler()
+
+        async def handler(request: Request) -> Response:
+            if not request.url.path.startswith(WIRE_PATH_PREFIXES):
+                return await original_handler(request)
+
+            _prepare_scope(request.scope)
+            fmt = "msgpack" if wants_msgpack(request.headers.get("accept")) else "json"
+            token = _response_format.set(fmt)
+            try:
+                response = await original_handler(WireRequest(request.scope, request.receive))
+            finally:
+                _response_format.reset(token)
+
+            if fmt == "msgpack":
+                response = to_msgpack(response)
+            # Caches intermédias: a representação depende do Accept
+            vary = response.headers.get("vary")
+            if not vary:
+                response.headers["Vary"] = "Accept"
+            elif "accept" not in vary.lower():
+                response.headers["Vary"] = f"{vary}, Accept"
+            return response
+
+        return handler
@@ -77,12 +77,7 @@ function App() {
 
   useEffect(() => {
     if (token) {
-      fetchUser();
-      fetchTasks();
-      fetchStats();
-      fetchActivities();
-      fetchDocuments();
-      fetchMemories();
+      fetchBootstrap();
       
       const interval = setInterval(() => {
         fetchActivities();
@@ -93,6 +88,26 @@ function App() {
     }
   }, [token]);
 
+  // Um só pedido para o primeiro ecrã (user, tasks, stats, activities, documents, memories)
+  const fetchBootstrap = async () => {
+    setLoading(true);
+    try {
+      const res = await api.get('/dashboard/bootstrap');
+      setUser(res.data.user);
+      setTasks(res.data.tasks);
+      setStats(res.data.stats);
+      setActivities(res.data.activities || []);
+      setDocuments(res.data.documents || []);
+      setMemories(res.data.memories || []);
+    } catch (err) {
+      console.error('Erro ao carregar dashboard:', err);
+      if (err.response?.status === 401) {
+        logout();
+      }
+    }
+    setLoading(false);
+  };
+
   const fetchUser = async () => {
     try {
       const res = await api.get('/users/me');
@@ -278,8 +293,17 @@ function App() {
   };
 
   // ✅ NOVO: Abrir task details
-  const openTaskDetails = (task) => {
+  const openTaskDetails = async (task) => {
     setSelectedTask(task);
+    // O bootstrap envia resumos sem o resultado - buscar a tarefa completa
+    if (task.has_resultado && task.resultado === undefined) {
+      try {
+        const res = await api.get(`/tasks/${task.id}`);
+        setSelectedTask(res.data);
+      } catch (err) {
+        console.error('Erro ao buscar tarefa:', err);
+      }
+    }
   };
 
   // ✅ NOVO: Fechar task details
@@ -557,7 +581,7 @@ function App() {
                     <span className={`status-badge status-${task.status.toLowerCase().replace(' ', '-')}`}>
                       {task.status}
                     </span>
-                    {task.resultado && (
+                    {(task.resultado || task.has_resultado) && (
                       <span className="result-badge">📄 Resultado</span>
                     )}
                   </div>
@@ -622,7 +646,7 @@ function App() {
                                         {task.prioridade}
                                       </span>
                                     </div>
-                                    {task.resultado && (
+                                    {(task.resultado || task.has_resultado) && (
                                       <div className="kanban-card-result">
                                         📄 Tem resultado
                                       </div>
@@ -10,6 +10,14 @@ from datetime import datetime
 from typing import Dict, Any
 import os
 
+try:  # opcional - spans quando corre dentro do backend (backend/tracing.py)
+    from tracing import traced
+except ImportError:
+    def traced(name, cat="render"):
+        return lambda func: func
+
+
+@traced("generate_markdown_report")
 def generate_markdown_report(data: Dict[str, Any], task_title: str) -> str:
     """
     Gera relatório em Markdown (base para conversão)
@@ -168,6 +176,7 @@ def save_markdown_report(markdown: str, filename: str, output_dir: str = "/tmp")
     return filepath
 
 
+@traced("generate_html_content_only")
 def generate_html_content_only(markdown: str) -> str:
     """
     Converte markdown para HTML (apenas conteúdo, sem <html><head>)
@@ -208,6 +217,7 @@ def generate_html_content_only(markdown: str) -> str:
     
     return html
 
+@traced("generate_html_report")
 def generate_html_report(markdown: str) -> str:
     """
     Converte markdown para HTML com estilo
@@ -6,12 +6,24 @@ Script de exemplo para o Kalu verificar e processar tarefas do dashboard.
 Usar no HEARTBEAT ou como módulo standalone.
 """
 
+import atexit
 import requests
 from typing import List, Dict, Optional
 from datetime import datetime
 import json
+import gzip
 import sys
 import os
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+
+try:
+    import msgpack
+except ImportError:  # opcional - sem msgpack o cliente usa JSON
+    msgpack = None
 
 # Importar gerador de documentos
 sys.path.insert(0, '/root/clawd')
@@ -19,13 +31,117 @@ from kalu_document_generator import generate_report
 
 # Configuração
 API_URL = "https://kalu-dashboard-api.onrender.com"  # Ajustar conforme deployment
+# JSON por omissão (qualquer versão do servidor aceita); msgpack só com KALU_WIRE_FORMAT=msgpack
+WIRE_FORMAT = os.getenv("KALU_WIRE_FORMAT", "json")  # json, msgpack
+COMPRESS_MIN_BYTES = int(os.getenv("KALU_COMPRESS_MIN_BYTES", "1024"))  # gzip acima deste tamanho
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+# Tracing: header traceparent (W3C) em cada pedido e um span por chamada em KALU_TRACE_FILE
+# (mesmo formato JSON-lines do backend - juntar com: python backend/tracing.py <api> <cliente>)
+KALU_TRACING = os.getenv("KALU_TRACING", "false").lower() == "true"
+KALU_TRACE_FILE = os.getenv("KALU_TRACE_FILE", os.path.join(tempfile.gettempdir(), "kalu_client_traces.jsonl"))
+_trace_process_named = False
+
+
+def _new_trace_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _new_span_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _write_span(name: str, trace_id: str, span_id: str, parent_id: Optional[str], started_us: int, dur_us: int, **attrs):
+    """Acrescenta um span (evento Trace Event) ao KALU_TRACE_FILE"""
+    global _trace_process_named
+    events = []
+    if not _trace_process_named:
+        events.append({"name": "process_name", "ph": "M", "pid": os.getpid(), "args": {"name": "kalu_integration"}})
+        _trace_process_named = True
+    events.append({
+        "name": name, "cat": "client", "ph": "X", "ts": started_us, "dur": dur_us,
+        "pid": os.getpid(), "tid": threading.get_native_id(),
+        "args": {"trace_id": trace_id, "span_id": span_id, "parent_id": parent_id, **attrs},
+    })
+    try:
+        with open(KALU_TRACE_FILE, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(event, ensure_ascii=False) + "\n" for event in events))
+    except OSError as e:
+        print(f"⚠️ Tracing: não foi possível escrever em {KALU_TRACE_FILE}: {e}")
+
+
+# Clientes vivos: as actividades adiadas seguem à saída se ninguém chamar flush_activities()
+_clients: "weakref.WeakSet[KaluDashboard]" = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_all_clients():
+    for client in list(_clients):
+        client.flush_activities()
 
 
 class KaluDashboard:
     """Cliente para interagir com Kalu Dashboard API"""
     
-    def __init__(self, api_url: str = API_URL):
+    def __init__(self, api_url: str = API_URL, wire_format: str = WIRE_FORMAT):
         self.api_url = api_url.rstrip('/')
+        self._pending_activities: List[Dict] = []
+        _clients.add(self)
+        self.use_msgpack = wire_format == "msgpack" and msgpack is not None
+        self.session = requests.Session()
+        # Trace em curso (ex: um heartbeat): os pedidos ficam como filhos deste span
+        self.trace_id: Optional[str] = None
+        self.parent_span_id: Optional[str] = None
+        if self.use_msgpack:
+            self.session.headers["Accept"] = f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.5"
+    
+    def _request(self, method: str, path: str, payload=None, **kwargs) -> requests.Response:
+        """
+        Pedido à API com corpo em MessagePack (ou JSON) comprimido com gzip se grande
+        
+        Args:
+            method: GET, POST, ...
+            path: Caminho do endpoint (ex: /tasks/pending)
+            payload: Corpo do pedido (dict/list) ou None
+        """
+        if payload is not None:
+            if self.use_msgpack:
+                body = msgpack.packb(payload, use_bin_type=True)
+                content_type = MSGPACK_MEDIA_TYPE
+            else:
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                content_type = "application/json"
+            headers = {"Content-Type": content_type}
+            if len(body) >= COMPRESS_MIN_BYTES:
+                body = gzip.compress(body, compresslevel=6)
+                headers["Content-Encoding"] = "gzip"
+            kwargs["data"] = body
+            kwargs["headers"] = {**headers, **kwargs.get("headers", {})}
+        if not KALU_TRACING:
+            return self.session.request(method, f"{self.api_url}{path}", **kwargs)
+        
+        # Span da chamada; o traceparent faz a API continuar o mesmo trace
+        trace_id, span_id = self.trace_id or _new_trace_id(), _new_span_id()
+        kwargs["headers"] = {**kwargs.get("headers", {}), "traceparent": f"00-{trace_id}-{span_id}-01"}
+        started_us, started = time.time_ns() // 1000, time.perf_counter()
+        attrs = {"http.method": method, "http.url": f"{self.api_url}{path}"}
+        try:
+            response = self.session.request(method, f"{self.api_url}{path}", **kwargs)
+            attrs["status"] = response.status_code
+            return response
+        except Exception as e:
+            attrs["error"] = f"{type(e).__name__}: {e}"[:300]
+            raise
+        finally:
+            _write_span(f"{method} {path}", trace_id, span_id, self.parent_span_id, started_us,
+                        round((time.perf_counter() - started) * 1_000_000), **attrs)
+    
+    @staticmethod
+    def _decode(response: requests.Response):
+        """Corpo da resposta, em MessagePack ou JSON conforme o Content-Type"""
+        if response.headers.get("Content-Type", "").startswith(MSGPACK_MEDIA_TYPE):
+            return msgpack.unpackb(response.content, raw=False)
+        return response.json()
     
     def log_activity(
         self,
@@ -36,7 +152,8 @@ class KaluDashboard:
         target_id: int = None,
         target_type: str = None,
         extra_data: str = None,
-        icon: str = "📌"
+        icon: str = "📌",
+        defer: bool = False
     ) -> bool:
         """
         Regista uma atividade no Activity Feed
@@ -50,10 +167,24 @@ class KaluDashboard:
             target_type: Tipo da entidade (task, document, memory)
             extra_data: JSON com dados adicionais
             icon: Emoji para o feed
+            defer: Se True, guarda localmente e envia no próximo flush_activities()
             
         Returns:
             bool: True se sucesso
         """
+        if defer:
+            self._pending_activities.append({
+                "tipo": tipo,
+                "titulo": titulo,
+                "descricao": descricao,
+                "actor": actor,
+                "target_id": target_id,
+                "target_type": target_type,
+                "extra_data": extra_data,
+                "icon": icon
+            })
+            return True
+        
         try:
             # Criar query params apenas com campos não-nulos
             params = {
@@ -73,16 +204,31 @@ class KaluDashboard:
             if extra_data:
                 params["extra_data"] = extra_data
             
-            response = requests.post(
-                f"{self.api_url}/activities/",
-                params=params,
-                timeout=10
-            )
+            response = self._request("POST", "/activities/", params=params, timeout=10)
             response.raise_for_status()
             return True
         except Exception as e:
             print(f"⚠️ Erro ao registar atividade: {e}")
             return False
+    
+    def flush_activities(self) -> bool:
+        """
+        Envia todas as atividades adiadas num único pedido (/activities/bulk)
+        
+        Returns:
+            bool: True se sucesso (ou se não havia nada para enviar)
+        """
+        if not self._pending_activities:
+            return True
+        
+        try:
+            response = self._request("POST", "/activities/bulk", self._pending_activities, timeout=30)
+            response.raise_for_status()
+            self._pending_activities = []
+            return True
+        except Exception as e:
+            print(f"⚠️ Erro ao enviar {len(self._pending_activities)} atividade(s): {e}")
+            return False
         
     def get_pending_tasks(self) -> List[Dict]:
         """
@@ -92,9 +238,9 @@ class KaluDashboard:
             List[Dict]: Lista de tarefas pendentes
         """
         try:
-            response = requests.get(f"{self.api_url}/tasks/pending", timeout=30)
+            response = self._request("GET", "/tasks/pending", timeout=30)
             response.raise_for_status()
-            return response.json()
+            return self._decode(response)
         except requests.exceptions.Timeout:
             print(f"⚠️ Timeout ao conectar ao backend (servidor pode estar a acordar)")
             return []
@@ -109,7 +255,8 @@ class KaluDashboard:
         resultado_tipo: str = "text",
         resultado_url: Optional[str] = None,
         generate_document: bool = True,
-        task_title: str = "Relatório"
+        task_title: str = "Relatório",
+        defer_activity: bool = False
     ) -> bool:
         """
         Adiciona resultado de uma tarefa
@@ -121,6 +268,8 @@ class KaluDashboard:
             resultado_url: URL opcional para ficheiro externo
             generate_document: Se True, gera documento HTML formatado
             task_title: Título para o documento gerado
+            defer_activity: Se True, a actividade "tarefa concluída" só é enviada no
+                flush_activities() (ou à saída do processo) - perde-se num crash
             
         Returns:
             bool: True se sucesso, False caso contrário
@@ -155,15 +304,11 @@ class KaluDashboard:
             if resultado_url:
                 payload["resultado_url"] = resultado_url
             
-            response = requests.post(
-                f"{self.api_url}/tasks/{task_id}/result",
-                json=payload,
-                timeout=10
-            )
+            response = self._request("POST", f"/tasks/{task_id}/result", payload, timeout=10)
             response.raise_for_status()
             print(f"✅ Resultado adicionado à tarefa #{task_id}")
             
-            # Registar no Activity Feed
+            # Registar no Activity Feed (com defer_activity: em lote no flush_activities)
             self.log_activity(
                 tipo="task_completed",
                 titulo=f"Tarefa concluída: {task_title}",
@@ -171,7 +316,8 @@ class KaluDashboard:
                 actor="Kalu",
                 target_id=task_id,
                 target_type="task",
-                icon="✅"
+                icon="✅",
+                defer=defer_activity
             )
             
             return True
@@ -244,10 +390,25 @@ def heartbeat_check():
     Função para ser chamada no heartbeat do Kalu
     Verifica tarefas pendentes e processa as de alta prioridade
     """
+    dashboard = KaluDashboard()
+    if not KALU_TRACING:
+        return _heartbeat_check(dashboard)
+    
+    # Um trace por heartbeat: todas as chamadas à API ficam com o mesmo trace_id
+    dashboard.trace_id, dashboard.parent_span_id = _new_trace_id(), _new_span_id()
+    started_us, started = time.time_ns() // 1000, time.perf_counter()
+    try:
+        _heartbeat_check(dashboard)
+    finally:
+        _write_span("kalu.heartbeat", dashboard.trace_id, dashboard.parent_span_id, None, started_us,
+                    round((time.perf_counter() - started) * 1_000_000))
+        print(f"🔎 Trace {dashboard.trace_id} em {KALU_TRACE_FILE}")
+
+
+def _heartbeat_check(dashboard: "KaluDashboard"):
     print("\n⚡ Kalu Dashboard Heartbeat")
     print("=" * 50)
     
-    dashboard = KaluDashboard()
     
     # Obter tarefas pendentes
     tasks = dashboard.get_pending_tasks()
@@ -286,6 +447,9 @@ def heartbeat_check():
         except Exception as e:
             print(f"❌ Erro ao processar tarefa #{task['id']}: {e}")
     
+    # Enviar todas as atividades do heartbeat de uma só vez
+    dashboard.flush_activities()
+    
     # Listar tarefas de prioridade média/baixa (só notificar)
     other_tasks = [t for t in tasks if t['prioridade'] != 'Alta']
     if other_tasks:
@@ -316,6 +480,7 @@ def example_usage():
                 resultado=json.dumps(result),
                 resultado_tipo="json"
             )
+            dashboard.flush_activities()
 
 
 if __name__ == "__main__":